@@ -132,6 +132,9 @@ class AsyncWorker(QObject):
                 if pending:
                     for task in pending: task.cancel()
                     self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                # موتور async همین لوپ (در صورت استفاده از run_db) قبل از بستن لوپ بسته می‌شود
+                from db.database import dispose_async_engine
+                self._loop.run_until_complete(dispose_async_engine())
                 self._loop.close()
         except Exception as e:
             logger.warning(f"AsyncWorker cleanup warning: {e}")
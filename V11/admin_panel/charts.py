@@ -0,0 +1,255 @@
+import logging
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PyQt6.QtWidgets import QWidget, QSizePolicy
+from PyQt6.QtCore import Qt, QPointF, QRectF, QVariantAnimation, QEasingCurve
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen, QBrush, QLinearGradient, QFontMetrics
+
+from config import BASE_DIR
+
+logger = logging.getLogger("Charts")
+
+COLOR_CARD = "#242629"
+COLOR_BG = "#16161a"
+COLOR_GRID = "#2d2e32"
+COLOR_AXIS = "#94a1b2"
+
+def _compact(value: float) -> str:
+    """برچسب کوتاه محور عمودی (1.2M، 350K)"""
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= limit:
+            return f"{value / limit:.1f}".rstrip("0").rstrip(".") + suffix
+    return f"{value:.0f}"
+
+def _nice_max(value: float) -> float:
+    """گرد کردن سقف محور به عدد خوانا (1، 2، 2.5، 5 × 10^n)"""
+    if value <= 0:
+        return 100.0
+    exp = 10 ** np.floor(np.log10(value))
+    for step in (1, 2, 2.5, 5, 10):
+        if value <= step * exp:
+            return float(step * exp)
+    return float(10 * exp)
+
+# ==============================================================================
+# نمودار خطی سبک (QPainter)
+# ==============================================================================
+class SalesChart(QWidget):
+    """
+    نمودار خطی فروش با QPainter (جایگزین FigureCanvas متپلاتلیب).
+
+    ورودی آرایه‌های NumPy است؛ سری سال قبل به صورت خط‌چین رسم می‌شود. متن‌ها با فونت برنامه
+    (Vazirmatn) و شکل‌دهی خود Qt رسم می‌شوند و در حالت راست‌به‌چپ محور زمان از راست شروع می‌شود.
+    با هر set_series مقادیر از سری قبلی به سری جدید انیمیت می‌شوند.
+    """
+    MARGIN_TOP, MARGIN_BOTTOM, MARGIN_SIDE = 20, 34, 16
+
+    def __init__(self, color: str, parent=None):
+        super().__init__(parent)
+        self.color = QColor(color)
+        self.labels: List[str] = []
+        self._target = np.zeros(0)
+        self._start = np.zeros(0)
+        self._values = np.zeros(0)
+        self._previous: Optional[np.ndarray] = None
+        self._hover: Optional[int] = None
+        self._y_max = 100.0
+        self.setMinimumHeight(200)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.setMouseTracking(True)
+
+        self._anim = QVariantAnimation(self)
+        self._anim.setDuration(400)
+        self._anim.setStartValue(0.0)
+        self._anim.setEndValue(1.0)
+        self._anim.setEasingCurve(QEasingCurve.Type.OutCubic)
+        self._anim.valueChanged.connect(self._on_frame)
+
+    def set_series(self, labels: Sequence[str], values: np.ndarray, previous: Optional[np.ndarray] = None):
+        values = np.asarray(values, dtype=float)
+        # انیمیشن فقط وقتی تعداد نقاط ثابت است از مقدار قبلی شروع می‌شود؛ در غیر این صورت از صفر
+        start = self._values if len(self._values) == len(values) else np.zeros_like(values)
+        self.labels = list(labels)
+        self._start, self._target = start, values
+        self._previous = None if previous is None else np.asarray(previous, dtype=float)
+        top = max(float(values.max(initial=0)), float(self._previous.max(initial=0)) if self._previous is not None else 0.0)
+        self._y_max = _nice_max(top * 1.1)
+        self._hover = None
+        self._anim.stop()
+        self._anim.start()
+
+    def _on_frame(self, progress):
+        self._values = self._start + (self._target - self._start) * float(progress)
+        self.update()
+
+    # --- هندسه ---
+    def _plot_rect(self) -> QRectF:
+        fm = QFontMetrics(self.font())
+        axis_width = fm.horizontalAdvance(_compact(self._y_max)) + 10
+        r = QRectF(self.rect()).adjusted(self.MARGIN_SIDE, self.MARGIN_TOP, -self.MARGIN_SIDE, -self.MARGIN_BOTTOM)
+        return r.adjusted(0, 0, -axis_width, 0) if self.isRightToLeft() else r.adjusted(axis_width, 0, 0, 0)
+
+    def _points(self, values: np.ndarray, rect: QRectF) -> np.ndarray:
+        """مختصات پیکسلی نقاط (محاسبه برداری)"""
+        n = len(values)
+        t = np.linspace(0.0, 1.0, n) if n > 1 else np.array([0.5])
+        if self.isRightToLeft():
+            t = 1.0 - t
+        # فاصله کوچک از لبه‌ها تا نقاط ابتدا و انتهای سری بریده نشوند
+        xs = rect.left() + 6 + t * (rect.width() - 12)
+        ys = rect.bottom() - np.clip(values / self._y_max, 0, 1) * rect.height()
+        return np.column_stack((xs, ys))
+
+    @staticmethod
+    def _path(points: np.ndarray) -> QPainterPath:
+        path = QPainterPath()
+        if len(points):
+            path.moveTo(*points[0])
+            for x, y in points[1:]:
+                path.lineTo(x, y)
+        return path
+
+    # --- رسم ---
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor(COLOR_CARD))
+        rect = self._plot_rect()
+        fm = QFontMetrics(self.font())
+
+        # خطوط راهنما و برچسب محور عمودی
+        for i in range(5):
+            y = rect.bottom() - rect.height() * i / 4
+            painter.setPen(QPen(QColor(COLOR_GRID), 1, Qt.PenStyle.DashLine))
+            painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+            painter.setPen(QColor(COLOR_AXIS))
+            text = _compact(self._y_max * i / 4)
+            if self.isRightToLeft():
+                text_rect = QRectF(rect.right() + 6, y - 10, 60, 20)
+                align = Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+            else:
+                text_rect = QRectF(rect.left() - 66, y - 10, 60, 20)
+                align = Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            painter.drawText(text_rect, int(align), text)
+
+        if not len(self._values):
+            painter.end()
+            return
+        points = self._points(self._values, rect)
+
+        # برچسب‌های محور افقی (حداکثر به اندازه‌ای که روی هم نیفتند)
+        painter.setPen(QColor(COLOR_AXIS))
+        label_width = max((fm.horizontalAdvance(l) for l in self.labels), default=0) + 12
+        step = max(1, int(np.ceil(len(self.labels) * label_width / max(rect.width(), 1))))
+        for i in range(0, len(self.labels), step):
+            left = min(max(points[i][0] - label_width / 2, 0), self.width() - label_width)
+            painter.drawText(QRectF(left, rect.bottom() + 6, label_width, 20),
+                             int(Qt.AlignmentFlag.AlignCenter), self.labels[i])
+
+        # سری سال قبل
+        if self._previous is not None and len(self._previous) == len(self._values):
+            pen = QPen(QColor(COLOR_AXIS), 1.5, Qt.PenStyle.DashLine)
+            painter.setPen(pen)
+            painter.setOpacity(0.6)
+            painter.drawPath(self._path(self._points(self._previous, rect)))
+            painter.setOpacity(1.0)
+
+        # سطح زیر نمودار
+        line = self._path(points)
+        area = QPainterPath(line)
+        area.lineTo(points[-1][0], rect.bottom())
+        area.lineTo(points[0][0], rect.bottom())
+        area.closeSubpath()
+        gradient = QLinearGradient(0, rect.top(), 0, rect.bottom())
+        top_color = QColor(self.color); top_color.setAlpha(70)
+        bottom_color = QColor(self.color); bottom_color.setAlpha(0)
+        gradient.setColorAt(0, top_color); gradient.setColorAt(1, bottom_color)
+        painter.fillPath(area, QBrush(gradient))
+
+        # خط اصلی و نقاط
+        painter.setPen(QPen(self.color, 3, Qt.PenStyle.SolidLine, Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin))
+        painter.drawPath(line)
+        if len(points) <= 31:
+            painter.setBrush(QColor(COLOR_BG))
+            painter.setPen(QPen(self.color, 2))
+            for x, y in points:
+                painter.drawEllipse(QPointF(x, y), 4.5, 4.5)
+
+        # مقدار نقطه زیر ماوس
+        if self._hover is not None and self._hover < len(points):
+            x, y = points[self._hover]
+            painter.setPen(QPen(QColor(COLOR_AXIS), 1, Qt.PenStyle.DotLine))
+            painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
+            text = f"{self.labels[self._hover]}: {int(self._target[self._hover]):,}"
+            if self._previous is not None and self._hover < len(self._previous):
+                text += f"  (سال قبل: {int(self._previous[self._hover]):,})"
+            box = QRectF(fm.boundingRect(text)).adjusted(-8, -5, 8, 5)
+            box.moveCenter(QPointF(x, rect.top() + box.height() / 2))
+            box.moveLeft(min(max(box.left(), rect.left()), rect.right() - box.width()))
+            painter.setPen(self.color)
+            painter.setBrush(QColor(COLOR_BG))
+            painter.drawRoundedRect(box, 6, 6)
+            painter.setPen(QColor("white"))
+            painter.drawText(box, int(Qt.AlignmentFlag.AlignCenter), text)
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        if len(self._target):
+            xs = self._points(self._target, self._plot_rect())[:, 0]
+            hover = int(np.abs(xs - event.position().x()).argmin())
+            if hover != self._hover:
+                self._hover = hover
+                self.update()
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        self._hover = None
+        self.update()
+        super().leaveEvent(event)
+
+# ==============================================================================
+# گزارش تصویری/PDF (متپلاتلیب فقط در صورت نیاز بارگذاری می‌شود)
+# ==============================================================================
+def _farsi(text: str) -> str:
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return str(text)
+    return get_display(arabic_reshaper.reshape(str(text)))
+
+def render_sales_report(series, path: str, colors: dict) -> None:
+    """
+    ذخیره گزارش فروش (PNG/PDF) با matplotlib.
+    matplotlib وابستگی اختیاری است و فقط همین‌جا import می‌شود؛ در نبود آن ImportError بالا می‌رود.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib import font_manager
+
+    font = None
+    for font_path in (Path(BASE_DIR) / "fonts" / "Vazirmatn.ttf", Path(__file__).parent / "fonts" / "Vazirmatn.ttf"):
+        if font_path.exists():
+            font_manager.fontManager.addfont(str(font_path))
+            font = font_manager.FontProperties(fname=str(font_path))
+            break
+
+    titles = {"telegram": "فروش تلگرام", "rubika": "فروش روبیکا"}
+    fig = Figure(figsize=(11, 7), dpi=120)
+    x = np.arange(len(series.labels))
+    step = max(1, len(x) // 12)
+    for i, (platform, title) in enumerate(titles.items(), start=1):
+        ax = fig.add_subplot(2, 1, i)
+        ax.plot(x, series.current[platform], color=colors.get(platform, "#3da9fc"), linewidth=2.5, label=_farsi("بازه جاری"))
+        ax.plot(x, series.previous[platform], color="#94a1b2", linestyle="--", linewidth=1.5, label=_farsi("سال قبل"))
+        growth = series.growth(platform)
+        suffix = f" ({growth:+}%)" if growth is not None else ""
+        ax.set_title(_farsi(f"{title}: {int(series.total(platform)):,} تومان{suffix}"), fontproperties=font)
+        ax.set_xticks(x[::step])
+        ax.set_xticklabels(series.labels[::step])
+        ax.set_ylim(bottom=0)
+        ax.grid(True, axis="y", linestyle="--", alpha=0.3)
+        ax.legend(prop=font)
+    fig.tight_layout()
+    fig.savefig(path)
@@ -1,41 +1,31 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any
-from pathlib import Path
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame,
     QGridLayout, QPushButton, QGraphicsDropShadowEffect,
-    QScrollArea, QTabWidget, QSizePolicy, QProgressBar
+    QScrollArea, QTabWidget, QSizePolicy, QProgressBar, QButtonGroup,
+    QFileDialog, QMessageBox
 )
 from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QSize, pyqtProperty, QRect
 from PyQt6.QtGui import QColor, QFont, QPainter, QLinearGradient, QBrush, QPen
 from qasync import asyncSlot
 import qtawesome as qta
 
-# Matplotlib
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-from matplotlib.font_manager import FontProperties
-
-# ابزارهای اصلاح فارسی
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-    HAS_RTL_SUPPORT = True
-except ImportError:
-    HAS_RTL_SUPPORT = False
-
-from config import BASE_DIR
 from db.database import get_db
-from db import crud, models
-from sqlalchemy import func
+from db import crud
+from db.analytics import sales_series, SalesSeries
+from .charts import SalesChart, render_sales_report
 
 logger = logging.getLogger("Dashboard")
 
+ACTIVITY_LIMIT = 5
+
+# بازه‌های قابل انتخاب نمودار فروش (روز)
+CHART_RANGES = [(7, "۷ روز"), (30, "۳۰ روز"), (90, "۹۰ روز"), (365, "یک سال")]
+
 # --- رنگ‌ها ---
 COLOR_BG = "#16161a"
 COLOR_CARD = "#242629"
@@ -46,57 +36,6 @@ COLOR_RED = "#ef4565"
 COLOR_YELLOW = "#fffffe"
 COLOR_GRAY = "#94a1b2"
 
-def farsi_text_for_chart(text):
-    """مخصوص نمودارها: حروف را می‌چسباند و جهت را اصلاح می‌کند"""
-    if not text: return ""
-    if not HAS_RTL_SUPPORT: return str(text)
-    reshaped_text = arabic_reshaper.reshape(str(text))
-    return get_display(reshaped_text)
-
-# ==============================================================================
-# Canvas Chart (با رفع مشکل فونت)
-# ==============================================================================
-class ModernChart(FigureCanvasQTAgg):
-    def __init__(self, parent=None, width=5, height=3, dpi=100):
-        self.persian_font = None
-        font_path = Path(BASE_DIR) / "fonts" / "Vazirmatn.ttf"
-        
-        # --- رفع خطای Font not found ---
-        if font_path.exists():
-            try:
-                # اضافه کردن فونت به کش متپلاتلیب
-                fm.fontManager.addfont(str(font_path))
-                # خواندن نام فونت از فایل
-                self.persian_font = FontProperties(fname=str(font_path))
-                # تنظیم فونت پیش‌فرض
-                plt.rcParams['font.family'] = self.persian_font.get_name()
-            except Exception as e:
-                logger.error(f"Error loading font for chart: {e}")
-        
-        plt.rcParams.update({
-            'axes.facecolor': COLOR_CARD,
-            'figure.facecolor': COLOR_CARD,
-            'text.color': COLOR_YELLOW,
-            'axes.labelcolor': COLOR_GRAY,
-            'xtick.color': COLOR_GRAY,
-            'ytick.color': COLOR_GRAY,
-            'grid.color': '#2d2e32',
-        })
-        
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = self.fig.add_subplot(111)
-        self.fig.patch.set_facecolor(COLOR_CARD)
-        
-        # حذف حاشیه‌های اضافی
-        self.axes.spines['top'].set_visible(False)
-        self.axes.spines['right'].set_visible(False)
-        self.axes.spines['left'].set_color('#333')
-        self.axes.spines['bottom'].set_color('#333')
-        
-        super().__init__(self.fig)
-        self.setParent(parent)
-        self.fig.tight_layout()
-
 # ==============================================================================
 # Stat Card
 # ==============================================================================
@@ -264,11 +203,14 @@ class DashboardWidget(QWidget):
         super().__init__()
         self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
         self._data_loaded = False
+        self._cursor = None
+        self._totals = None
+        self.lbl_no_activity = None
         self.setup_ui()
         
         self.refresh_timer = QTimer(self)
-        self.refresh_timer.timeout.connect(self.refresh_data)
-        self.refresh_timer.start(300000)
+        self.refresh_timer.timeout.connect(self.refresh_delta)
+        self.refresh_timer.start(60000)
 
     def setup_ui(self):
         self.main_layout = QVBoxLayout(self)
@@ -301,6 +243,15 @@ class DashboardWidget(QWidget):
         self.btn_refresh.setCursor(Qt.CursorShape.PointingHandCursor)
         self.btn_refresh.clicked.connect(self.refresh_data)
         header.addWidget(self.btn_refresh)
+
+        self.btn_export = QPushButton()
+        self.btn_export.setFixedSize(45, 45)
+        self.btn_export.setIcon(qta.icon('fa5s.file-export', color='white'))
+        self.btn_export.setToolTip("ذخیره گزارش فروش (PNG / PDF)")
+        self.btn_export.setStyleSheet(f"background: {COLOR_CARD}; border: 1px solid #333; border-radius: 12px;")
+        self.btn_export.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.btn_export.clicked.connect(self.export_report)
+        header.addWidget(self.btn_export)
         
         self.main_layout.addLayout(header)
 
@@ -327,10 +278,35 @@ class DashboardWidget(QWidget):
             QTabBar::tab:selected {{ background: {COLOR_CARD}; color: {COLOR_PURPLE}; border-bottom: 3px solid {COLOR_PURPLE}; }}
         """)
         
-        self.chart_tg = ModernChart()
-        self.chart_rb = ModernChart()
+        self.chart_tg = SalesChart(COLOR_BLUE)
+        self.chart_rb = SalesChart(COLOR_PURPLE)
         self.tabs.addTab(self.chart_tg, "نمودار فروش تلگرام")
         self.tabs.addTab(self.chart_rb, "نمودار فروش روبیکا")
+
+        # انتخاب بازه نمودار و مقایسه با سال قبل
+        self.chart_days = CHART_RANGES[0][0]
+        self.series = None
+        range_bar = QWidget()
+        range_lay = QHBoxLayout(range_bar)
+        range_lay.setContentsMargins(0, 0, 10, 0)
+        self.lbl_yoy = QLabel("")
+        self.lbl_yoy.setStyleSheet(f"color: {COLOR_GRAY}; font-size: 12px;")
+        range_lay.addWidget(self.lbl_yoy)
+        self.range_group = QButtonGroup(self)
+        for days, title in CHART_RANGES:
+            btn = QPushButton(title)
+            btn.setCheckable(True)
+            btn.setChecked(days == self.chart_days)
+            btn.setCursor(Qt.CursorShape.PointingHandCursor)
+            btn.setStyleSheet(f"""
+                QPushButton {{ background: #1c1e22; color: {COLOR_GRAY}; border: 1px solid #333; border-radius: 8px; padding: 5px 12px; }}
+                QPushButton:checked {{ background: {COLOR_PURPLE}; color: white; border-color: {COLOR_PURPLE}; }}
+            """)
+            self.range_group.addButton(btn, days)
+            range_lay.addWidget(btn)
+        self.range_group.idClicked.connect(self.change_chart_range)
+        self.tabs.setCornerWidget(range_bar, Qt.Corner.TopLeftCorner)
+        self.tabs.currentChanged.connect(lambda _: self.update_yoy_label())
         self.main_layout.addWidget(self.tabs, 3)
 
         # بخش پایین
@@ -379,87 +355,79 @@ class DashboardWidget(QWidget):
 
     @asyncSlot()
     async def refresh_data(self):
-        self.btn_refresh.setIcon(qta.icon('fa5s.sync-alt', color='white', animation=qta.Spin(self.btn_refresh)))
+        """بارگذاری کامل (دکمه بروزرسانی و اولین نمایش)"""
+        self._cursor = None
+        await self._refresh()
+
+    @asyncSlot()
+    async def refresh_delta(self):
+        """بروزرسانی دوره‌ای: فقط سفارشات و تغییرات موجودی بعد از آخرین snapshot اعمال می‌شوند"""
+        await self._refresh()
+
+    async def _refresh(self):
+        full = self._cursor is None
+        if full:
+            self.btn_refresh.setIcon(qta.icon('fa5s.sync-alt', color='white', animation=qta.Spin(self.btn_refresh)))
         loop = asyncio.get_running_loop()
+        since = self._cursor
         
         try:
             def fetch_all():
                 with next(get_db()) as db:
-                    # داده‌های آماری
-                    rev_tg = crud.get_total_revenue_by_platform(db, "telegram")
-                    rev_rb = crud.get_total_revenue_by_platform(db, "rubika")
-                    pending_orders = db.query(models.Order).filter(models.Order.status == 'pending_payment').count()
-                    total_users = db.query(models.User).count()
-                    
-                    # داده‌های نمودار
-                    end_date = datetime.now()
-                    dates = [(end_date - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(6, -1, -1)]
-                    
-                    def get_plat_data(plat):
-                        res = db.query(func.date(models.Order.created_at), func.sum(models.Order.total_amount))\
-                            .join(models.User).filter(models.User.platform == plat)\
-                            .filter(models.Order.status.in_(['approved', 'shipped', 'paid']))\
-                            .filter(models.Order.created_at >= (end_date - timedelta(days=7)))\
-                            .group_by(func.date(models.Order.created_at)).all()
-                        v_map = {r[0]: float(r[1]) for r in res if r[0]}
-                        return [v_map.get(d, 0) for d in dates]
-
-                    tg_sales = get_plat_data('telegram')
-                    rb_sales = get_plat_data('rubika')
-                    
-                    # موجودی کم
-                    low_stock = db.query(models.Product).filter(models.Product.stock < 10).limit(5).all()
-                    
-                    # فعالیت‌ها
-                    recent_orders = db.query(models.Order).order_by(models.Order.created_at.desc()).limit(5).all()
-                    is_open = crud.get_setting(db, "tg_is_open", "true") == "true"
-                    
-                    return {
-                        "rev_tg": rev_tg, "rev_rb": rev_rb, "pending": pending_orders, "users": total_users,
-                        "dates": dates, "tg_sales": tg_sales, "rb_sales": rb_sales,
-                        "low_stock": low_stock, "recent_orders": recent_orders, "is_open": is_open
-                    }
+                    snapshot = crud.get_dashboard_snapshot(db, since=since, activity_limit=ACTIVITY_LIMIT)
+                    # نمودار فقط در بارگذاری کامل یا وقتی اعداد فروش تغییر کرده باشند دوباره خوانده می‌شود
+                    totals = (snapshot['rev_tg'], snapshot['rev_rb'], snapshot['pending'])
+                    if full or totals != self._totals:
+                        snapshot['series'] = sales_series(db, self.chart_days)
+                    return snapshot
 
             data = await loop.run_in_executor(None, fetch_all)
+            if not full and self._cursor != since:
+                return  # در این فاصله بارگذاری کامل انجام شده است
+            self._cursor = data['cursor']
+            self._totals = (data['rev_tg'], data['rev_rb'], data['pending'])
             
-            # آپدیت کارت‌ها
-            self.card_rev_tg.set_data(int(data['rev_tg']))
-            self.card_rev_rb.set_data(int(data['rev_rb']))
-            self.card_orders.set_data(data['pending'])
-            self.card_users.set_data(data['users'])
+            # آپدیت کارت‌ها (فقط کارت‌هایی که عددشان عوض شده دوباره انیمیت می‌شوند)
+            for card, key in ((self.card_rev_tg, 'rev_tg'), (self.card_rev_rb, 'rev_rb'),
+                              (self.card_orders, 'pending'), (self.card_users, 'users')):
+                value = int(data[key])
+                if full or getattr(card, 'target_value', None) != value:
+                    card.set_data(value)
             
             # آپدیت نمودارها
-            self.update_chart(self.chart_tg, data['dates'], data['tg_sales'], COLOR_BLUE)
-            self.update_chart(self.chart_rb, data['dates'], data['rb_sales'], COLOR_PURPLE)
-            
-            # آپدیت فعالیت‌ها
-            for i in reversed(range(self.act_vbox.count() - 1)):
-                self.act_vbox.itemAt(i).widget().deleteLater()
+            if 'series' in data:
+                self.show_series(data['series'])
             
-            if not data['recent_orders']:
-                empty_lbl = QLabel("فعالیتی ثبت نشده")
-                empty_lbl.setStyleSheet("color: #555; padding: 10px;")
-                empty_lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.act_vbox.insertWidget(0, empty_lbl)
-            else:
-                for o in data['recent_orders']:
-                    if not o.user: continue
-                    msg = f"سفارش #{o.id} توسط {o.user.full_name}"
-                    time_str = o.created_at.strftime("%H:%M")
-                    self.act_vbox.insertWidget(0, ActivityItem(msg, time_str, o.user.platform, o.total_amount))
-
-            # آپدیت موجودی
-            for i in reversed(range(self.stock_list_lay.count())):
-                self.stock_list_lay.itemAt(i).widget().deleteLater()
-                
-            if not data['low_stock']:
-                empty_lbl = QLabel("✅ موجودی انبار مناسب است")
-                empty_lbl.setStyleSheet("color: #2cb67d; font-size: 12px; padding: 10px;")
-                self.stock_list_lay.addWidget(empty_lbl)
-            else:
-                for p in data['low_stock']:
-                    item = StockItem(p.name, p.stock)
-                    self.stock_list_lay.addWidget(item)
+            # آپدیت فعالیت‌ها: سفارشات جدید به بالای لیست اضافه می‌شوند
+            if full:
+                self._clear_layout(self.act_vbox, keep_last=1)
+                self.lbl_no_activity = None
+            if data['orders']:
+                if self.lbl_no_activity is not None:
+                    self.lbl_no_activity.deleteLater(); self.lbl_no_activity = None
+                for o in reversed(data['orders']):
+                    msg = f"سفارش #{o['id']} توسط {o['full_name']}"
+                    time_str = o['created_at'].strftime("%H:%M") if o['created_at'] else ""
+                    self.act_vbox.insertWidget(0, ActivityItem(msg, time_str, o['platform'], o['total_amount']))
+                # حذف قدیمی‌ترها (آخرین آیتم layout فاصله‌انداز است)
+                while self.act_vbox.count() - 1 > ACTIVITY_LIMIT:
+                    self.act_vbox.takeAt(self.act_vbox.count() - 2).widget().deleteLater()
+            elif full:
+                self.lbl_no_activity = QLabel("فعالیتی ثبت نشده")
+                self.lbl_no_activity.setStyleSheet("color: #555; padding: 10px;")
+                self.lbl_no_activity.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.act_vbox.insertWidget(0, self.lbl_no_activity)
+
+            # آپدیت موجودی (فقط اگر لیست موجودی کم تغییر کرده باشد)
+            if data['low_stock'] is not None:
+                self._clear_layout(self.stock_list_lay)
+                if not data['low_stock']:
+                    empty_lbl = QLabel("✅ موجودی انبار مناسب است")
+                    empty_lbl.setStyleSheet("color: #2cb67d; font-size: 12px; padding: 10px;")
+                    self.stock_list_lay.addWidget(empty_lbl)
+                else:
+                    for p in data['low_stock']:
+                        self.stock_list_lay.addWidget(StockItem(p['name'], p['stock']))
 
             self.update_shop_status_btn(data['is_open'])
             self.lbl_status.setText(f"آخرین بروزرسانی: {datetime.now().strftime('%H:%M:%S')}")
@@ -469,26 +437,62 @@ class DashboardWidget(QWidget):
             import traceback
             traceback.print_exc()
         finally:
-            self.btn_refresh.setIcon(qta.icon('fa5s.sync-alt', color='white'))
+            if full:
+                self.btn_refresh.setIcon(qta.icon('fa5s.sync-alt', color='white'))
+
+    @staticmethod
+    def _clear_layout(layout, keep_last=0):
+        for i in reversed(range(layout.count() - keep_last)):
+            layout.takeAt(i).widget().deleteLater()
+
+    @asyncSlot(int)
+    async def change_chart_range(self, days):
+        """تغییر بازه نمودار؛ فقط سری فروش دوباره خوانده می‌شود"""
+        self.chart_days = days
+        loop = asyncio.get_running_loop()
+        try:
+            def fetch():
+                with next(get_db()) as db:
+                    return sales_series(db, days)
+            series = await loop.run_in_executor(None, fetch)
+            if series.days == self.chart_days:
+                self.show_series(series)
+        except Exception as e:
+            logger.error(f"Dashboard chart error: {e}")
+
+    def show_series(self, series: SalesSeries):
+        self.series = series
+        self.chart_tg.set_series(series.labels, series.current['telegram'], series.previous['telegram'])
+        self.chart_rb.set_series(series.labels, series.current['rubika'], series.previous['rubika'])
+        self.update_yoy_label()
+
+    def update_yoy_label(self):
+        if not self.series: return
+        platform = 'telegram' if self.tabs.currentIndex() == 0 else 'rubika'
+        growth = self.series.growth(platform)
+        total = f"{int(self.series.total(platform)):,} تومان"
+        if growth is None:
+            self.lbl_yoy.setText(f"{total} | سال قبل: بدون داده")
+            self.lbl_yoy.setStyleSheet(f"color: {COLOR_GRAY}; font-size: 12px;")
+        else:
+            sign = "↑" if growth >= 0 else "↓"
+            color = COLOR_GREEN if growth >= 0 else COLOR_RED
+            self.lbl_yoy.setText(f"{total} | {sign} {abs(growth)}% نسبت به سال قبل")
+            self.lbl_yoy.setStyleSheet(f"color: {color}; font-size: 12px; font-weight: bold;")
 
-    def update_chart(self, canvas, dates, values, color):
-        ax = canvas.axes
-        ax.clear()
-        
-        # تبدیل تاریخ برای نمایش صحیح در نمودار
-        short_dates = [farsi_text_for_chart(d[5:].replace('-', '/')) for d in dates]
-        
-        ax.plot(short_dates, values, color=color, marker='o', linewidth=3, markersize=8, markerfacecolor=COLOR_BG, markeredgewidth=2, markeredgecolor=color)
-        ax.fill_between(short_dates, values, color=color, alpha=0.1)
-        
-        ax.set_ylim(0, max(values) * 1.2 if any(values) else 100)
-        ax.grid(True, axis='y', linestyle='--', alpha=0.1)
-        
-        # اعمال فونت فارسی روی محور افقی
-        if canvas.persian_font:
-            for label in ax.get_xticklabels():
-                label.set_fontproperties(canvas.persian_font)
-        canvas.draw()
+    @asyncSlot()
+    async def export_report(self):
+        if not self.series: return
+        path, _ = QFileDialog.getSaveFileName(self, "ذخیره گزارش فروش", f"sales_{self.series.days}d.png", "PNG (*.png);;PDF (*.pdf)")
+        if not path: return
+        colors = {"telegram": COLOR_BLUE, "rubika": COLOR_PURPLE}
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, render_sales_report, self.series, path, colors)
+            self.window().show_toast("گزارش ذخیره شد.")
+        except ImportError:
+            QMessageBox.warning(self, "خطا", "برای خروجی گزارش کتابخانه matplotlib لازم است.")
+        except Exception as e:
+            QMessageBox.critical(self, "خطا", str(e))
 
     def update_shop_status_btn(self, is_open):
         self.btn_status.setChecked(is_open)
@@ -508,4 +512,4 @@ class DashboardWidget(QWidget):
         await asyncio.get_running_loop().run_in_executor(
             None, lambda: crud.set_setting(next(get_db()), "tg_is_open", new_status)
         )
-        self.refresh_data()
\ No newline at end of file
+        self.refresh_delta()
\ No newline at end of file
@@ -1,6 +1,7 @@
 import sys
 import asyncio
 import logging
+import importlib
 from pathlib import Path
 from typing import Optional, Dict, Any, Callable
 
@@ -17,16 +18,22 @@ import qtawesome as qta
 
 from config import BASE_DIR
 
-# ایمپورت ویجت‌ها
-from .dashboard_widget import DashboardWidget
-from .categories_widget import CategoriesWidget
-from .products_widget import ProductsWidget
-from .orders_widget import OrdersWidget
-from .settings_widget import SettingsWidget
-from .users_widget import UsersWidget
-
 logger = logging.getLogger("MainWindow")
 
+# ماژول هر صفحه فقط هنگام اولین باز شدن آن صفحه import می‌شود (pandas، numpy و ... در شروع بارگذاری نمی‌شوند)
+PAGE_MODULES = {
+    0: (".dashboard_widget", "DashboardWidget"),
+    1: (".products_widget", "ProductsWidget"),
+    2: (".categories_widget", "CategoriesWidget"),
+    3: (".orders_widget", "OrdersWidget"),
+    4: (".users_widget", "UsersWidget"),
+    5: (".settings_widget", "SettingsWidget"),
+}
+
+def page_class(page_id: int):
+    module_name, class_name = PAGE_MODULES[page_id]
+    return getattr(importlib.import_module(module_name, __package__), class_name)
+
 class MainWindow(QMainWindow):
     PAGE_MAP = {
         0: ("داشبورد", "fa5s.chart-pie"),
@@ -37,7 +44,12 @@ class MainWindow(QMainWindow):
         5: ("تنظیمات", "fa5s.cog"),
     }
 
-    def __init__(self, bot_application: Optional[object] = None, rubika_client: Optional[object] = None):
+    def __init__(self, bot_application: Optional[object] = None, rubika_client: Optional[object] = None,
+                 open_first_page: bool = True):
+        """
+        open_first_page=False فقط پوسته پنجره را می‌سازد تا سریع نمایش داده شود؛
+        صفحات بعد از آماده شدن دیتابیس با set_ready() باز می‌شوند.
+        """
         super().__init__()
         self.bot_application = bot_application
         self.rubika_client = rubika_client
@@ -53,15 +65,17 @@ class MainWindow(QMainWindow):
         self._load_font()
         self.is_sidebar_collapsed = False
         self.pages: Dict[int, QWidget] = {}
+        self.is_ready = open_first_page
+        self._pending_page = 0
         
         # تعریف کلاس‌ها برای Lazy Loading
         self.page_factories = [
-            lambda: DashboardWidget(),
-            lambda: ProductsWidget(bot_app=self.bot_application),
-            lambda: CategoriesWidget(),
-            lambda: OrdersWidget(bot_app=self.bot_application, rubika_client=self.rubika_client),
-            lambda: UsersWidget(),
-            lambda: SettingsWidget(bot_app=self.bot_application, rubika_client=self.rubika_client)
+            lambda: page_class(0)(),
+            lambda: page_class(1)(bot_app=self.bot_application),
+            lambda: page_class(2)(),
+            lambda: page_class(3)(bot_app=self.bot_application, rubika_client=self.rubika_client),
+            lambda: page_class(4)(),
+            lambda: page_class(5)(bot_app=self.bot_application, rubika_client=self.rubika_client)
         ]
         
         self.setup_ui()
@@ -235,11 +249,25 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(content_margin)
         
         # بارگذاری صفحه اول
-        self.switch_page(0)
         self.nav_buttons[0].setChecked(True)
+        if self.is_ready:
+            self.switch_page(0)
+        else:
+            self.show_loading_state(True)
+
+    def set_ready(self):
+        """اعلام آماده بودن دیتابیس؛ صفحه انتخاب شده (پیش‌فرض داشبورد) ساخته و باز می‌شود"""
+        if self.is_ready:
+            return
+        self.is_ready = True
+        self.switch_page(self._pending_page)
 
     def switch_page(self, page_id):
         """مدیریت جابجایی بین صفحات با Lazy Loading"""
+        if not self.is_ready:
+            # تا پایان init_db فقط انتخاب کاربر به خاطر سپرده می‌شود
+            self._pending_page = page_id
+            return
         if page_id not in self.pages:
             self.show_loading_state(True)
             try:
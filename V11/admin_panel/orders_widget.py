@@ -1,11 +1,8 @@
 import asyncio
 import logging
+import importlib.util
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-try:
-    import pandas as pd
-except ImportError:
-    pd = None
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
@@ -548,13 +545,8 @@ class OrdersWidget(QWidget):
         try:
             def db_op():
                 with next(get_db()) as db:
-                    order = db.query(crud.models.Order).get(order_id)
-                    if order:
-                        order.status = new_status
-                        if tracking_code: order.tracking_code = tracking_code
-                        db.commit()
-                        return order
-                    return None
+                    # آمار خرید کاربر در همان تراکنش به‌روز می‌شود
+                    return crud.update_order_status(db, order_id, new_status, tracking_code=tracking_code)
 
             updated_order = await loop.run_in_executor(None, db_op)
 
@@ -681,7 +673,8 @@ class OrdersWidget(QWidget):
 
     @asyncSlot()
     async def export_to_excel(self):
-        if pd is None:
+        # pandas فقط هنگام خروجی گرفتن (در ترد جدا) import می‌شود
+        if importlib.util.find_spec("pandas") is None:
             QMessageBox.warning(self, "خطا", "کتابخانه pandas نصب نیست.")
             return
         file_path, _ = QFileDialog.getSaveFileName(self, "ذخیره اکسل", "Orders.xlsx", "Excel (*.xlsx)")
@@ -690,6 +683,7 @@ class OrdersWidget(QWidget):
         loop = asyncio.get_running_loop()
         try:
             def save():
+                import pandas as pd
                 data = self.all_orders_cache
                 if not data: return False
                 df = pd.DataFrame(data)
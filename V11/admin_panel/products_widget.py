@@ -1,28 +1,28 @@
 import asyncio
-import shutil
 import logging
 import os
-import pandas as pd
-from datetime import datetime
-from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit,
     QPushButton, QComboBox, QSpinBox, QMessageBox, QDoubleSpinBox,
     QFileDialog, QCheckBox, QScrollArea, QFrame, QGridLayout, 
-    QGraphicsDropShadowEffect, QSizePolicy, QButtonGroup, QAbstractSpinBox,
+    QSizePolicy, QButtonGroup, QAbstractSpinBox,
     QApplication, QMenu, QTableWidget, QTableWidgetItem, QHeaderView, 
-    QInputDialog, QAbstractItemView, QTabWidget, QDialog
+    QInputDialog, QAbstractItemView, QTabWidget, QDialog,
+    QListView, QStyledItemDelegate, QStyle, QToolTip
 )
-from PyQt6.QtGui import QPixmap, QDragEnterEvent, QDropEvent, QColor, QAction, QCursor, QFont, QDoubleValidator, QIcon, QMouseEvent
-from PyQt6.QtCore import Qt, QSize, QTimer, pyqtSignal, QEvent, QPropertyAnimation, QRect
+from PyQt6.QtGui import QPixmap, QDragEnterEvent, QDropEvent, QColor, QAction, QCursor, QFont, QDoubleValidator, QIcon, QMouseEvent, QPainter, QPainterPath, QPen
+from PyQt6.QtCore import Qt, QSize, QTimer, pyqtSignal, QEvent, QPropertyAnimation, QRect, QRectF, QPoint, QModelIndex, QAbstractListModel
 from qasync import asyncSlot
 import qtawesome as qta
 
 from db.database import get_db
 from db import crud
-from config import BASE_DIR, MEDIA_PRODUCTS_DIR
+from config import BASE_DIR
+from db.media_derivatives import media_derivatives
+from db.media_store import media_store
+from .thumbnails import ThumbnailCache
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +82,10 @@ class MultiImageManager(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.image_paths = []
+        # پیش‌نمایش‌ها در پس‌زمینه از بندانگشتی‌ها ساخته می‌شوند (نه از فایل اصلی در ترد UI)
+        self._labels = {}
+        self.thumbnails = ThumbnailCache(QSize(80, 80), max_items=50, workers=1, parent=self)
+        self.thumbnails.thumbnailReady.connect(self._on_thumbnail)
         self.layout = QHBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setSpacing(10)
@@ -98,6 +102,7 @@ class MultiImageManager(QWidget):
         if path in self.image_paths: self.image_paths.remove(path); self.refresh_ui()
 
     def refresh_ui(self):
+        self._labels.clear()
         for i in reversed(range(self.layout.count())): 
             item = self.layout.itemAt(i)
             if item.widget(): item.widget().setParent(None)
@@ -110,9 +115,10 @@ class MultiImageManager(QWidget):
                 container.setFixedSize(100, 100)
                 container.setStyleSheet(f"background: {BG_COLOR}; border-radius: 8px; border: 1px solid {BORDER_COLOR};")
                 l = QVBoxLayout(container); l.setContentsMargins(5, 5, 5, 5)
-                lbl_img = QLabel(); lbl_img.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                pix = QPixmap(full_path)
-                lbl_img.setPixmap(pix.scaled(80, 80, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+                lbl_img = QLabel("⏳"); lbl_img.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                self._labels[full_path] = lbl_img
+                pix = self.thumbnails.get(full_path)
+                if pix is not None: self._show_thumbnail(lbl_img, pix)
                 btn_del = QPushButton("×")
                 btn_del.setFixedSize(20, 20)
                 btn_del.setStyleSheet(f"background: {DANGER_COLOR}; color: white; border-radius: 10px; font-weight: bold; border: none;")
@@ -127,6 +133,14 @@ class MultiImageManager(QWidget):
         btn_add.clicked.connect(self.browse_files)
         self.layout.addWidget(btn_add)
 
+    def _show_thumbnail(self, label, pix):
+        label.setPixmap(pix.scaled(80, 80, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+
+    def _on_thumbnail(self, path):
+        label = self._labels.get(path)
+        pix = self.thumbnails.get(path)
+        if label is not None and pix is not None: self._show_thumbnail(label, pix)
+
     def browse_files(self):
         files, _ = QFileDialog.getOpenFileNames(self, "انتخاب تصاویر", "", "Images (*.jpg *.png *.jpeg *.webp)")
         if files: self.add_images(files)
@@ -289,182 +303,413 @@ class ProductEditorDialog(QDialog):
             "related_product_ids": self.inp_rel.text(), "is_top_seller": self.chk_top.isChecked()
         }
         raw_images = self.img_manager.get_images()
-        final_images = []
-        for img_path in raw_images:
-            if str(MEDIA_PRODUCTS_DIR) not in os.path.abspath(img_path):
-                ext = Path(img_path).suffix
-                fname = f"prod_{datetime.now().strftime('%Y%m%d%H%M%S_%f')}{ext}"
-                dest = MEDIA_PRODUCTS_DIR / fname
-                try: shutil.copy(img_path, dest); final_images.append(f"media/products/{fname}")
-                except: pass
-            else:
-                if os.path.isabs(img_path): final_images.append(os.path.relpath(img_path, BASE_DIR).replace("\\", "/"))
-                else: final_images.append(img_path)
-        
         variants = self.variant_mgr.get_data()
         loop = asyncio.get_running_loop()
         try:
             def db_op():
+                # ثبت تصاویر (هش، ذخیره یکتا، حذف EXIF و فشرده‌سازی) در ترد پس‌زمینه
+                final_images = media_store.ingest_many(raw_images)
                 with next(get_db()) as db:
                     if self.product_id:
-                        if final_images: data["image_path"] = final_images[0]
-                        crud.update_product_with_variants(db, self.product_id, data, variants)
+                        crud.update_product_with_variants(db, self.product_id, data, variants, image_paths=final_images)
                     else:
                         crud.create_product_with_variants(db, data, variants, image_paths=final_images)
+                # بندانگشتی و عکس بهینه ربات‌ها همین حالا (یک بار) ساخته می‌شوند
+                media_derivatives.build_many(BASE_DIR / p for p in final_images)
             await loop.run_in_executor(None, db_op)
             self.product_saved.emit(); self.accept()
         except Exception as e: QMessageBox.critical(self, "خطا", str(e))
 
 # ==============================================================================
-# Card Widget (با Quick Edit)
+# Model: لیست محصولات (بارگذاری تدریجی)
 # ==============================================================================
-class ProductCard(QFrame):
-    selectionChanged = pyqtSignal(int, bool)
-    quickUpdateRequested = pyqtSignal(int, str, int) # ID, Field, Value
-
-    def __init__(self, product, parent_widget):
-        super().__init__()
-        self.product = product
-        self.p_widget = parent_widget
-        self.setFixedSize(260, 450)
-        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
-        
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setBlurRadius(20); shadow.setColor(QColor(0,0,0,80)); shadow.setOffset(0,5)
-        self.setGraphicsEffect(shadow)
+PAGE_SIZE = 40
+# ترتیب گزینه‌های cmb_sort -> sort_by در crud.advanced_search_products
+SORT_KEYS = ["newest", "price_desc", "price_asc", "stock_desc", "stock_asc"]
+
+def _product_image(product) -> Optional[str]:
+    img_path = None
+    if getattr(product, 'images', None): img_path = product.images[0].image_path
+    elif getattr(product, 'image_path', None): img_path = product.image_path
+    if not img_path: return None
+    full_path = BASE_DIR / img_path
+    return str(full_path) if full_path.exists() else None
+
+class ProductsListModel(QAbstractListModel):
+    """
+    مدل گرید محصولات؛ صفحه‌ها (PAGE_SIZE) با canFetchMore/fetchMore در ترد جداگانه
+    از crud.advanced_search_products خوانده می‌شوند.
+    """
+    ProductRole = Qt.ItemDataRole.UserRole + 1
+    ImageRole = Qt.ItemDataRole.UserRole + 2
+    pageLoaded = pyqtSignal(int, int)      # (تعداد بارگذاری شده، کل)
+    selectionChanged = pyqtSignal(int)
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self._products: List[Any] = []
+        self._images: List[Optional[str]] = []
+        self._rows: Dict[int, int] = {}
+        self._image_rows: Dict[str, List[int]] = {}
+        self.selected_ids: Set[int] = set()
+        self._filters: dict = {}
+        self._generation = 0
+        self._total: Optional[int] = None
+        self._loading = False
+        thumbnails.thumbnailReady.connect(self._on_thumbnail)
+
+    # --- QAbstractListModel ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._products)
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsUserCheckable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._products): return None
+        product = self._products[index.row()]
+        if role == self.ProductRole: return product
+        if role == self.ImageRole: return self._images[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole: return product.name
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if product.id in self.selected_ids else Qt.CheckState.Unchecked
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole: return False
+        pid = self._products[index.row()].id
+        if value == Qt.CheckState.Checked: self.selected_ids.add(pid)
+        else: self.selected_ids.discard(pid)
+        self.dataChanged.emit(index, index, [role])
+        self.selectionChanged.emit(len(self.selected_ids))
+        return True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._loading: return False
+        return self._total is None or len(self._products) < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent): return
+        self._loading = True
+        asyncio.ensure_future(self._load_page(self._generation, len(self._products)))
+
+    # --- بارگذاری ---
+    def reset(self, filters: dict):
+        """شروع لیست جدید با فیلترهای داده شده (انتخاب‌ها پاک می‌شوند)"""
+        self.beginResetModel()
+        self._generation += 1
+        self._filters = filters
+        self._products, self._images, self._rows, self._image_rows = [], [], {}, {}
+        self.selected_ids.clear()
+        self._total, self._loading = None, False
+        self.endResetModel()
+        self.selectionChanged.emit(0)
+        self.fetchMore()
+
+    async def _load_page(self, generation, offset):
+        filters = self._filters
+        loop = asyncio.get_running_loop()
+        try:
+            prods, images, total = await loop.run_in_executor(None, lambda: self._fetch_page(filters, offset))
+        except Exception as e:
+            logger.error(f"Refresh error: {e}")
+            prods, images, total = [], [], offset
+        # صفحه‌ای که بعد از تغییر فیلتر برسد دور ریخته می‌شود
+        if generation != self._generation: return
+        self._loading = False
+        if offset != len(self._products):
+            # ردیف‌ها در حین بارگذاری حذف/اضافه شده‌اند؛ صفحه از offset جدید خوانده می‌شود
+            self.fetchMore()
+            return
+        if total is not None: self._total = total
+        if len(prods) < PAGE_SIZE: self._total = offset + len(prods)
+        # محصولی که با درج در صفحات قبلی جابه‌جا شده و از قبل در لیست است تکرار نمی‌شود
+        fresh = [(p, img) for p, img in zip(prods, images) if p.id not in self._rows]
+        if fresh:
+            self.beginInsertRows(QModelIndex(), offset, offset + len(fresh) - 1)
+            for row, (p, img) in enumerate(fresh, offset):
+                self._rows[p.id] = row
+                if img: self._image_rows.setdefault(img, []).append(row)
+                self._products.append(p); self._images.append(img)
+            self.endInsertRows()
+        self.pageLoaded.emit(len(self._products), self._total)
+
+    @staticmethod
+    def _fetch_page(filters, offset, with_total=False):
+        with next(get_db()) as db:
+            prods = crud.advanced_search_products(db, limit=PAGE_SIZE, offset=offset, **filters)
+            total = crud.get_product_search_count(db, **filters) if offset == 0 or with_total else None
+            # بررسی وجود فایل تصویر هم در همین ترد انجام می‌شود
+            return prods, [_product_image(p) for p in prods], total
+
+    def _reindex(self):
+        self._rows = {p.id: row for row, p in enumerate(self._products)}
+        self._image_rows = {}
+        for row, img in enumerate(self._images):
+            if img: self._image_rows.setdefault(img, []).append(row)
+
+    def row_of(self, pid) -> Optional[int]:
+        return self._rows.get(pid)
+
+    def remove_products(self, pids):
+        """حذف درجای ردیف محصولات حذف شده؛ صفحات بارگذاری شده، اسکرول و انتخاب‌ها حفظ می‌شوند"""
+        pids = set(pids)
+        rows = sorted((self._rows[pid] for pid in pids if pid in self._rows), reverse=True)
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._products[row]; del self._images[row]
+            self.endRemoveRows()
+        if rows:
+            self._reindex()
+            if self._total is not None: self._total = max(self._total - len(rows), 0)
+        if self.selected_ids & pids:
+            self.selected_ids -= pids
+            self.selectionChanged.emit(len(self.selected_ids))
+        if self._total is not None:
+            self.pageLoaded.emit(len(self._products), self._total)
+
+    async def refresh_page(self, offset: int):
+        """
+        بارگذاری مجدد یک صفحه و تعداد کل (مثلاً بعد از تکثیر محصول).
+        محصولات جدید صفحه در جای خود درج و بقیه ردیف‌ها به‌روز می‌شوند؛ بقیه لیست دست نمی‌خورد.
+        """
+        generation, filters = self._generation, self._filters
+        loop = asyncio.get_running_loop()
+        try:
+            prods, images, total = await loop.run_in_executor(
+                None, lambda: self._fetch_page(filters, offset, with_total=True))
+        except Exception as e:
+            logger.error(f"Refresh error: {e}")
+            return
+        if generation != self._generation: return
+        self._total = total
+        for row, (p, img) in enumerate(zip(prods, images), offset):
+            if row > len(self._products): break
+            current = self._rows.get(p.id)
+            if current is not None:
+                self._products[current], self._images[current] = p, img
+                idx = self.index(current)
+                self.dataChanged.emit(idx, idx)
+                continue
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._products.insert(row, p); self._images.insert(row, img)
+            self._reindex()
+            self.endInsertRows()
+        self.pageLoaded.emit(len(self._products), self._total)
+
+    def update_product(self, pid, **fields):
+        row = self._rows.get(pid)
+        if row is None: return
+        product = self._products[row]
+        for key, value in fields.items(): setattr(product, key, value)
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx)
+
+    def _on_thumbnail(self, path):
+        for row in self._image_rows.get(path, []):
+            idx = self.index(row)
+            self.dataChanged.emit(idx, idx, [self.ImageRole])
 
-        self.setStyleSheet(f"QFrame {{ background-color: {PANEL_BG}; border-radius: 14px; border: 1px solid {BORDER_COLOR}; }} QFrame:hover {{ border: 1px solid {ACCENT_COLOR}; }}")
-        
-        layout = QVBoxLayout(self); layout.setContentsMargins(0, 0, 0, 0); layout.setSpacing(0)
+# ==============================================================================
+# Delegate: کارت محصول (با Quick Edit)
+# ==============================================================================
+class ProductCardDelegate(QStyledItemDelegate):
+    """
+    رسم کارت محصول؛ تصویر از ThumbnailCache خوانده می‌شود و تا آماده شدن جای خالی رسم می‌گردد.
+    کلیک دکمه‌ها و دابل‌کلیک روی موجودی در editorEvent به سیگنال تبدیل می‌شود.
+    """
+    CARD_SIZE = QSize(260, 360)
+    IMAGE_HEIGHT = 170
+    stockEditRequested = pyqtSignal(object)
+    copyLinkRequested = pyqtSignal(object, str)   # (محصول، telegram/rubika)
+    deleteRequested = pyqtSignal(object)
+    duplicateRequested = pyqtSignal(object)
+    editRequested = pyqtSignal(object)
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self._pixmaps: Dict[tuple, QPixmap] = {}
+
+    def _pixmap(self, icon, color, size) -> QPixmap:
+        key = (icon, color, size)
+        if key not in self._pixmaps:
+            self._pixmaps[key] = qta.icon(icon, color=color).pixmap(size, size)
+        return self._pixmaps[key]
+
+    def sizeHint(self, option, index):
+        return self.CARD_SIZE
+
+    def _rects(self, option) -> dict:
+        """جایگاه اجزای کارت؛ بخش متنی چپ‌چین محاسبه و برای راست‌چین قرینه می‌شود"""
+        card = option.rect.adjusted(2, 2, -2, -8)
+        image = QRect(card.left(), card.top(), card.width(), self.IMAGE_HEIGHT)
+        inner = QRect(card.left() + 12, image.bottom() + 11, card.width() - 24, card.bottom() - image.bottom() - 20)
+        r = {}
+        r["name"] = QRect(inner.left(), inner.top(), inner.width(), 40)
+        r["meta"] = QRect(inner.left(), inner.top() + 45, inner.width(), 18)
+        r["price"] = QRect(inner.left(), inner.top() + 68, inner.width() * 3 // 5, 24)
+        r["stock"] = QRect(r["price"].right() + 1, inner.top() + 68, inner.width() - r["price"].width(), 24)
+        r["tg"] = QRect(inner.left(), inner.top() + 97, 56, 28)
+        r["rb"] = r["tg"].translated(61, 0)
+        r["del"] = QRect(inner.left(), inner.top() + 130, 32, 32)
+        r["dup"] = r["del"].translated(37, 0)
+        r["edit"] = QRect(r["dup"].right() + 6, inner.top() + 130, inner.right() - r["dup"].right() - 5, 32)
+        r = {k: QStyle.visualRect(option.direction, card, v) for k, v in r.items()}
+        r.update(card=card, image=image, check=QRect(image.left() + 10, image.top() + 140, 22, 22))
+        return r
+
+    def _draw_icon(self, painter, rect, icon, color, size):
+        target = QRect(0, 0, size, size)
+        target.moveCenter(rect.center())
+        painter.drawPixmap(target, self._pixmap(icon, color, size))
+
+    def _draw_button(self, painter, rect, icon, icon_color, bg, text=None, font=None):
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(bg))
+        painter.drawRoundedRect(QRectF(rect), 6, 6)
+        if not text:
+            return self._draw_icon(painter, rect, icon, icon_color, 14)
+        bold = QFont(font); bold.setBold(True)
+        painter.setFont(bold)
+        width = 14 + 6 + painter.fontMetrics().horizontalAdvance(text)
+        left = rect.center().x() - width // 2
+        self._draw_icon(painter, QRect(left, rect.top(), 14, rect.height()), icon, icon_color, 14)
+        painter.setPen(QColor("white"))
+        painter.drawText(QRect(left + 20, rect.top(), width - 20, rect.height()), Qt.AlignmentFlag.AlignVCenter, text)
+
+    def _draw_badge(self, painter, image, text, color, font, right=False):
+        small = QFont(font); small.setBold(True); small.setPixelSize(10)
+        painter.setFont(small)
+        width = painter.fontMetrics().horizontalAdvance(text) + 16
+        rect = QRect(image.right() - width - 9 if right else image.left() + 10, image.top() + 10, width, 20)
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(color))
+        painter.drawRoundedRect(QRectF(rect), 4, 4)
+        painter.setPen(QColor("white"))
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text)
+
+    def paint(self, painter, option, index):
+        product = index.data(ProductsListModel.ProductRole)
+        if product is None: return
+        r = self._rects(option)
+        lead = QStyle.visualAlignment(option.direction, Qt.AlignmentFlag.AlignLeft)
+        trail = QStyle.visualAlignment(option.direction, Qt.AlignmentFlag.AlignRight)
+        font = QFont(option.font)
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # --- قاب و سایه ---
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(0, 0, 0, 80))
+        painter.drawRoundedRect(QRectF(r["card"].translated(0, 5)), 14, 14)
+        painter.setBrush(QColor(PANEL_BG))
+        painter.drawRoundedRect(QRectF(r["card"]), 14, 14)
+
+        # --- تصویر ---
+        painter.save()
+        clip = QPainterPath(); clip.addRoundedRect(QRectF(r["card"]), 14, 14)
+        painter.setClipPath(clip)
+        painter.fillRect(r["image"], QColor(BG_COLOR))
+        image_path = index.data(ProductsListModel.ImageRole)
+        pixmap = self.thumbnails.get(image_path) if image_path else None
+        if pixmap is not None:
+            # برش وسط تصویر (معادل KeepAspectRatioByExpanding)
+            source = QRect(QPoint(0, 0), r["image"].size().scaled(pixmap.size(), Qt.AspectRatioMode.KeepAspectRatio))
+            source.moveCenter(pixmap.rect().center())
+            painter.drawPixmap(r["image"], pixmap, source)
+        else:
+            big = QFont(font); big.setPixelSize(28); painter.setFont(big)
+            painter.setPen(QColor(TEXT_SUB))
+            painter.drawText(r["image"], Qt.AlignmentFlag.AlignCenter, "📷")
+        painter.restore()
 
-        # تصویر
-        img_container = QWidget(); img_container.setFixedHeight(170)
-        img_layout = QVBoxLayout(img_container); img_layout.setContentsMargins(0,0,0,0)
-        self.img_lbl = QLabel(); self.img_lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.img_lbl.setStyleSheet(f"background-color: {BG_COLOR}; border-top-left-radius: 13px; border-top-right-radius: 13px;")
-        
-        img_path = None
-        if hasattr(product, 'images') and product.images: img_path = product.images[0].image_path
-        elif hasattr(product, 'image_path') and product.image_path: img_path = product.image_path
-            
-        if img_path:
-            full_path = BASE_DIR / img_path
-            if full_path.exists():
-                pix = QPixmap(str(full_path))
-                self.img_lbl.setPixmap(pix.scaled(260, 170, Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation))
-            else: self.img_lbl.setText("📷")
-        else: self.img_lbl.setText("📷")
-        
         # برچسب‌های وضعیت
         if product.stock == 0:
-            self._add_badge("ناموجود", DANGER_COLOR, img_container)
+            self._draw_badge(painter, r["image"], "ناموجود", DANGER_COLOR, font)
         elif product.is_top_seller:
-            self._add_badge("پرفروش", SUCCESS_COLOR, img_container, right=True)
+            self._draw_badge(painter, r["image"], "پرفروش", SUCCESS_COLOR, font, right=True)
         elif product.discount_price and product.discount_price > 0:
-            self._add_badge("تخفیف‌دار", WARNING_COLOR, img_container, right=True)
-        
-        # چک‌باکس
-        self.chk_select = QCheckBox(img_container)
-        self.chk_select.move(10, 140); self.chk_select.setFixedSize(22, 22)
-        self.chk_select.stateChanged.connect(self.on_checked)
-        self.chk_select.setStyleSheet(f"QCheckBox::indicator {{ width: 18px; height: 18px; border-radius: 5px; border: 2px solid {ACCENT_COLOR}; background: rgba(0,0,0,0.5); }} QCheckBox::indicator:checked {{ background: {SUCCESS_COLOR}; }}")
-        
-        img_layout.addWidget(self.img_lbl)
-        layout.addWidget(img_container)
+            self._draw_badge(painter, r["image"], "تخفیف‌دار", WARNING_COLOR, font, right=True)
 
-        # اطلاعات
-        content = QWidget(); c_layout = QVBoxLayout(content); c_layout.setContentsMargins(12, 10, 12, 10); c_layout.setSpacing(5)
-        
-        lbl_name = QLabel(product.name); lbl_name.setWordWrap(True); lbl_name.setFixedHeight(40)
-        lbl_name.setStyleSheet(f"font-weight: bold; font-size: 14px; color: {TEXT_MAIN};")
-        
+        # چک‌باکس
+        checked = index.data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        painter.setPen(QPen(QColor(ACCENT_COLOR), 2))
+        painter.setBrush(QColor(SUCCESS_COLOR) if checked else QColor(0, 0, 0, 128))
+        painter.drawRoundedRect(QRectF(r["check"].adjusted(2, 2, -2, -2)), 5, 5)
+        if checked: self._draw_icon(painter, r["check"], "fa5s.check", "white", 12)
+
+        painter.setPen(QPen(QColor(ACCENT_COLOR if hovered else BORDER_COLOR), 1)); painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRoundedRect(QRectF(r["card"]), 14, 14)
+
+        # --- اطلاعات ---
+        name_font = QFont(font); name_font.setBold(True); name_font.setPixelSize(14)
+        painter.setFont(name_font); painter.setPen(QColor(TEXT_MAIN))
+        painter.drawText(r["name"], lead | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap, product.name)
+        small = QFont(font); small.setPixelSize(11)
+        painter.setFont(small); painter.setPen(QColor(TEXT_SUB))
         cat_name = product.category.name if product.category else "بدون دسته"
-        lbl_meta = QLabel(f"📂 {cat_name}"); lbl_meta.setStyleSheet(f"color: {TEXT_SUB}; font-size: 11px;")
-        
-        row_price = QHBoxLayout()
+        painter.drawText(r["meta"], lead | Qt.AlignmentFlag.AlignVCenter, f"📂 {cat_name}")
+
+        price_font = QFont(font); price_font.setBold(True); price_font.setPixelSize(14)
+        painter.setFont(price_font)
         if product.discount_price and product.discount_price > 0:
-             lbl_price = QLabel(f"{int(product.discount_price):,} ت"); lbl_price.setStyleSheet(f"color: {WARNING_COLOR}; font-weight: bold; font-size: 14px;")
-             lbl_old = QLabel(f"{int(product.price):,}"); lbl_old.setStyleSheet(f"color: {TEXT_SUB}; font-size: 10px; text-decoration: line-through;")
-             row_price.addWidget(lbl_price); row_price.addWidget(lbl_old)
+            text = f"{int(product.discount_price):,} ت"
+            painter.setPen(QColor(WARNING_COLOR))
+            painter.drawText(r["price"], lead | Qt.AlignmentFlag.AlignVCenter, text)
+            shift = painter.fontMetrics().horizontalAdvance(text) + 6
+            if option.direction == Qt.LayoutDirection.RightToLeft: old_rect = r["price"].adjusted(0, 0, -shift, 0)
+            else: old_rect = r["price"].adjusted(shift, 0, 0, 0)
+            old_font = QFont(font); old_font.setPixelSize(10); old_font.setStrikeOut(True)
+            painter.setFont(old_font); painter.setPen(QColor(TEXT_SUB))
+            painter.drawText(old_rect, lead | Qt.AlignmentFlag.AlignVCenter, f"{int(product.price):,}")
         else:
-             lbl_price = QLabel(f"{int(product.price):,} تومان"); lbl_price.setStyleSheet(f"color: {SUCCESS_COLOR}; font-weight: bold; font-size: 14px;")
-             row_price.addWidget(lbl_price)
-
-        # موجودی با قابلیت دابل کلیک
-        stock_color = DANGER_COLOR if product.stock < 5 else TEXT_SUB
-        self.lbl_stock = QLabel(f"📦 موجودی: {product.stock}")
-        self.lbl_stock.setStyleSheet(f"color: {stock_color}; font-size: 12px; font-weight: bold; padding: 2px;")
-        self.lbl_stock.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.lbl_stock.setToolTip("دابل کلیک برای ویرایش سریع")
-        self.lbl_stock.mouseDoubleClickEvent = lambda e: self._quick_edit_stock()
-        
-        row_price.addStretch(); row_price.addWidget(self.lbl_stock)
-        
-        c_layout.addWidget(lbl_name); c_layout.addWidget(lbl_meta); c_layout.addLayout(row_price)
-        
-        # دکمه‌های کپی لینک
-        link_layout = QHBoxLayout(); link_layout.setSpacing(5)
-        self.btn_tg = QPushButton(); self.btn_tg.setIcon(qta.icon('fa5b.telegram', color='white'))
-        self.btn_tg.setFixedHeight(28); self.btn_tg.setToolTip("کپی لینک تلگرام")
-        self.btn_tg.setStyleSheet(f"background: #2980b9; border-radius: 6px;")
-        self.btn_tg.clicked.connect(self.copy_tg_link)
-        
-        self.btn_rb = QPushButton(); self.btn_rb.setIcon(qta.icon('fa5s.infinity', color='white'))
-        self.btn_rb.setFixedHeight(28); self.btn_rb.setToolTip("کپی لینک روبیکا")
-        self.btn_rb.setStyleSheet(f"background: #8e44ad; border-radius: 6px;")
-        self.btn_rb.clicked.connect(self.copy_rb_link)
-        
-        link_layout.addWidget(self.btn_tg); link_layout.addWidget(self.btn_rb); link_layout.addStretch()
-        c_layout.addLayout(link_layout)
-        
-        # دکمه‌های عملیاتی
-        h_btn = QHBoxLayout(); h_btn.setSpacing(5)
-        
-        btn_del = QPushButton(); btn_del.setIcon(qta.icon('fa5s.trash', color=DANGER_COLOR))
-        btn_del.setFixedSize(32, 32); btn_del.setStyleSheet(f"background: {BG_COLOR}; border-radius: 6px;")
-        btn_del.clicked.connect(lambda: self.p_widget.delete_product_single(self.product.id))
-
-        btn_dup = QPushButton(); btn_dup.setIcon(qta.icon('fa5s.copy', color=INFO_COLOR))
-        btn_dup.setFixedSize(32, 32); btn_dup.setStyleSheet(f"background: {BG_COLOR}; border-radius: 6px;")
-        btn_dup.setToolTip("تکثیر محصول")
-        btn_dup.clicked.connect(lambda: self.p_widget.duplicate_product(self.product.id))
-
-        btn_edit = QPushButton("ویرایش"); btn_edit.setIcon(qta.icon('fa5s.pen', color='white'))
-        btn_edit.setStyleSheet(f"background: {ACCENT_COLOR}; border: none; border-radius: 6px; color: white; height: 32px; font-weight: bold;")
-        btn_edit.clicked.connect(lambda: self.p_widget.open_editor_dialog(self.product.id))
-        
-        h_btn.addWidget(btn_del); h_btn.addWidget(btn_dup); h_btn.addWidget(btn_edit, 1)
-        c_layout.addLayout(h_btn)
-        
-        layout.addWidget(content)
-
-    def _add_badge(self, text, color, parent, right=False):
-        lbl = QLabel(text, parent)
-        lbl.setStyleSheet(f"background: {color}; color: white; padding: 3px 8px; border-radius: 4px; font-weight: bold; font-size: 10px;")
-        lbl.adjustSize()
-        x = parent.width() - lbl.width() - 10 if right else 10
-        lbl.move(x, 10)
-
-    def _quick_edit_stock(self):
-        val, ok = QInputDialog.getInt(self, "ویرایش سریع موجودی", f"موجی جدید برای {self.product.name}:", value=self.product.stock, min=0)
-        if ok:
-            self.quickUpdateRequested.emit(self.product.id, "stock", val)
-            # آپدیت ظاهری موقت تا رفرش بعدی
-            self.lbl_stock.setText(f"📦 موجودی: {val}")
-            self.product.stock = val # آپدیت مدل داخلی
-
-    def on_checked(self, state):
-        self.selectionChanged.emit(self.product.id, state == 2)
-
-    def copy_tg_link(self):
-        bot = self.p_widget.bot_username or "Bot"
-        QApplication.clipboard().setText(f"https://t.me/{bot}?start=p_{self.product.id}")
-        self.p_widget.window().show_toast("لینک تلگرام کپی شد")
-
-    def copy_rb_link(self):
-        rb = self.p_widget.rubika_username or "Bot"
-        QApplication.clipboard().setText(f"https://rubika.ir/{rb}?start=p_{self.product.id}")
-        self.p_widget.window().show_toast("لینک روبیکا کپی شد")
+            painter.setPen(QColor(SUCCESS_COLOR))
+            painter.drawText(r["price"], lead | Qt.AlignmentFlag.AlignVCenter, f"{int(product.price):,} تومان")
+
+        stock_font = QFont(font); stock_font.setBold(True); stock_font.setPixelSize(12)
+        painter.setFont(stock_font); painter.setPen(QColor(DANGER_COLOR if product.stock < 5 else TEXT_SUB))
+        painter.drawText(r["stock"], trail | Qt.AlignmentFlag.AlignVCenter, f"📦 موجودی: {product.stock}")
+
+        # --- دکمه‌ها ---
+        self._draw_button(painter, r["tg"], "fa5b.telegram", "white", "#2980b9")
+        self._draw_button(painter, r["rb"], "fa5s.infinity", "white", "#8e44ad")
+        self._draw_button(painter, r["del"], "fa5s.trash", DANGER_COLOR, BG_COLOR)
+        self._draw_button(painter, r["dup"], "fa5s.copy", INFO_COLOR, BG_COLOR)
+        self._draw_button(painter, r["edit"], "fa5s.pen", "white", ACCENT_COLOR, "ویرایش", font)
+        painter.restore()
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.Type.ToolTip:
+            r = self._rects(option)
+            tips = {"stock": "دابل کلیک برای ویرایش سریع", "tg": "کپی لینک تلگرام",
+                    "rb": "کپی لینک روبیکا", "dup": "تکثیر محصول"}
+            hit = next((k for k in tips if r[k].contains(event.pos())), None)
+            if hit:
+                QToolTip.showText(event.globalPos(), tips[hit], view)
+                return True
+        return super().helpEvent(event, view, option, index)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.Type.MouseButtonRelease, QEvent.Type.MouseButtonDblClick):
+            return False
+        if event.button() != Qt.MouseButton.LeftButton: return False
+        r = self._rects(option)
+        pos = event.position().toPoint()
+        hit = next((k for k in ("check", "stock", "tg", "rb", "del", "dup", "edit") if r[k].contains(pos)), None)
+        if hit is None: return False
+        product = index.data(ProductsListModel.ProductRole)
+        if event.type() == QEvent.Type.MouseButtonDblClick:
+            if hit == "stock": self.stockEditRequested.emit(product)
+            return True
+        if hit == "check":
+            checked = index.data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+            model.setData(index, Qt.CheckState.Unchecked if checked else Qt.CheckState.Checked, Qt.ItemDataRole.CheckStateRole)
+        elif hit in ("tg", "rb"):
+            self.copyLinkRequested.emit(product, "telegram" if hit == "tg" else "rubika")
+        elif hit == "del": self.deleteRequested.emit(product)
+        elif hit == "dup": self.duplicateRequested.emit(product)
+        elif hit == "edit": self.editRequested.emit(product)
+        return True
 
 # ==============================================================================
 # Main Widget
@@ -474,7 +719,6 @@ class ProductsWidget(QWidget):
         super().__init__()
         self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
         self.bot_app = bot_app
-        self.selected_ids = set()
         self.bot_username = "MyBot"
         self.rubika_username = "MyShopBot"
         self.setup_ui()
@@ -513,6 +757,8 @@ class ProductsWidget(QWidget):
         self.inp_search = QLineEdit(); self.inp_search.setPlaceholderText("🔍 جستجو...")
         self.inp_search.setStyleSheet(f"background: {BG_COLOR}; border: 1px solid {BORDER_COLOR}; padding: 10px; border-radius: 8px; color: white;")
         self.inp_search.returnPressed.connect(self.refresh_data_slot)
+        self.search_timer = QTimer(); self.search_timer.setSingleShot(True); self.search_timer.timeout.connect(self.refresh_data_slot)
+        self.inp_search.textChanged.connect(lambda: self.search_timer.start(400))
         
         self.cmb_cat_filter = QComboBox(); self.cmb_cat_filter.addItem("همه دسته‌ها", None)
         self.cmb_cat_filter.setStyleSheet(f"background: {BG_COLOR}; color: white; padding: 8px; border-radius: 8px;")
@@ -534,14 +780,34 @@ class ProductsWidget(QWidget):
         s_layout.addWidget(btn_search); s_layout.addWidget(btn_add)
         layout.addWidget(search_box)
 
-        # گرید
-        scroll = QScrollArea(); scroll.setWidgetResizable(True); scroll.setStyleSheet("background: transparent; border: none;")
-        self.grid_container = QWidget()
-        self.grid_layout = QGridLayout(self.grid_container)
-        self.grid_layout.setSpacing(20)
-        self.grid_layout.setAlignment(Qt.AlignmentFlag.AlignTop|Qt.AlignmentFlag.AlignLeft)
-        scroll.setWidget(self.grid_container)
-        layout.addWidget(scroll)
+        # گرید (Model/View)
+        self.thumbnails = ThumbnailCache(QSize(ProductCardDelegate.CARD_SIZE.width(), ProductCardDelegate.IMAGE_HEIGHT), parent=self)
+        self.model = ProductsListModel(self.thumbnails, self)
+        self.model.pageLoaded.connect(self._on_page_loaded)
+        self.model.selectionChanged.connect(self.update_bulk_toolbar)
+        self.delegate = ProductCardDelegate(self.thumbnails, self)
+        self.delegate.stockEditRequested.connect(self._quick_edit_stock)
+        self.delegate.copyLinkRequested.connect(self.copy_link)
+        self.delegate.deleteRequested.connect(lambda p: self.delete_product_single(p.id))
+        self.delegate.duplicateRequested.connect(lambda p: self.duplicate_product(p.id))
+        self.delegate.editRequested.connect(lambda p: self.open_editor_dialog(p.id))
+
+        self.grid_view = QListView()
+        self.grid_view.setViewMode(QListView.ViewMode.IconMode)
+        self.grid_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.grid_view.setMovement(QListView.Movement.Static)
+        self.grid_view.setUniformItemSizes(True)
+        self.grid_view.setSpacing(9)
+        self.grid_view.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.grid_view.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.grid_view.setMouseTracking(True)
+        self.grid_view.viewport().setAttribute(Qt.WidgetAttribute.WA_Hover)
+        self.grid_view.setStyleSheet("QListView { background: transparent; border: none; }")
+        self.grid_view.setModel(self.model)
+        self.grid_view.setItemDelegate(self.delegate)
+        # صفحه بعد کمی قبل از رسیدن به انتهای گرید خوانده می‌شود
+        self.grid_view.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        layout.addWidget(self.grid_view)
         
         # حالت خالی
         self.empty_state = QLabel()
@@ -567,50 +833,55 @@ class ProductsWidget(QWidget):
     async def refresh_data_slot(self): await self.refresh_data()
 
     async def refresh_data(self):
-        for i in reversed(range(self.grid_layout.count())): 
-            if self.grid_layout.itemAt(i).widget(): self.grid_layout.itemAt(i).widget().setParent(None)
-        self.selected_ids.clear(); self.update_bulk_toolbar()
-        
         loop = asyncio.get_running_loop()
         try:
             def fetch():
                 with next(get_db()) as db:
-                    cats = crud.get_all_categories(db)
-                    prods = crud.advanced_search_products(db, query=self.inp_search.text(), category_id=self.cmb_cat_filter.currentData())
-                    
-                    # اعمال مرتب‌سازی
-                    sort_idx = self.cmb_sort.currentIndex()
-                    if sort_idx == 1: prods.sort(key=lambda x: x.price, reverse=True) # گرانترین
-                    elif sort_idx == 2: prods.sort(key=lambda x: x.price) # ارزانترین
-                    elif sort_idx == 3: prods.sort(key=lambda x: x.stock, reverse=True) # بیشترین موجودی
-                    elif sort_idx == 4: prods.sort(key=lambda x: x.stock) # کمترین موجودی
-                    # 0 = جدیدترین (پیش‌فرض)
-                    
-                    return cats, prods
-                    
-            cats, prods = await loop.run_in_executor(None, fetch)
-            
+                    return crud.get_all_categories(db)
+            cats = await loop.run_in_executor(None, fetch)
+
             current_cat = self.cmb_cat_filter.currentData()
             self.cmb_cat_filter.clear(); self.cmb_cat_filter.addItem("همه دسته‌ها", None)
             for c in cats: self.cmb_cat_filter.addItem(c.name, c.id)
             if current_cat:
                 idx = self.cmb_cat_filter.findData(current_cat)
                 if idx >= 0: self.cmb_cat_filter.setCurrentIndex(idx)
-            
-            if not prods:
-                self.empty_state.show(); self.grid_container.hide()
-            else:
-                self.empty_state.hide(); self.grid_container.show()
-                cols = max(1, self.grid_container.width() // 280)
-                for i, p in enumerate(prods):
-                    card = ProductCard(p, self)
-                    card.selectionChanged.connect(self.on_card_selection)
-                    card.quickUpdateRequested.connect(self.handle_quick_update)
-                    self.grid_layout.addWidget(card, i // cols, i % cols)
-                    
-        except Exception as e: 
+        except Exception as e:
             logger.error(f"Refresh error: {e}")
 
+        self.model.reset({
+            "query": self.inp_search.text(), "category_id": self.cmb_cat_filter.currentData(),
+            "sort_by": SORT_KEYS[max(self.cmb_sort.currentIndex(), 0)],
+        })
+
+    def _on_page_loaded(self, loaded, total):
+        self.empty_state.setVisible(total == 0); self.grid_view.setVisible(total > 0)
+        # اگر صفحه اول اسکرول ایجاد نکرد، صفحه بعدی هم بارگذاری شود
+        QTimer.singleShot(0, self._on_scroll)
+
+    def _on_scroll(self, *_):
+        bar = self.grid_view.verticalScrollBar()
+        if bar.value() >= bar.maximum() - 400 and self.model.canFetchMore():
+            self.model.fetchMore()
+
+    @property
+    def selected_ids(self) -> Set[int]:
+        return self.model.selected_ids
+
+    def _quick_edit_stock(self, product):
+        val, ok = QInputDialog.getInt(self, "ویرایش سریع موجودی", f"موجودی جدید برای {product.name}:", value=product.stock, min=0)
+        if ok:
+            self.handle_quick_update(product.id, "stock", val)
+            self.model.update_product(product.id, stock=val)
+
+    def copy_link(self, product, platform):
+        if platform == "telegram":
+            QApplication.clipboard().setText(f"https://t.me/{self.bot_username or 'Bot'}?start=p_{product.id}")
+            self.window().show_toast("لینک تلگرام کپی شد")
+        else:
+            QApplication.clipboard().setText(f"https://rubika.ir/{self.rubika_username or 'Bot'}?start=p_{product.id}")
+            self.window().show_toast("لینک روبیکا کپی شد")
+
     def handle_quick_update(self, pid, field, value):
         """آپدیت سریع بدون باز کردن دیالوگ"""
         asyncio.create_task(self._quick_update_db(pid, field, value))
@@ -629,12 +900,7 @@ class ProductsWidget(QWidget):
         except Exception as e:
             self.window().show_toast("خطا در آپدیت!", is_error=True)
 
-    def on_card_selection(self, pid, selected):
-        if selected: self.selected_ids.add(pid)
-        else: self.selected_ids.discard(pid)
-        self.update_bulk_toolbar()
-
-    def update_bulk_toolbar(self):
+    def update_bulk_toolbar(self, *_):
         count = len(self.selected_ids)
         self.bulk_toolbar.setVisible(count > 0)
         self.lbl_sel_count.setText(f"{count} انتخاب شده")
@@ -643,8 +909,10 @@ class ProductsWidget(QWidget):
     async def delete_product_single(self, pid):
         if QMessageBox.question(self, "حذف", "آیا مطمئن هستید؟") == QMessageBox.StandardButton.Yes:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: crud.delete_product(next(get_db()), pid))
-            await self.refresh_data()
+            if await loop.run_in_executor(None, lambda: crud.delete_product(next(get_db()), pid)):
+                self.model.remove_products([pid])
+            else:
+                self.window().show_toast("خطا در حذف محصول!", is_error=True)
 
     @asyncSlot()
     async def duplicate_product(self, pid):
@@ -662,7 +930,11 @@ class ProductsWidget(QWidget):
                     crud.create_product_with_variants(db, data, vars, image_paths=imgs)
             await loop.run_in_executor(None, db_op)
             self.window().show_toast("محصول تکثیر شد.")
-            await self.refresh_data()
+            # کپی (با موجودی صفر) در مرتب‌سازی جدیدترین/کمترین موجودی در صفحه اول و در بقیه کنار محصول اصلی قرار می‌گیرد
+            row = self.model.row_of(pid)
+            sort_by = SORT_KEYS[max(self.cmb_sort.currentIndex(), 0)]
+            offset = 0 if row is None or sort_by in ("newest", "stock_asc") else row - row % PAGE_SIZE
+            await self.model.refresh_page(offset)
         except Exception as e:
             logger.error(e)
 
@@ -671,8 +943,10 @@ class ProductsWidget(QWidget):
         if QMessageBox.question(self, "حذف گروهی", f"حذف {len(self.selected_ids)} محصول؟") == QMessageBox.StandardButton.Yes:
             ids = list(self.selected_ids)
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: crud.bulk_delete_products(next(get_db()), ids))
-            await self.refresh_data()
+            if await loop.run_in_executor(None, lambda: crud.bulk_delete_products(next(get_db()), ids)):
+                self.model.remove_products(ids)
+            else:
+                self.window().show_toast("خطا در حذف محصولات!", is_error=True)
 
     # Import/Export Logic (خلاصه شده)
     def export_data_slot(self):
@@ -682,7 +956,10 @@ class ProductsWidget(QWidget):
     async def _perform_export(self, path):
         try:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: pd.DataFrame([{"ID": p.id, "Name": p.name} for p in crud.get_all_products_raw(next(get_db()))]).to_excel(path, index=False))
+            def export():
+                import pandas as pd  # فقط هنگام خروجی گرفتن بارگذاری می‌شود
+                pd.DataFrame([{"ID": p.id, "Name": p.name} for p in crud.get_all_products_raw(next(get_db()))]).to_excel(path, index=False)
+            await loop.run_in_executor(None, export)
             self.window().show_toast("اکسل ذخیره شد.")
         except: pass
 
@@ -699,6 +976,7 @@ class ProductsWidget(QWidget):
         except: pass
 
     def _do_import_logic(self, path):
+        import pandas as pd
         df = pd.read_excel(path).fillna("")
         s, f = 0, 0
         with next(get_db()) as db:
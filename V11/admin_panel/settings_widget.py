@@ -20,7 +20,9 @@ from qasync import asyncSlot
 import qtawesome as qta
 
 from db.database import get_db
-from db import crud
+from db import crud, maintenance
+from db.backup import backup_manager
+from bot.broadcast import broadcast_engine
 from config import BASE_DIR, ADMIN_USER_IDS
 
 logger = logging.getLogger(__name__)
@@ -463,6 +465,12 @@ class SettingsWidget(QWidget):
         card2.add_layout(self._form_row("هزینه ارسال:", self.shipping_cost))
         card2.add_layout(self._form_row("سقف ارسال رایگان:", self.free_limit))
         layout.addWidget(card2)
+
+        card3 = SettingCard("فروش ویژه (Flash Sale)")
+        self.flash_sale_ids = QLineEdit()
+        self.flash_sale_ids.setPlaceholderText("شناسه محصولات، جدا شده با کاما (مثلاً 12,15)")
+        card3.add_layout(self._form_row("محصولات:", self.flash_sale_ids))
+        layout.addWidget(card3)
         
         btn = QPushButton("ذخیره تنظیمات مالی")
         btn.setStyleSheet(f"background: {SUCCESS_COLOR}; color: white; padding: 12px; border-radius: 8px;")
@@ -487,7 +495,9 @@ class SettingsWidget(QWidget):
         b2.clicked.connect(self.restore_backup)
         b3 = QPushButton("ارسال به تلگرام"); b3.setStyleSheet(f"background: {ACCENT_COLOR}; color: white;")
         b3.clicked.connect(self.send_backup_to_telegram)
-        h_bk.addWidget(b1); h_bk.addWidget(b2); h_bk.addWidget(b3)
+        b4 = QPushButton("بک‌آپ فشرده (VACUUM)"); b4.setStyleSheet(f"background: {INFO_COLOR}; color: white;")
+        b4.clicked.connect(self.create_vacuum_backup)
+        h_bk.addWidget(b1); h_bk.addWidget(b4); h_bk.addWidget(b2); h_bk.addWidget(b3)
         
         # بک‌آپ خودکار
         h_auto = QHBoxLayout()
@@ -505,6 +515,17 @@ class SettingsWidget(QWidget):
         card_bk.add_layout(h_auto)
         layout.addWidget(card_bk)
 
+        # --- نگهداری دیتابیس ---
+        card_mt = SettingCard("نگهداری دیتابیس")
+        h_mt = QHBoxLayout()
+        b_stats = QPushButton("بازسازی آمار خرید کاربران"); b_stats.setStyleSheet(f"background: {INFO_COLOR}; color: white;")
+        b_stats.clicked.connect(self.rebuild_user_stats)
+        b_sales = QPushButton("بازسازی آمار فروش داشبورد"); b_sales.setStyleSheet(f"background: {INFO_COLOR}; color: white;")
+        b_sales.clicked.connect(self.rebuild_daily_sales)
+        h_mt.addWidget(b_stats); h_mt.addWidget(b_sales); h_mt.addStretch()
+        card_mt.add_layout(h_mt)
+        layout.addWidget(card_mt)
+
         # --- پیام همگانی ---
         card_bc = SettingCard("ارسال پیام همگانی (Broadcast)")
         self.bc_text = QTextEdit(); self.bc_text.setMaximumHeight(80)
@@ -694,6 +715,7 @@ class SettingsWidget(QWidget):
 
             self.shipping_cost.setText(data["shipping_cost"])
             self.free_limit.setText(data["free_shipping_limit"])
+            self.flash_sale_ids.setText(data["flash_sale_product_ids"])
 
             # بک‌آپ
             self.auto_bk_toggle.setChecked(data["auto_backup_enabled"] == "true")
@@ -711,11 +733,11 @@ class SettingsWidget(QWidget):
                 "tg_welcome_image": "", "tg_support_ids": "[]", "tg_phones": "[]",
                 "rb_shop_name": "فروشگاه من", "rb_welcome_message": "", "rb_support_ids": "[]",
                 "rb_phones": "[]", "rb_main_menu": "[]", "bank_cards": "[]",
-                "shipping_cost": "0", "free_shipping_limit": "0",
+                "shipping_cost": "0", "free_shipping_limit": "0", "flash_sale_product_ids": "",
                 "auto_backup_enabled": "false", "auto_backup_time": "00:00",
                 "tg_shop_address": ""
             }
-            return {k: crud.get_setting(db, k, v) for k, v in DEFAULT_SETTINGS.items()}
+            return crud.get_settings(db, DEFAULT_SETTINGS)
 
     @asyncSlot()
     async def save_settings(self):
@@ -731,6 +753,7 @@ class SettingsWidget(QWidget):
             "bank_cards": json.dumps([{"number": self.card_table.cellWidget(r, 0).text(), "owner": self.card_table.cellWidget(r, 1).text()} for r in range(self.card_table.rowCount())]),
             "shipping_cost": self.shipping_cost.text().replace(",", ""),
             "free_shipping_limit": self.free_limit.text().replace(",", ""),
+            "flash_sale_product_ids": self.flash_sale_ids.text().strip(),
             "auto_backup_enabled": "true" if self.auto_bk_toggle.isChecked() else "false",
             "auto_backup_time": self.auto_bk_time.time().toString("HH:mm"),
         }
@@ -758,7 +781,7 @@ class SettingsWidget(QWidget):
 
     def _save_db(self, data):
         with next(get_db()) as db:
-            for k, v in data.items(): crud.set_setting(db, k, v)
+            crud.set_settings(db, data)
 
     @asyncSlot()
     async def update_bot_commands(self):
@@ -773,43 +796,71 @@ class SettingsWidget(QWidget):
         except Exception as e: QMessageBox.warning(self, "خطا", str(e))
 
     # --- Tools Logic ---
-    def create_manual_backup(self):
+    @asyncSlot()
+    async def create_manual_backup(self):
+        await self._create_backup("backup")
+
+    @asyncSlot()
+    async def create_vacuum_backup(self):
+        await self._create_backup("vacuum")
+
+    async def _create_backup(self, method):
+        """بک‌آپ آنلاین (بدون قفل کردن ربات‌ها) در ترد جدا"""
+        self.window().show_toast("در حال ایجاد بک‌آپ...")
         try:
-            n = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-            dest = BASE_DIR / "db" / "backups"; dest.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(BASE_DIR / "db" / "shop_bot.db", dest / n)
-            self.load_backups_list()
-            self.window().show_toast("بک‌آپ ایجاد شد.")
+            entry = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: backup_manager.create(kind="manual", method=method))
+            await self.load_backups_list()
+            self.window().show_toast(f"بک‌آپ ایجاد شد ({entry['size'] / 1048576:.1f} MB).")
         except Exception as e: QMessageBox.critical(self, "خطا", str(e))
 
-    def load_backups_list(self):
+    @asyncSlot()
+    async def load_backups_list(self):
+        entries = await asyncio.get_running_loop().run_in_executor(None, backup_manager.entries)
         self.bk_table.setRowCount(0)
-        d = BASE_DIR / "db" / "backups"
-        if not d.exists(): return
-        for i, f in enumerate(sorted(d.glob("*.db"), key=os.path.getmtime, reverse=True)):
+        for i, entry in enumerate(entries):
             self.bk_table.insertRow(i)
-            self.bk_table.setItem(i, 0, QTableWidgetItem(f.name))
-            self.bk_table.setItem(i, 1, QTableWidgetItem(datetime.fromtimestamp(f.stat().st_mtime).strftime("%Y-%m-%d %H:%M")))
-            self.bk_table.setItem(i, 2, QTableWidgetItem(f"{f.stat().st_size/1024:.1f} KB"))
+            name_item = QTableWidgetItem(entry["name"])
+            name_item.setData(Qt.ItemDataRole.UserRole, entry)
+            self.bk_table.setItem(i, 0, name_item)
+            self.bk_table.setItem(i, 1, QTableWidgetItem(datetime.fromisoformat(entry["created_at"]).strftime("%Y-%m-%d %H:%M")))
+            size = entry["size"]
+            self.bk_table.setItem(i, 2, QTableWidgetItem(f"{size / 1048576:.1f} MB" if size >= 1048576 else f"{size / 1024:.1f} KB"))
 
-    def restore_backup(self):
+    @asyncSlot()
+    async def restore_backup(self):
         r = self.bk_table.currentRow()
         if r < 0: return
-        f = self.bk_table.item(r, 0).text()
-        if QMessageBox.question(self, "هشدار", f"بازگردانی {f}؟") == QMessageBox.StandardButton.Yes:
+        entry = self.bk_table.item(r, 0).data(Qt.ItemDataRole.UserRole)
+        if QMessageBox.question(self, "هشدار", f"بازگردانی {entry['name']}؟\nاز وضعیت فعلی یک بک‌آپ گرفته می‌شود و برنامه بسته خواهد شد.") == QMessageBox.StandardButton.Yes:
+            self.window().show_toast("در حال بازگردانی...")
             try:
-                shutil.copy2(BASE_DIR / "db" / "backups" / f, BASE_DIR / "db" / "shop_bot.db")
+                await asyncio.get_running_loop().run_in_executor(None, backup_manager.restore, entry)
                 os._exit(0)
             except Exception as e: QMessageBox.critical(self, "خطا", str(e))
 
+    @asyncSlot()
+    async def rebuild_user_stats(self):
+        try:
+            count = await asyncio.get_running_loop().run_in_executor(None, maintenance.rebuild_user_stats)
+            self.window().show_toast(f"آمار {count} کاربر بازسازی شد.")
+        except Exception as e:
+            self.window().show_toast(f"خطا: {e}", is_error=True)
+
+    @asyncSlot()
+    async def rebuild_daily_sales(self):
+        try:
+            count = await asyncio.get_running_loop().run_in_executor(None, maintenance.rebuild_daily_sales)
+            self.window().show_toast(f"آمار فروش بازسازی شد ({count} ردیف).")
+        except Exception as e:
+            self.window().show_toast(f"خطا: {e}", is_error=True)
+
     @asyncSlot()
     async def send_backup_to_telegram(self):
         if not self.bot_app or not ADMIN_USER_IDS: return self.window().show_toast("ربات تلگرام فعال نیست.", is_error=True)
-        d = BASE_DIR / "db" / "backups"
-        if not d.exists(): return
-        files = sorted(d.glob("*.db"), key=os.path.getmtime, reverse=True)
-        if not files: return
-        latest = files[0]
+        entries = await asyncio.get_running_loop().run_in_executor(None, backup_manager.entries)
+        if not entries: return
+        latest = backup_manager.path_of(entries[0])
         self.window().show_toast("در حال ارسال به تلگرام...")
         try:
             with open(latest, 'rb') as doc:
@@ -823,26 +874,24 @@ class SettingsWidget(QWidget):
         if not msg and not self._broadcast_image_path:
             return QMessageBox.warning(self, "خطا", "متن یا عکس الزامی است.")
             
-        self.bc_progress.show(); self.bc_progress.setValue(0)
+        broadcast_engine.attach(telegram_bot=self.bot_app.bot if self.bot_app else None, rubika_client=self.rubika_client)
+        if not broadcast_engine.platforms():
+            return QMessageBox.warning(self, "خطا", "هیچ رباتی متصل نیست.")
+
         loop = asyncio.get_running_loop()
-        users = await loop.run_in_executor(None, lambda: crud.get_all_users(next(get_db())))
-        total = len(users); sent = 0
-        
-        for i, u in enumerate(users):
-            try:
-                if u.platform == 'telegram' and self.bot_app:
-                    if self._broadcast_image_path:
-                        with open(self._broadcast_image_path, 'rb') as photo:
-                            await self.bot_app.bot.send_photo(chat_id=int(u.user_id), photo=photo, caption=msg)
-                    else:
-                        await self.bot_app.bot.send_message(chat_id=int(u.user_id), text=msg)
-                    sent += 1
-                elif u.platform == 'rubika' and self.rubika_client:
-                    await self.rubika_client.api.send_message(chat_id=u.user_id, text=msg)
-                    sent += 1
-            except: pass
-            self.bc_progress.setValue(int((i+1)/total * 100))
-            if i % 5 == 0: await asyncio.sleep(0.1)
-            
+        job_id = await loop.run_in_executor(
+            None, lambda: crud.create_broadcast_job(next(get_db()), msg or None, self._broadcast_image_path)
+        )
+        if not job_id:
+            return QMessageBox.critical(self, "خطا", "ثبت پیام همگانی ناموفق بود.")
+
+        # ارسال در پس‌زمینه توسط موتور پیام همگانی (با محدودیت نرخ و قابل ادامه بعد از ری‌استارت)
+        self.bc_progress.show(); self.bc_progress.setValue(0)
+        result = await broadcast_engine.submit(
+            job_id, lambda p: self.bc_progress.setValue(int(p.done / max(p.total, 1) * 100))
+        )
         self.bc_progress.hide()
-        QMessageBox.information(self, "پایان", f"{sent} پیام ارسال شد.")
\ No newline at end of file
+        QMessageBox.information(
+            self, "پایان",
+            f"{result.sent} پیام ارسال شد.\nناموفق: {result.failed} | بلاک کرده‌اند: {result.blocked}"
+        )
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Set
+
+from PyQt6.QtCore import QObject, QSize, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+
+from db.media_derivatives import media_derivatives
+
+logger = logging.getLogger("Thumbnails")
+
+class ThumbnailCache(QObject):
+    """
+    کش تصاویر بندانگشتی برای لیست‌های پنل.
+
+    تصویر در ترد جداگانه از بندانگشتی روی دیسک (media_derivatives، ساخت فقط بار اول) و مستقیماً
+    در اندازه کوچک (QImageReader.setScaledSize) دیکد می‌شود و فقط تبدیل QImage به QPixmap
+    در ترد اصلی انجام می‌شود. حداکثر max_items تصویر (به ترتیب آخرین استفاده) در حافظه می‌ماند؛
+    با آماده شدن هر تصویر thumbnailReady ارسال می‌شود.
+    """
+    thumbnailReady = pyqtSignal(str)
+
+    def __init__(self, size: QSize, max_items: int = 300, workers: int = 2, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.max_items = max_items
+        self._pixmaps: "OrderedDict[str, QPixmap]" = OrderedDict()
+        self._pending: Set[str] = set()
+        self._failed: Set[str] = set()
+        # ترد جدا از executor پیش‌فرض تا دیکد تصاویر کوئری‌های دیتابیس را معطل نکند
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+    def get(self, path: str) -> Optional[QPixmap]:
+        """تصویر آماده یا None (در این صورت دیکد در پس‌زمینه شروع می‌شود)"""
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+        if path not in self._pending and path not in self._failed:
+            self._pending.add(path)
+            asyncio.ensure_future(self._load(path))
+        return None
+
+    def invalidate(self, path: Optional[str] = None):
+        if path is None:
+            self._pixmaps.clear()
+            self._failed.clear()
+        else:
+            self._pixmaps.pop(path, None)
+            self._failed.discard(path)
+
+    async def _load(self, path: str):
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(self._executor, self._decode, path, self.size)
+        except Exception as e:
+            logger.debug(f"Thumbnail decode failed for {path}: {e}")
+            image = None
+        finally:
+            self._pending.discard(path)
+        if image is None:
+            self._failed.add(path)
+            return
+        self._pixmaps[path] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > self.max_items:
+            self._pixmaps.popitem(last=False)
+        self.thumbnailReady.emit(path)
+
+    @staticmethod
+    def _decode(path: str, size: QSize) -> Optional[QImage]:
+        reader = QImageReader(str(media_derivatives.get(path, "thumb")))
+        reader.setAutoTransform(True)
+        source = reader.size()
+        if source.isValid():
+            # کوچک‌ترین اندازه‌ای که کل کادر را بپوشاند (برش در زمان رسم)
+            reader.setScaledSize(source.scaled(size, Qt.AspectRatioMode.KeepAspectRatioByExpanding))
+        image = reader.read()
+        return None if image.isNull() else image
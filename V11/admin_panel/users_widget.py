@@ -1,26 +1,36 @@
 import asyncio
 import csv
+import re
 import logging
 import os
 import webbrowser
 from datetime import datetime, timedelta
-from typing import Optional, List, Any, Set
+from typing import Optional, List, Any, Set, Dict
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QScrollArea, QFrame, QLineEdit, QMessageBox,
-    QGraphicsDropShadowEffect, QTextEdit, QDialog, QLayout, QStyle, QSizePolicy,
-    QComboBox, QApplication, QCheckBox, QInputDialog, QFileDialog, QMenu, QTableWidget, QTableWidgetItem, QHeaderView
+    QFrame, QLineEdit, QMessageBox,
+    QTextEdit, QDialog, QStyle, QSizePolicy,
+    QComboBox, QApplication, QInputDialog, QFileDialog, QMenu, QTableWidget, QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtGui import QColor, QFont, QCursor, QPainter, QAction
-from PyQt6.QtCore import Qt, QSize, QTimer, QRect, QPoint, pyqtSignal
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate
+from PyQt6.QtGui import QColor, QFont, QCursor, QPainter, QAction, QPen, QPixmap
+from PyQt6.QtCore import Qt, QSize, QTimer, QRect, QRectF, QEvent, QModelIndex, QAbstractListModel, pyqtSignal
 from qasync import asyncSlot
 import qtawesome as qta
 from db.database import SessionLocal
 from db import crud, models
+from bot.broadcast import broadcast_engine
 
 logger = logging.getLogger(__name__)
 
+# --- فیلترهای دایرکتوری کاربران (crud.search_users) ---
+PAGE_SIZE = 60
+PLATFORM_FILTERS = {"تلگرام": "telegram", "روبیکا": "rubika"}
+# (فعال در n روز اخیر، غیرفعال بیش از n روز)
+ACTIVITY_FILTERS = {"۲۴ ساعت اخیر": (1, None), "۷ روز اخیر": (7, None), "۳۰ روز اخیر": (30, None), "غیرفعال (+۳۰ روز)": (None, 30)}
+SORT_OPTIONS = {"بیشترین خرید": "spent", "بیشترین سفارش": "orders", "آخرین فعالیت": "recent", "جدیدترین": "newest", "نام": "name"}
+
 # --- پالت رنگی ---
 BG_COLOR = "#16161a"
 PANEL_BG = "#242629"
@@ -34,60 +44,6 @@ TEXT_MAIN = "#fffffe"
 TEXT_SUB = "#94a1b2"
 BORDER_COLOR = "#2e2e38"
 
-# ==============================================================================
-# Helper: Flow Layout
-# ==============================================================================
-class FlowLayout(QLayout):
-    def __init__(self, parent=None, margin=0, spacing=-1):
-        super().__init__(parent)
-        if parent is not None: self.setContentsMargins(margin, margin, margin, margin)
-        self.setSpacing(spacing)
-        self.itemList = []
-
-    def __del__(self):
-        item = self.takeAt(0)
-        while item: item = self.takeAt(0)
-
-    def addItem(self, item): self.itemList.append(item)
-    def count(self): return len(self.itemList)
-    def itemAt(self, index): return self.itemList[index] if 0 <= index < len(self.itemList) else None
-    def takeAt(self, index):
-        if 0 <= index < len(self.itemList): return self.itemList.pop(index)
-        return None
-
-    def expandingDirections(self): return Qt.Orientation(0)
-    def hasHeightForWidth(self): return True
-    def heightForWidth(self, width): return self.doLayout(QRect(0, 0, width, 0), True)
-    def setGeometry(self, rect): super(FlowLayout, self).setGeometry(rect); self.doLayout(rect, False)
-    def sizeHint(self): return self.minimumSize()
-    def minimumSize(self):
-        size = QSize()
-        for item in self.itemList: size = size.expandedTo(item.minimumSize())
-        size += QSize(2 * self.contentsMargins().top(), 2 * self.contentsMargins().top())
-        return size
-
-    def doLayout(self, rect, testOnly):
-        x, y = rect.x(), rect.y()
-        lineHeight = 0
-        spaceX = self.spacing()
-        spaceY = self.spacing()
-        
-        for item in self.itemList:
-            wid = item.widget()
-            if wid.isHidden(): continue
-            
-            nextX = x + item.sizeHint().width() + spaceX
-            if nextX - spaceX > rect.right() and lineHeight > 0:
-                x = rect.x()
-                y = y + lineHeight + spaceY
-                nextX = x + item.sizeHint().width() + spaceX
-                lineHeight = 0
-            
-            if not testOnly: item.setGeometry(QRect(QPoint(x, y), item.sizeHint()))
-            x = nextX
-            lineHeight = max(lineHeight, item.sizeHint().height())
-        return y + lineHeight - rect.y()
-
 # ==============================================================================
 # Dialog: جزئیات کاربر
 # ==============================================================================
@@ -189,196 +145,269 @@ class UserDetailsDialog(QDialog):
                 db.commit()
 
 # ==============================================================================
-# Component: User Card
+# Model: لیست کاربران (بارگذاری تدریجی)
 # ==============================================================================
-class UserCard(QFrame):
-    selectionChanged = pyqtSignal(str, bool)
-    
-    def __init__(self, user_data, parent_widget):
-        super().__init__()
-        self.user = user_data
-        self.parent_widget = parent_widget
-        self.user_id = getattr(user_data, 'user_id', None)
-        self.platform = getattr(user_data, 'platform', 'telegram')
-        
-        self.setFixedSize(300, 240)
-        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
-        self.setCursor(Qt.CursorShape.PointingHandCursor)
-        
-        # محاسبه سطح
-        total_spent = getattr(user_data, 'total_spent', 0) or 0
-        if total_spent > 10_000_000: self.badge = {"col": "#f1c40f", "icon": "fa5s.crown", "txt": "VIP"}
-        elif total_spent > 3_000_000: self.badge = {"col": "#bdc3c7", "icon": "fa5s.star", "txt": "Pro"}
-        elif getattr(user_data, 'order_count', 0) > 0: self.badge = {"col": SUCCESS_COLOR, "icon": "fa5s.user", "txt": "Active"}
-        else: self.badge = {"col": TEXT_SUB, "icon": "fa5s.user-tag", "txt": "New"}
-
-        self._apply_styles()
-        self._setup_ui()
-
-    def _apply_styles(self):
-        is_banned = getattr(self.user, 'is_banned', False)
-        border = DANGER_COLOR if is_banned else BORDER_COLOR
-        self.setStyleSheet(f"""
-            QFrame {{ background-color: {PANEL_BG}; border-radius: 14px; border: 1px solid {border}; }}
-            QFrame:hover {{ border: 1px solid {ACCENT_COLOR}; }}
-            QLabel {{ background: transparent; color: {TEXT_MAIN}; border: none; }}
-        """)
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setBlurRadius(20); shadow.setColor(QColor(0,0,0,60)); shadow.setOffset(0,5)
-        self.setGraphicsEffect(shadow)
-
-    def _setup_ui(self):
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(15, 15, 15, 15)
-        layout.setSpacing(10)
-
-        # --- Header ---
-        h_top = QHBoxLayout()
-        self.chk_select = QCheckBox()
-        self.chk_select.setFixedSize(22, 22)
-        self.chk_select.setStyleSheet(f"QCheckBox::indicator {{ width: 18px; height: 18px; border-radius: 5px; border: 2px solid {ACCENT_COLOR}; }} QCheckBox::indicator:checked {{ background: {SUCCESS_COLOR}; }}")
-        self.chk_select.stateChanged.connect(self._on_select)
-        
-        ico = QLabel()
-        ico.setFixedSize(40, 40)
-        ico.setStyleSheet(f"background: {self.badge['col']}20; border-radius: 20px;")
-        ico.setPixmap(qta.icon(self.badge['icon'], color=self.badge['col']).pixmap(20, 20))
-        
-        v_info = QVBoxLayout()
-        name = getattr(self.user, 'full_name', "Unknown") or "User"
-        if len(name) > 18: name = name[:16] + "..."
-        lbl_name = QLabel(name); lbl_name.setStyleSheet("font-weight: bold; font-size: 14px;")
-        lbl_id = QLabel(f"ID: ...{str(self.user_id)[-8:]}"); lbl_id.setStyleSheet(f"color: {TEXT_SUB}; font-size: 11px;")
-        v_info.addWidget(lbl_name); v_info.addWidget(lbl_id)
-        
-        p_icon = "fa5b.telegram-plane" if self.platform == 'telegram' else "mdi6.infinity"
-        p_col = INFO_COLOR if self.platform == 'telegram' else "#8e44ad"
-        lbl_plat = QLabel()
-        lbl_plat.setPixmap(qta.icon(p_icon, color=p_col).pixmap(22, 22))
-        
-        h_top.addWidget(self.chk_select)
-        h_top.addWidget(ico)
-        h_top.addLayout(v_info)
-        h_top.addStretch()
-        h_top.addWidget(lbl_plat)
-        layout.addLayout(h_top)
-
-        # --- Last Seen ---
-        last_seen = getattr(self.user, 'last_seen', None)
-        ls_text = "آخرین بازدید: "
-        if last_seen:
-            diff = datetime.now() - last_seen
-            if diff.days == 0: ls_text += "امروز"
-            elif diff.days == 1: ls_text += "دیروز"
-            else: ls_text += last_seen.strftime("%Y/%m/%d")
-        else: ls_text += "نامشخص"
-        lbl_ls = QLabel(ls_text)
-        lbl_ls.setStyleSheet(f"color: {TEXT_SUB}; font-size: 10px;")
-        layout.addWidget(lbl_ls)
-
-        # --- Stats ---
-        h_stats = QHBoxLayout()
-        spent = int(getattr(self.user, 'total_spent', 0) or 0)
-        orders = int(getattr(self.user, 'order_count', 0) or 0)
-        h_stats.addWidget(self._stat_box(f"{orders}", "سفارش"))
-        h_stats.addWidget(self._stat_box(f"{spent:,}", "خرید"))
-        layout.addLayout(h_stats)
-
-        # --- Actions ---
-        h_btns = QHBoxLayout()
-        h_btns.setSpacing(8)
-        
-        btn_note = self._action_btn("fa5s.sticky-note", WARNING_COLOR if getattr(self.user, 'private_note') else PANEL_BG, self.open_note)
-        btn_chat = self._action_btn("fa5s.comment", INFO_COLOR, self.open_chat)
-        
-        is_banned = getattr(self.user, 'is_banned', False)
-        btn_ban = self._action_btn("fa5s.ban" if not is_banned else "fa5s.check", DANGER_COLOR if not is_banned else SUCCESS_COLOR, self.toggle_ban)
-        
-        h_btns.addStretch()
-        h_btns.addWidget(btn_note); h_btns.addWidget(btn_chat); h_btns.addWidget(btn_ban)
-        layout.addLayout(h_btns)
-        
-        # Context Menu
-        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.show_context_menu)
-
-    def _stat_box(self, val, txt):
-        f = QFrame(); f.setStyleSheet(f"background: {BG_COLOR}; border-radius: 6px;")
-        l = QVBoxLayout(f); l.setContentsMargins(8, 4, 8, 4); l.setSpacing(0)
-        v = QLabel(val); v.setAlignment(Qt.AlignmentFlag.AlignCenter); v.setStyleSheet("font-weight: bold; color: white;")
-        t = QLabel(txt); t.setAlignment(Qt.AlignmentFlag.AlignCenter); t.setStyleSheet(f"color: {TEXT_SUB}; font-size: 10px;")
-        l.addWidget(v); l.addWidget(t)
-        return f
-
-    def _action_btn(self, icon, color, callback):
-        b = QPushButton()
-        b.setFixedSize(34, 34)
-        b.setCursor(Qt.CursorShape.PointingHandCursor)
-        b.setStyleSheet(f"background: {color}; border-radius: 8px; border: none;")
-        b.setIcon(qta.icon(icon, color="white"))
-        b.clicked.connect(callback)
-        return b
+def _user_badge(user) -> dict:
+    total_spent = getattr(user, 'total_spent', 0) or 0
+    if total_spent > 10_000_000: return {"col": "#f1c40f", "icon": "fa5s.crown", "txt": "VIP"}
+    if total_spent > 3_000_000: return {"col": "#bdc3c7", "icon": "fa5s.star", "txt": "Pro"}
+    if (getattr(user, 'order_count', 0) or 0) > 0: return {"col": SUCCESS_COLOR, "icon": "fa5s.user", "txt": "Active"}
+    return {"col": TEXT_SUB, "icon": "fa5s.user-tag", "txt": "New"}
+
+def _last_seen_text(user) -> str:
+    last_seen = getattr(user, 'last_seen', None)
+    if not last_seen: return "آخرین بازدید: نامشخص"
+    diff = datetime.now() - last_seen
+    if diff.days == 0: return "آخرین بازدید: امروز"
+    if diff.days == 1: return "آخرین بازدید: دیروز"
+    return f"آخرین بازدید: {last_seen.strftime('%Y/%m/%d')}"
+
+class UsersListModel(QAbstractListModel):
+    """
+    مدل لیست کاربران برای QListView.
+    ردیف‌ها صفحه به صفحه (PAGE_SIZE) از crud.search_users در ترد جداگانه خوانده می‌شوند
+    و view فقط با رسیدن به انتهای لیست صفحه بعد را می‌خواهد (canFetchMore/fetchMore).
+    """
+    UserRole = Qt.ItemDataRole.UserRole + 1
+    pageLoaded = pyqtSignal(int, int)      # (تعداد بارگذاری شده، کل)
+    selectionChanged = pyqtSignal(int)     # تعداد انتخاب شده
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._users: List[Any] = []
+        self._rows: Dict[str, int] = {}
+        self.selected_ids: Set[str] = set()
+        self._filters: dict = {}
+        self._generation = 0
+        self._total: Optional[int] = None
+        self._loading = False
+
+    # --- QAbstractListModel ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._users)
+
+    def flags(self, index):
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsUserCheckable
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._users): return None
+        user = self._users[index.row()]
+        if role == self.UserRole: return user
+        if role == Qt.ItemDataRole.DisplayRole: return user.full_name or "User"
+        if role == Qt.ItemDataRole.ToolTipRole: return f"ID: {user.user_id}"
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if str(user.user_id) in self.selected_ids else Qt.CheckState.Unchecked
+        return None
 
-    # --- Logic ---
-    def mouseDoubleClickEvent(self, event):
-        self.show_details()
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole: return False
+        uid = str(self._users[index.row()].user_id)
+        if value == Qt.CheckState.Checked: self.selected_ids.add(uid)
+        else: self.selected_ids.discard(uid)
+        self.dataChanged.emit(index, index, [role])
+        self.selectionChanged.emit(len(self.selected_ids))
+        return True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._loading: return False
+        return self._total is None or len(self._users) < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent): return
+        self._loading = True
+        asyncio.ensure_future(self._load_page(self._generation, len(self._users)))
+
+    # --- بارگذاری ---
+    def filters(self) -> dict:
+        return self._filters
+
+    def reset(self, filters: dict):
+        """شروع لیست جدید با فیلترهای crud.search_users (انتخاب‌ها پاک می‌شوند)"""
+        self.beginResetModel()
+        # صفحاتی که از نسل قبلی هنوز در راه هستند دور ریخته می‌شوند
+        self._generation += 1
+        self._filters = filters
+        self._users, self._rows = [], {}
+        self.selected_ids.clear()
+        self._total, self._loading = None, False
+        self.endResetModel()
+        self.selectionChanged.emit(0)
+        self.fetchMore()
+
+    async def _load_page(self, generation, offset):
+        filters = self._filters
+        loop = asyncio.get_running_loop()
+        try:
+            users, total = await loop.run_in_executor(None, lambda: self._fetch_page(filters, offset))
+        except Exception as e:
+            logger.error(e)
+            users, total = [], offset
+        if generation != self._generation: return
+        self._loading = False
+        if total is not None: self._total = total
+        if len(users) < PAGE_SIZE: self._total = offset + len(users)
+        if users:
+            self.beginInsertRows(QModelIndex(), offset, offset + len(users) - 1)
+            for row, u in enumerate(users, offset): self._rows[str(u.user_id)] = row
+            self._users.extend(users)
+            self.endInsertRows()
+        self.pageLoaded.emit(len(self._users), self._total)
+
+    @staticmethod
+    def _fetch_page(filters, offset):
+        with SessionLocal() as db:
+            return crud.search_users(db, limit=PAGE_SIZE, offset=offset, with_total=offset == 0, **filters)
 
-    def show_details(self):
-        dlg = UserDetailsDialog(self.user, self)
-        dlg.exec()
+    def update_user(self, user_id, **fields):
+        """اعمال تغییر روی ردیف بارگذاری شده (بدون خواندن دوباره لیست)"""
+        row = self._rows.get(str(user_id))
+        if row is None: return
+        user = self._users[row]
+        for key, value in fields.items(): setattr(user, key, value)
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx)
 
-    def show_context_menu(self, pos):
-        menu = QMenu(self)
-        menu.setStyleSheet(f"QMenu {{ background: {PANEL_BG}; color: white; border: 1px solid {BORDER_COLOR}; }} QMenu::item:selected {{ background: {ACCENT_COLOR}; }}")
-        
-        act_detail = QAction("جزئیات کامل", self)
-        act_detail.triggered.connect(self.show_details)
-        menu.addAction(act_detail)
-        
-        act_copy = QAction("کپی شناسه", self)
-        act_copy.triggered.connect(lambda: QApplication.clipboard().setText(str(self.user_id)))
-        menu.addAction(act_copy)
-        
-        menu.addSeparator()
-        
-        is_banned = getattr(self.user, 'is_banned', False)
-        act_ban = QAction("رفع مسدودی" if is_banned else "مسدود کردن", self)
-        act_ban.triggered.connect(self.toggle_ban)
-        menu.addAction(act_ban)
-        
-        menu.exec(self.mapToGlobal(pos))
+# ==============================================================================
+# Delegate: کارت کاربر
+# ==============================================================================
+class UserCardDelegate(QStyledItemDelegate):
+    """
+    رسم کارت کاربر برای ردیف‌های مدل؛ فقط کارت‌های قابل مشاهده رسم می‌شوند.
+    کلیک روی چک‌باکس و دکمه‌های کارت در editorEvent تشخیص داده می‌شود.
+    """
+    CARD_SIZE = QSize(300, 240)
+    noteRequested = pyqtSignal(object)
+    chatRequested = pyqtSignal(object)
+    banRequested = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pixmaps: Dict[tuple, QPixmap] = {}
+
+    def _pixmap(self, icon, color, size) -> QPixmap:
+        key = (icon, color, size)
+        if key not in self._pixmaps:
+            self._pixmaps[key] = qta.icon(icon, color=color).pixmap(size, size)
+        return self._pixmaps[key]
+
+    def sizeHint(self, option, index):
+        return self.CARD_SIZE
+
+    def _rects(self, option) -> dict:
+        """جایگاه اجزای کارت (چپ‌چین محاسبه و برای راست‌چین قرینه می‌شود)"""
+        card = option.rect.adjusted(2, 2, -2, -6)
+        inner = card.adjusted(15, 15, -15, -15)
+        r = {"card": card}
+        r["check"] = QRect(inner.left(), inner.top() + 9, 22, 22)
+        r["avatar"] = QRect(r["check"].right() + 9, inner.top(), 40, 40)
+        r["platform"] = QRect(inner.right() - 21, inner.top() + 9, 22, 22)
+        name_left = r["avatar"].right() + 11
+        r["name"] = QRect(name_left, inner.top(), r["platform"].left() - name_left - 10, 22)
+        r["uid"] = QRect(name_left, inner.top() + 22, r["name"].width(), 18)
+        r["seen"] = QRect(inner.left(), inner.top() + 52, inner.width(), 16)
+        box_w = (inner.width() - 10) // 2
+        r["orders"] = QRect(inner.left(), inner.top() + 76, box_w, 48)
+        r["spent"] = QRect(inner.left() + box_w + 10, inner.top() + 76, box_w, 48)
+        r["ban"] = QRect(inner.right() - 33, inner.bottom() - 33, 34, 34)
+        r["chat"] = r["ban"].translated(-42, 0)
+        r["note"] = r["chat"].translated(-42, 0)
+        return {k: QStyle.visualRect(option.direction, card, v) for k, v in r.items()}
+
+    def _draw_icon(self, painter, rect, icon, color, size):
+        target = QRect(0, 0, size, size)
+        target.moveCenter(rect.center())
+        painter.drawPixmap(target, self._pixmap(icon, color, size))
+
+    def _draw_stat(self, painter, rect, value, caption, font):
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(BG_COLOR))
+        painter.drawRoundedRect(QRectF(rect), 6, 6)
+        bold = QFont(font); bold.setBold(True)
+        painter.setFont(bold); painter.setPen(QColor(TEXT_MAIN))
+        painter.drawText(rect.adjusted(0, 4, 0, -rect.height() // 2), Qt.AlignmentFlag.AlignCenter, value)
+        small = QFont(font); small.setPixelSize(10)
+        painter.setFont(small); painter.setPen(QColor(TEXT_SUB))
+        painter.drawText(rect.adjusted(0, rect.height() // 2, 0, -4), Qt.AlignmentFlag.AlignCenter, caption)
+
+    def _draw_button(self, painter, rect, icon, color):
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(color))
+        painter.drawRoundedRect(QRectF(rect), 8, 8)
+        self._draw_icon(painter, rect, icon, "white", 16)
+
+    def paint(self, painter, option, index):
+        user = index.data(UsersListModel.UserRole)
+        if user is None: return
+        r = self._rects(option)
+        lead = QStyle.visualAlignment(option.direction, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
+        is_banned = bool(getattr(user, 'is_banned', False))
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # --- قاب و سایه ---
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(QColor(0, 0, 0, 60))
+        painter.drawRoundedRect(QRectF(r["card"].translated(0, 4)), 14, 14)
+        border = ACCENT_COLOR if hovered else (DANGER_COLOR if is_banned else BORDER_COLOR)
+        painter.setPen(QPen(QColor(border), 1)); painter.setBrush(QColor(PANEL_BG))
+        painter.drawRoundedRect(QRectF(r["card"]), 14, 14)
 
-    def _on_select(self, state):
-        self.selectionChanged.emit(str(self.user_id), state == 2)
+        # --- Header ---
+        checked = index.data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        painter.setPen(QPen(QColor(ACCENT_COLOR), 2))
+        painter.setBrush(QColor(SUCCESS_COLOR) if checked else Qt.BrushStyle.NoBrush)
+        painter.drawRoundedRect(QRectF(r["check"].adjusted(2, 2, -2, -2)), 5, 5)
+        if checked: self._draw_icon(painter, r["check"], "fa5s.check", "white", 12)
+
+        badge = _user_badge(user)
+        halo = QColor(badge["col"]); halo.setAlpha(0x20)
+        painter.setPen(Qt.PenStyle.NoPen); painter.setBrush(halo)
+        painter.drawEllipse(r["avatar"])
+        self._draw_icon(painter, r["avatar"], badge["icon"], badge["col"], 20)
+
+        platform = getattr(user, 'platform', 'telegram')
+        if platform == 'telegram': self._draw_icon(painter, r["platform"], "fa5b.telegram-plane", INFO_COLOR, 22)
+        else: self._draw_icon(painter, r["platform"], "mdi6.infinity", "#8e44ad", 22)
+
+        font = QFont(option.font)
+        name_font = QFont(font); name_font.setBold(True); name_font.setPixelSize(14)
+        painter.setFont(name_font); painter.setPen(QColor(TEXT_MAIN))
+        name = painter.fontMetrics().elidedText(user.full_name or "User", Qt.TextElideMode.ElideRight, r["name"].width())
+        painter.drawText(r["name"], lead, name)
+        small = QFont(font); small.setPixelSize(11)
+        painter.setFont(small); painter.setPen(QColor(TEXT_SUB))
+        painter.drawText(r["uid"], lead, f"ID: ...{str(user.user_id)[-8:]}")
+
+        # --- Last Seen & Stats ---
+        tiny = QFont(font); tiny.setPixelSize(10)
+        painter.setFont(tiny)
+        painter.drawText(r["seen"], lead, _last_seen_text(user))
+        self._draw_stat(painter, r["orders"], f"{int(getattr(user, 'order_count', 0) or 0)}", "سفارش", font)
+        self._draw_stat(painter, r["spent"], f"{int(getattr(user, 'total_spent', 0) or 0):,}", "خرید", font)
 
-    def open_chat(self):
-        if self.platform == 'telegram':
-            webbrowser.open(f"tg://user?id={self.user_id}")
+        # --- Actions ---
+        self._draw_button(painter, r["note"], "fa5s.sticky-note", WARNING_COLOR if getattr(user, 'private_note', None) else BG_COLOR)
+        self._draw_button(painter, r["chat"], "fa5s.comment", INFO_COLOR)
+        if is_banned: self._draw_button(painter, r["ban"], "fa5s.check", SUCCESS_COLOR)
+        else: self._draw_button(painter, r["ban"], "fa5s.ban", DANGER_COLOR)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.Type.MouseButtonRelease, QEvent.Type.MouseButtonDblClick):
+            return False
+        if event.button() != Qt.MouseButton.LeftButton: return False
+        r = self._rects(option)
+        pos = event.position().toPoint()
+        # دابل‌کلیک روی چک‌باکس/دکمه‌ها نباید جزئیات کاربر را باز کند
+        hit = next((k for k in ("check", "note", "chat", "ban") if r[k].contains(pos)), None)
+        if hit is None or event.type() == QEvent.Type.MouseButtonDblClick:
+            return hit is not None
+        if hit == "check":
+            checked = index.data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+            model.setData(index, Qt.CheckState.Unchecked if checked else Qt.CheckState.Checked, Qt.ItemDataRole.CheckStateRole)
         else:
-            QApplication.clipboard().setText(str(self.user_id))
-            self.parent_widget.window().show_toast("شناسه روبیکا کپی شد.")
-
-    def open_note(self):
-        self.show_details()
-
-    def toggle_ban(self):
-        is_banned = getattr(self.user, 'is_banned', False)
-        msg = "رفع مسدودی؟" if is_banned else "مسدود کردن؟"
-        if QMessageBox.question(self, "تایید", msg) == QMessageBox.StandardButton.Yes:
-            asyncio.create_task(self._db_op(lambda: self._db_ban(not is_banned)))
-
-    async def _db_op(self, func):
-        try:
-            await asyncio.get_running_loop().run_in_executor(None, func)
-            self.parent_widget.window().show_toast("عملیات با موفقیت انجام شد.")
-            await self.parent_widget.refresh_data()
-        except Exception as e: logger.error(e)
-
-    def _db_ban(self, status):
-        with SessionLocal() as db:
-            u = db.query(models.User).filter(models.User.user_id == str(self.user_id)).first()
-            if u: u.is_banned = status; db.commit()
-
+            signal = {"note": self.noteRequested, "chat": self.chatRequested, "ban": self.banRequested}[hit]
+            signal.emit(index.data(UsersListModel.UserRole))
+        return True
 # ==============================================================================
 # Main Widget
 # ==============================================================================
@@ -389,7 +418,6 @@ class UsersWidget(QWidget):
         self.rubika_client = rubika_client
         self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
         self._data_loaded = False
-        self.selected_ids: Set[str] = set()
         self.setup_ui()
 
     def setup_ui(self):
@@ -408,14 +436,16 @@ class UsersWidget(QWidget):
         
         # Quick Filters
         h_quick = QHBoxLayout()
-        btn_new = QPushButton("جدید امروز")
-        btn_new.setStyleSheet(f"background: transparent; border: 1px solid {BORDER_COLOR}; color: {TEXT_SUB}; border-radius: 4px; padding: 4px;")
-        btn_new.clicked.connect(lambda: self._quick_filter("new"))
+        self.btn_new = QPushButton("جدید امروز"); self.btn_new.setCheckable(True)
+        self.btn_new.setStyleSheet(f"QPushButton {{ background: transparent; border: 1px solid {BORDER_COLOR}; color: {TEXT_SUB}; border-radius: 4px; padding: 4px; }} QPushButton:checked {{ background: {ACCENT_COLOR}; color: white; }}")
+        self.btn_new.clicked.connect(lambda: self._quick_filter("new"))
         
-        self.cmb_platform = QComboBox(); self.cmb_platform.addItems(["همه پلتفرم‌ها", "تلگرام", "روبیکا"])
+        self.cmb_platform = QComboBox(); self.cmb_platform.addItems(["همه پلتفرم‌ها", *PLATFORM_FILTERS])
         self.cmb_status = QComboBox(); self.cmb_status.addItems(["همه وضعیت‌ها", "فعال", "مسدود"])
-        self.cmb_platform.currentIndexChanged.connect(self._start_search)
-        self.cmb_status.currentIndexChanged.connect(self._start_search)
+        self.cmb_activity = QComboBox(); self.cmb_activity.addItems(["هر زمان", *ACTIVITY_FILTERS])
+        self.cmb_sort = QComboBox(); self.cmb_sort.addItems(list(SORT_OPTIONS))
+        for cmb in (self.cmb_platform, self.cmb_status, self.cmb_activity, self.cmb_sort):
+            cmb.currentIndexChanged.connect(self._start_search)
         
         self.inp_search = QLineEdit(); self.inp_search.setPlaceholderText("🔍 جستجو نام، آیدی یا مبلغ (>500000)")
         self.inp_search.setFixedWidth(300)
@@ -432,20 +462,51 @@ class UsersWidget(QWidget):
         btn_exp.clicked.connect(self.export_csv)
         
         h_top.addLayout(v_ti)
-        h_quick.addWidget(btn_new)
+        h_quick.addWidget(self.btn_new)
         h_top.addLayout(h_quick)
         h_top.addWidget(QLabel("پلتفرم:")); h_top.addWidget(self.cmb_platform)
         h_top.addWidget(QLabel("وضعیت:")); h_top.addWidget(self.cmb_status)
+        h_top.addWidget(QLabel("فعالیت:")); h_top.addWidget(self.cmb_activity)
+        h_top.addWidget(QLabel("ترتیب:")); h_top.addWidget(self.cmb_sort)
         h_top.addWidget(self.inp_search)
         h_top.addWidget(btn_ref); h_top.addWidget(btn_exp)
         layout.addLayout(h_top)
 
-        # --- Flow Area ---
-        scroll = QScrollArea(); scroll.setWidgetResizable(True); scroll.setStyleSheet("background: transparent; border: none;")
-        self.container = QWidget()
-        self.flow_layout = FlowLayout(self.container, spacing=15)
-        scroll.setWidget(self.container)
-        layout.addWidget(scroll)
+        # --- List (Model/View) ---
+        self.lbl_count = QLabel(""); self.lbl_count.setStyleSheet(f"color: {TEXT_SUB}; font-size: 12px;")
+        layout.addWidget(self.lbl_count)
+        self.lbl_empty = QLabel("هیچ کاربری یافت نشد."); self.lbl_empty.setStyleSheet(f"color: {TEXT_SUB}; margin: 50px;")
+        self.lbl_empty.setAlignment(Qt.AlignmentFlag.AlignCenter); self.lbl_empty.setVisible(False)
+        layout.addWidget(self.lbl_empty)
+
+        self.model = UsersListModel(self)
+        self.model.pageLoaded.connect(self._on_page_loaded)
+        self.model.selectionChanged.connect(self.update_bulk_ui)
+        self.delegate = UserCardDelegate(self)
+        self.delegate.noteRequested.connect(self.show_details)
+        self.delegate.chatRequested.connect(self.open_chat)
+        self.delegate.banRequested.connect(self.toggle_ban)
+
+        self.list_view = QListView()
+        self.list_view.setViewMode(QListView.ViewMode.IconMode)
+        self.list_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.list_view.setMovement(QListView.Movement.Static)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSpacing(8)
+        self.list_view.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.list_view.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.list_view.setMouseTracking(True)
+        self.list_view.viewport().setAttribute(Qt.WidgetAttribute.WA_Hover)
+        self.list_view.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+        self.list_view.setStyleSheet("QListView { background: transparent; border: none; }")
+        self.list_view.setModel(self.model)
+        self.list_view.setItemDelegate(self.delegate)
+        self.list_view.doubleClicked.connect(lambda idx: self.show_details(idx.data(UsersListModel.UserRole)))
+        self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        # view خودش فقط در انتهای دقیق اسکرول fetchMore می‌زند؛ صفحه بعد کمی زودتر خوانده می‌شود
+        self.list_view.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        layout.addWidget(self.list_view)
 
         # --- Bulk Toolbar ---
         self.bulk_toolbar = QFrame()
@@ -459,9 +520,7 @@ class UsersWidget(QWidget):
         layout.addWidget(self.bulk_toolbar)
 
     def _quick_filter(self, f_type):
-        if f_type == "new":
-            # تنظیم فیلتر برای کاربران جدید (مثال)
-            pass
+        # «جدید امروز»: فیلتر joined_after در _build_filters (دکمه حالت تیک‌دار دارد)
         self.refresh_data()
 
     def showEvent(self, event):
@@ -472,89 +531,135 @@ class UsersWidget(QWidget):
 
     def _start_search(self): self.search_timer.start(300)
 
-    @asyncSlot()
-    async def refresh_data(self):
-        while self.flow_layout.count():
-            item = self.flow_layout.takeAt(0)
-            if item.widget(): item.widget().deleteLater()
-        self.selected_ids.clear(); self.update_bulk_ui()
-        
-        q = self.inp_search.text().lower().strip()
-        p_f = self.cmb_platform.currentText()
-        s_f = self.cmb_status.currentText()
-        
-        loop = asyncio.get_running_loop()
-        try:
-            users = await loop.run_in_executor(None, lambda: self._fetch_users(q, p_f, s_f))
-            
-            if not users:
-                l = QLabel("هیچ کاربری یافت نشد."); l.setStyleSheet(f"color: {TEXT_SUB}; margin: 50px;"); l.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.flow_layout.addWidget(l)
-            else:
-                for u in users:
-                    card = UserCard(u, self)
-                    card.selectionChanged.connect(self._on_card_select)
-                    self.flow_layout.addWidget(card)
-        except Exception as e: logger.error(e)
-
-    def _fetch_users(self, q, p_f, s_f):
+    def _build_filters(self) -> dict:
+        """تبدیل کنترل‌های هدر به فیلترهای crud.search_users"""
+        filters = {"sort_by": SORT_OPTIONS.get(self.cmb_sort.currentText(), "spent")}
+
+        q = self.inp_search.text().strip()
+        amount = re.fullmatch(r"([<>])\s*([\d,]+)", q)
+        if amount:
+            value = int(amount.group(2).replace(",", ""))
+            filters["min_spent" if amount.group(1) == ">" else "max_spent"] = value
+        elif q:
+            filters["query"] = q
+
+        platform = PLATFORM_FILTERS.get(self.cmb_platform.currentText())
+        if platform: filters["platform"] = platform
+        status = self.cmb_status.currentText()
+        if status != "همه وضعیت‌ها": filters["banned"] = status == "مسدود"
+
+        activity = ACTIVITY_FILTERS.get(self.cmb_activity.currentText())
+        if activity:
+            seen_within, idle_for = activity
+            if seen_within: filters["seen_after"] = datetime.now() - timedelta(days=seen_within)
+            if idle_for: filters["seen_before"] = datetime.now() - timedelta(days=idle_for)
+        if self.btn_new.isChecked():
+            filters["joined_after"] = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return filters
+
+    def refresh_data(self):
+        self.lbl_empty.setVisible(False)
+        self.model.reset(self._build_filters())
+
+    @property
+    def selected_ids(self) -> Set[str]:
+        return self.model.selected_ids
+
+    def _on_page_loaded(self, loaded, total):
+        self.lbl_count.setText(f"{loaded:,} از {total:,} کاربر")
+        self.lbl_empty.setVisible(total == 0)
+        # اگر صفحه اول اسکرول ایجاد نکرد، صفحه بعدی هم بارگذاری شود
+        QTimer.singleShot(0, self._on_scroll)
+
+    def _on_scroll(self, *_):
+        bar = self.list_view.verticalScrollBar()
+        if bar.value() >= bar.maximum() - 300 and self.model.canFetchMore():
+            self.model.fetchMore()
+
+    def _fetch_all(self, filters):
         with SessionLocal() as db:
-            all_users = crud.get_all_users(db)
-            res = []
-            for u in all_users:
-                # Filters
-                if p_f != "همه پلتفرم‌ها" and u.platform != p_f.lower(): continue
-                if s_f == "فعال" and u.is_banned: continue
-                if s_f == "مسدود" and not u.is_banned: continue
-                
-                # Search
-                match = True
-                if q:
-                    if ">" in q:
-                        try:
-                            amt = int(q.replace(">", ""))
-                            spent = sum(o.total_amount for o in u.orders if o.status in ['paid', 'shipped', 'approved'])
-                            if spent <= amt: match = False
-                        except: pass
-                    elif "<" in q:
-                         try:
-                            amt = int(q.replace("<", ""))
-                            spent = sum(o.total_amount for o in u.orders if o.status in ['paid', 'shipped', 'approved'])
-                            if spent >= amt: match = False
-                         except: pass
-                    else:
-                        if q not in (u.full_name or "").lower() and q not in str(u.user_id): match = False
-                
-                if match:
-                    spent = sum(o.total_amount for o in u.orders if o.status in ['paid', 'shipped', 'approved'])
-                    obj = type('U', (), {
-                        "user_id": u.user_id, "full_name": u.full_name, "platform": u.platform,
-                        "is_banned": u.is_banned, "private_note": u.private_note,
-                        "order_count": len(u.orders), "total_spent": spent, "last_seen": u.last_seen
-                    })
-                    res.append(obj)
-            
-            res.sort(key=lambda x: x.total_spent, reverse=True)
-            return res
-
-    def _on_card_select(self, uid, selected):
-        if selected: self.selected_ids.add(uid)
-        else: self.selected_ids.discard(uid)
-        self.update_bulk_ui()
+            return crud.search_users(db, limit=None, with_total=False, **filters)[0]
 
-    def update_bulk_ui(self):
+    def update_bulk_ui(self, *_):
         c = len(self.selected_ids)
         self.bulk_toolbar.setVisible(c > 0)
         self.lbl_sel.setText(f"{c} انتخاب شده")
 
+    # --- عملیات کارت ---
+    def show_details(self, user):
+        if user is None: return
+        dlg = UserDetailsDialog(user, self)
+        if dlg.exec():
+            self.model.update_user(user.user_id, private_note=dlg.txt_note.toPlainText())
+
+    def show_context_menu(self, pos):
+        user = self.list_view.indexAt(pos).data(UsersListModel.UserRole)
+        if user is None: return
+        menu = QMenu(self)
+        menu.setStyleSheet(f"QMenu {{ background: {PANEL_BG}; color: white; border: 1px solid {BORDER_COLOR}; }} QMenu::item:selected {{ background: {ACCENT_COLOR}; }}")
+
+        act_detail = QAction("جزئیات کامل", self)
+        act_detail.triggered.connect(lambda: self.show_details(user))
+        menu.addAction(act_detail)
+
+        act_copy = QAction("کپی شناسه", self)
+        act_copy.triggered.connect(lambda: QApplication.clipboard().setText(str(user.user_id)))
+        menu.addAction(act_copy)
+
+        menu.addSeparator()
+
+        is_banned = getattr(user, 'is_banned', False)
+        act_ban = QAction("رفع مسدودی" if is_banned else "مسدود کردن", self)
+        act_ban.triggered.connect(lambda: self.toggle_ban(user))
+        menu.addAction(act_ban)
+
+        menu.exec(self.list_view.viewport().mapToGlobal(pos))
+
+    def open_chat(self, user):
+        if getattr(user, 'platform', 'telegram') == 'telegram':
+            webbrowser.open(f"tg://user?id={user.user_id}")
+        else:
+            QApplication.clipboard().setText(str(user.user_id))
+            self.window().show_toast("شناسه روبیکا کپی شد.")
+
+    def toggle_ban(self, user):
+        is_banned = bool(getattr(user, 'is_banned', False))
+        msg = "رفع مسدودی؟" if is_banned else "مسدود کردن؟"
+        if QMessageBox.question(self, "تایید", msg) == QMessageBox.StandardButton.Yes:
+            asyncio.create_task(self._set_banned(str(user.user_id), not is_banned))
+
+    async def _set_banned(self, user_id, status):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: self._db_ban(user_id, status))
+            self.window().show_toast("عملیات با موفقیت انجام شد.")
+            # با فیلتر وضعیت فعال، کاربر دیگر در نتیجه نیست و لیست باید دوباره خوانده شود
+            if "banned" in self.model.filters(): self.refresh_data()
+            else: self.model.update_user(user_id, is_banned=status)
+        except Exception as e: logger.error(e)
+
+    def _db_ban(self, user_id, status):
+        with SessionLocal() as db:
+            u = db.query(models.User).filter(models.User.user_id == str(user_id)).first()
+            if u: u.is_banned = status; db.commit()
     @asyncSlot()
     async def broadcast(self):
+        if not self.selected_ids: return
+        if not broadcast_engine.platforms():
+            return self.window().show_toast("هیچ رباتی متصل نیست.", is_error=True)
         text, ok = QInputDialog.getText(self, "پیام همگانی", "متن پیام:")
         if ok and text:
-            self.window().show_toast(f"در حال ارسال به {len(self.selected_ids)} کاربر...")
-            # Logic sending...
-            await asyncio.sleep(1) # Simulate
-            self.window().show_toast("پیام ارسال شد.")
+            user_ids = list(self.selected_ids)
+            loop = asyncio.get_running_loop()
+            job_id = await loop.run_in_executor(None, lambda: self._create_broadcast(text, user_ids))
+            if not job_id:
+                return self.window().show_toast("ثبت پیام ناموفق بود.", is_error=True)
+            self.window().show_toast(f"در حال ارسال به {len(user_ids)} کاربر...")
+            result = await broadcast_engine.submit(job_id)
+            self.window().show_toast(f"{result.sent} پیام ارسال شد. (ناموفق: {result.failed + result.blocked})")
+
+    def _create_broadcast(self, text, user_ids):
+        with SessionLocal() as db:
+            return crud.create_broadcast_job(db, text, user_ids=user_ids)
 
     def export_csv(self):
         path, _ = QFileDialog.getSaveFileName(self, "خروجی اکسل", "users.csv", "CSV (*.csv)")
@@ -564,7 +669,8 @@ class UsersWidget(QWidget):
     async def _do_export(self, path):
         try:
             loop = asyncio.get_running_loop()
-            users = await loop.run_in_executor(None, lambda: self._fetch_users("", "همه پلتفرم‌ها", "همه وضعیت‌ها"))
+            filters = self._build_filters()
+            users = await loop.run_in_executor(None, lambda: self._fetch_all(filters))
             with open(path, 'w', newline='', encoding='utf-8-sig') as f:
                 w = csv.writer(f)
                 w.writerow(["شناسه", "نام", "پلتفرم", "مجموع خرید", "تعداد سفارش", "وضعیت"])
@@ -0,0 +1,268 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from bot.media import send_photo_cached
+from bot.utils import run_db
+from db import crud
+from db.media_registry import media_registry
+from db.media_derivatives import media_derivatives
+
+logger = logging.getLogger("Broadcast")
+
+# ==============================================================================
+# 1. محدودکننده نرخ (Token Bucket)
+# ==============================================================================
+class TokenBucket:
+    """
+    محدودکننده نرخ ناهمگام: حداکثر rate ارسال در ثانیه با ظرفیت انفجاری capacity.
+    با pause() (مثلاً بعد از RetryAfter تلگرام) تمام ارسال‌ها تا پایان زمان انتظار متوقف می‌شوند.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# ==============================================================================
+# 2. موتور ارسال پیام همگانی
+# ==============================================================================
+@dataclass
+class BroadcastProgress:
+    job_id: int
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    status: str = "pending"
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+ProgressCallback = Callable[[BroadcastProgress], None]
+
+class BroadcastEngine:
+    """
+    ارسال پیام‌های همگانی ثبت شده در جدول broadcast_jobs.
+
+    گیرندگان دسته‌دسته از دیتابیس خوانده و به صورت همزمان (حداکثر concurrency ارسال باز)
+    ارسال می‌شوند؛ نرخ کل با TokenBucket و فاصله پیام‌های هر چت با per_chat_interval کنترل می‌شود.
+    نتیجه هر دسته در یک تراکنش ثبت می‌شود، پس بعد از ری‌استارت فقط گیرندگان باقی‌مانده ارسال می‌شوند.
+    نرخ پیش‌فرض کمی کمتر از سقف ۳۰ پیام در ثانیه تلگرام است تا برای پاسخ‌های خود ربات جا بماند.
+    """
+
+    def __init__(self, rate: float = 25.0, per_chat_interval: float = 1.0, concurrency: int = 10,
+                 batch_size: int = 100, max_attempts: int = 3):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.telegram_bot = None
+        self.rubika_client = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._listeners: Dict[int, List[ProgressCallback]] = {}
+        self._cancelled: Set[int] = set()
+        self._chat_ready: Dict[str, float] = {}
+        self._upload_lock = asyncio.Lock()
+
+    # --- اتصال کلاینت‌ها ---
+    def attach(self, telegram_bot=None, rubika_client=None):
+        if telegram_bot is not None:
+            self.telegram_bot = telegram_bot
+        if rubika_client is not None:
+            self.rubika_client = rubika_client
+
+    def platforms(self) -> Set[str]:
+        available = set()
+        if self.telegram_bot is not None:
+            available.add("telegram")
+        if self.rubika_client is not None:
+            available.add("rubika")
+        return available
+
+    # --- مدیریت jobها ---
+    def submit(self, job_id: int, on_progress: Optional[ProgressCallback] = None) -> asyncio.Task:
+        """شروع (یا پیوستن به) ارسال یک job؛ خروجی Task با نتیجه BroadcastProgress"""
+        if on_progress:
+            self._listeners.setdefault(job_id, []).append(on_progress)
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda t, j=job_id: self._on_done(j, t))
+        return task
+
+    async def resume(self) -> List[int]:
+        """ادامه پیام‌های همگانی نیمه‌کاره (بعد از ری‌استارت برنامه)"""
+        job_ids = await run_db(crud.get_open_broadcast_job_ids)
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info(f"Resuming broadcast jobs: {job_ids}")
+        return job_ids
+
+    def cancel(self, job_id: int):
+        """توقف job بعد از اتمام دسته در حال ارسال"""
+        if job_id in self._tasks:
+            self._cancelled.add(job_id)
+
+    def is_running(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    def _on_done(self, job_id: int, task: asyncio.Task):
+        self._tasks.pop(job_id, None)
+        self._listeners.pop(job_id, None)
+        self._cancelled.discard(job_id)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Broadcast job {job_id} crashed: {task.exception()}")
+
+    def _notify(self, progress: BroadcastProgress):
+        for callback in self._listeners.get(progress.job_id, []):
+            try:
+                callback(progress)
+            except Exception as e:
+                logger.debug(f"Broadcast progress callback failed: {e}")
+
+    # --- حلقه اصلی ---
+    async def _run(self, job_id: int) -> BroadcastProgress:
+        job = await run_db(crud.get_broadcast_job, job_id)
+        progress = BroadcastProgress(job_id=job_id)
+        if not job or job.status not in crud.BROADCAST_OPEN_STATUSES:
+            return progress
+        progress.total = job.total
+        await run_db(crud.set_broadcast_job_status, job_id, "running")
+        progress.status = "running"
+
+        after_id, skipped, first_batch = 0, False, True
+        while job_id not in self._cancelled:
+            batch = await run_db(crud.get_broadcast_batch, job_id, self.batch_size, after_id)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            # گیرندگان پلتفرم‌های قطع شده در انتظار می‌مانند تا در اجرای بعدی ارسال شوند
+            ready = [r for r in batch if r[2] in self.platforms()]
+            skipped = skipped or len(ready) < len(batch)
+
+            results = await self._send_batch(job, ready, warm_up=first_batch)
+            first_batch = False
+            state = await run_db(crud.save_broadcast_results, job_id, results)
+            if state:
+                progress.sent, progress.failed, progress.blocked = state.sent_count, state.failed_count, state.blocked_count
+            else:
+                # نتیجه ثبت نشد؛ job باز می‌ماند تا در اجرای بعدی تکمیل شود
+                skipped = True
+            self._notify(progress)
+
+        if job_id in self._cancelled:
+            progress.status = "cancelled"
+        else:
+            progress.status = "pending" if skipped else "done"
+        await run_db(crud.set_broadcast_job_status, job_id, progress.status)
+        self._notify(progress)
+        logger.info(
+            f"Broadcast {job_id} {progress.status}: sent={progress.sent} failed={progress.failed} blocked={progress.blocked}"
+        )
+        return progress
+
+    async def _send_batch(self, job, batch: List[Tuple[int, str, str]], warm_up: bool = False) -> List[dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(rid: int, user_id: str, platform: str) -> dict:
+            async with semaphore:
+                status, attempts, error = await self._deliver(job, user_id, platform)
+            return {"id": rid, "user_id": user_id, "status": status, "attempts": attempts, "error": error}
+
+        results = []
+        if warm_up and job.image_path and batch:
+            # اولین عکس به تنهایی ارسال می‌شود تا بقیه از file_id آن استفاده کنند (نه آپلود همزمان)
+            results.append(await deliver(*batch[0]))
+            batch = batch[1:]
+        results.extend(await asyncio.gather(*(deliver(*r) for r in batch)))
+        return results
+
+    async def _throttle(self, chat_id: str):
+        now = time.monotonic()
+        ready_at = self._chat_ready.get(chat_id, 0.0)
+        self._chat_ready[chat_id] = max(now, ready_at) + self.per_chat_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        await self.bucket.acquire()
+        if len(self._chat_ready) > 10000:
+            self._chat_ready = {k: v for k, v in self._chat_ready.items() if v > now}
+
+    async def _deliver(self, job, user_id: str, platform: str) -> Tuple[str, int, Optional[str]]:
+        """خروجی: (وضعیت sent/failed/blocked، تعداد تلاش، خطا)"""
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            await self._throttle(user_id)
+            try:
+                await self._send(job, user_id, platform)
+                return "sent", attempt, None
+            except Forbidden as e:
+                # کاربر ربات را بلاک کرده یا حسابش حذف شده
+                return "blocked", attempt, str(e)
+            except RetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing broadcast for {e.retry_after}s")
+                self.bucket.pause(float(e.retry_after))
+                error = e
+            except BadRequest as e:
+                return "failed", attempt, str(e)
+            except NetworkError as e:
+                error = e
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                return "failed", attempt, str(e)
+        return "failed", self.max_attempts, str(error)
+
+    async def _send(self, job, user_id: str, platform: str):
+        if platform == "telegram":
+            if job.image_path:
+                await send_photo_cached(self.telegram_bot, int(user_id), job.image_path, caption=job.text or None)
+            else:
+                await self.telegram_bot.send_message(chat_id=int(user_id), text=job.text)
+        elif platform == "rubika":
+            if job.image_path:
+                file_id = await self._rubika_file_id(job.image_path)
+                await self.rubika_client.send_file(user_id, file_id, caption=job.text)
+            else:
+                await self.rubika_client.send_message(chat_id=user_id, text=job.text)
+
+    async def _rubika_file_id(self, path: str) -> str:
+        async with self._upload_lock:
+            content_hash = media_registry.cached_hash(path) or await asyncio.to_thread(media_registry.content_hash, path)
+            file_id = await run_db(media_registry.get_file_id, content_hash, "rubika")
+            if not file_id:
+                upload = await asyncio.to_thread(media_derivatives.get, path, "photo")
+                file_id = await self.rubika_client.upload_file(str(upload))
+                await run_db(media_registry.remember, content_hash, "rubika", file_id, str(path))
+            return file_id
+
+broadcast_engine = BroadcastEngine()
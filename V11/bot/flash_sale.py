@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import threading
+from typing import List, Optional
+
+from bot.utils import run_db
+from db.flash_sale import flash_sale
+
+logger = logging.getLogger("FlashSale")
+
+class FlashSaleReconciler:
+    """
+    حلقه پس‌زمینه فروش ویژه: خواندن لیست محصولات از تنظیمات، آزاد کردن رزروهای منقضی
+    و انتقال دسته‌ای فروش‌ها به موجودی دیتابیس هر interval ثانیه.
+
+    ربات تلگرام و روبیکا هر کدام در event loop خود start را صدا می‌زنند اما در هر پروسه فقط یک
+    حلقه اجرا می‌شود؛ با توقف loop صاحب حلقه، اجرای آن به loop ثبت‌شده بعدی منتقل می‌شود.
+    """
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._lock = threading.Lock()
+
+    async def start(self, _app=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._loops:
+                self._loops.append(loop)
+            if self._task is None or self._task.done():
+                self._task = loop.create_task(self._loop())
+
+    async def stop(self, _app=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop in self._loops:
+                self._loops.remove(loop)
+            task = self._task if self._task is not None and self._task.get_loop() is loop else None
+            if task is not None:
+                self._task = None
+            successor = self._loops[0] if task is not None and self._loops else None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if successor is not None:
+            try:
+                successor.call_soon_threadsafe(lambda: successor.create_task(self.start()))
+            except RuntimeError:
+                logger.warning("Flash sale reconciler could not move to the remaining bot loop")
+        # فروش‌های باقی‌مانده قبل از خاموشی ثبت شوند
+        if flash_sale.has_pending():
+            await run_db(flash_sale.flush)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.warning(f"Flash sale reconcile failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self):
+        await run_db(flash_sale.sync)
+        freed = flash_sale.expire()
+        if freed:
+            logger.debug(f"Released {freed} expired flash sale reservations")
+        if flash_sale.has_pending():
+            await run_db(flash_sale.flush)
+
+flash_sale_reconciler = FlashSaleReconciler()
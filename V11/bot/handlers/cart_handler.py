@@ -90,22 +90,8 @@ async def update_cart_item_handler(update: Update, context: ContextTypes.DEFAULT
     prod_id = int(parts[2])
     change = int(parts[3])
     
-    def _logic(db, uid, pid, delta):
-        item = db.query(models.CartItem).filter_by(user_id=str(uid), product_id=pid).first()
-        if not item: return False
-        
-        new_qty = item.quantity + delta
-        if new_qty <= 0:
-            db.delete(item)
-        else:
-            if delta > 0 and item.product.stock < new_qty:
-                raise ValueError("موجودی انبار کافی نیست.")
-            item.quantity = new_qty
-        db.commit()
-        return True
-
     try:
-        await run_db(_logic, query.from_user.id, prod_id, change)
+        await run_db(crud.change_cart_quantity, query.from_user.id, prod_id, change)
         await query.answer()
         await view_cart(update, context)
     except ValueError as e:
@@ -284,16 +270,8 @@ async def get_receipt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     }
 
     try:
-        # ثبت در دیتابیس (اتمیک)
-        order = await run_db(crud.create_order_from_cart, user.id, shipping_data)
-        
-        # ذخیره آیدی عکس فیش در سفارش
-        def _update_receipt(db, oid, pid):
-            order_obj = db.query(models.Order).filter_by(id=oid).first()
-            if order_obj: order_obj.payment_receipt_photo_id = pid
-            db.commit()
-        
-        await run_db(_update_receipt, order.id, photo_id)
+        # ثبت در دیتابیس (اتمیک، همراه با آیدی عکس فیش)
+        order = await run_db(crud.create_order_from_cart, user.id, shipping_data, receipt_photo_id=photo_id)
 
         # پیام موفقیت به کاربر
         success_text = responses.ORDER_CONFIRMATION.format(
@@ -8,7 +8,8 @@ from telegram.error import BadRequest
 
 from bot.utils import run_db
 from db import crud, models
-from bot import keyboards, responses
+from db.category_tree import category_tree, CategorySnapshot
+from bot import keyboards, responses, media
 from config import BASE_DIR
 
 logger = logging.getLogger("ProductsHandler")
@@ -20,26 +21,25 @@ PRODUCTS_PER_PAGE = 6
 # توابع کمکی (Navigation Helpers)
 # ==============================================================================
 
+async def get_bot_username(context: ContextTypes.DEFAULT_TYPE) -> str:
+    """یوزرنیم ربات؛ از نتیجه get_me زمان initialize خوانده می‌شود و فقط یک بار دریافت می‌گردد"""
+    try:
+        return context.bot.username
+    except RuntimeError:
+        # ربات هنوز initialize نشده (مثلاً کلاینت سبک پنل)
+        return (await context.bot.get_me()).username
+
+async def get_category_tree() -> CategorySnapshot:
+    """درخت دسته‌ها از حافظه (فقط در صورت منقضی شدن، یک کوئری به دیتابیس)"""
+    return category_tree.current() or await run_db(category_tree.load)
+
 async def build_breadcrumb(cat_id: int) -> str:
     """
-    ساخت نوار ناوبری متنی به صورت بازگشتی.
+    ساخت نوار ناوبری متنی از درخت دسته‌های درون حافظه.
     خروجی: 🏠 خانه > دسته اصلی > زیردسته
     """
-    path_names = []
-    current_id = cat_id
-
-    def get_cat_sync(db, cid):
-        return db.query(models.Category).filter_by(id=cid).first()
-
-    while current_id:
-        cat = await run_db(get_cat_sync, current_id)
-        if cat:
-            path_names.append(cat.name)
-            current_id = cat.parent_id
-        else:
-            break
-            
-    path_names.reverse()
+    tree = await get_category_tree()
+    path_names = [node.name for node in tree.path(cat_id)]
     breadcrumb = "🏠 <b>خانه</b>"
     if path_names:
         breadcrumb += " > " + " > ".join(f"<b>{n}</b>" for n in path_names)
@@ -63,18 +63,14 @@ async def list_categories(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if len(parts) > 2 and parts[2] != 'None':
             parent_id = int(parts[2])
 
+    tree = await get_category_tree()
+
     # 2. مدیریت دکمه بازگشت (پیدا کردن والدِ والد)
     if "cat:back" in data and parent_id:
-        def get_parent_sync(db, cid):
-            c = db.query(models.Category).filter_by(id=cid).first()
-            return c.parent_id if c else None
-        parent_id = await run_db(get_parent_sync, parent_id)
+        parent_id = tree.parent_id(parent_id)
 
     # 3. دریافت لیست دسته‌های مورد نظر
-    if parent_id:
-        categories = await run_db(crud.get_subcategories, parent_id)
-    else:
-        categories = await run_db(crud.get_root_categories)
+    categories = tree.children(parent_id) if parent_id else tree.roots()
 
     # 4. اگر این دسته هیچ زیرمجموعه‌ای نداشت، مستقیم لیست محصولاتش را نشان بده
     if not categories and parent_id:
@@ -111,21 +107,32 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     parts = query.data.split(':')
     cat_id = int(parts[2])
     page = int(parts[3]) if len(parts) > 3 else 1
+    cursor = parts[4] if len(parts) > 4 else None
     
-    await render_products_page(update, context, cat_id, page)
+    await render_products_page(update, context, cat_id, page, cursor)
 
-async def render_products_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cat_id: int, page: int):
-    """تابع مرکزی برای نمایش لیست محصولات یک دسته خاص"""
+async def render_products_page(update: Update, context: ContextTypes.DEFAULT_TYPE, cat_id: int, page: int, cursor: Optional[str] = None):
+    """
+    تابع مرکزی برای نمایش لیست محصولات یک دسته خاص.
+    cursor به شکل a<id> (صفحه بعد) یا b<id> (صفحه قبل) است؛ بدون آن صفحه با offset خوانده می‌شود.
+    """
     query = update.callback_query
-    
-    # دریافت محصولات فعال دسته
-    all_prods = await run_db(crud.get_active_products_by_category, cat_id)
-
-    total_pages = max(1, math.ceil(len(all_prods) / PRODUCTS_PER_PAGE))
-    page = max(1, min(page, total_pages))
-
-    start = (page - 1) * PRODUCTS_PER_PAGE
-    prods = all_prods[start : start + PRODUCTS_PER_PAGE]
+    page = max(1, page)
+
+    # دریافت فقط همین صفحه + تعداد کل از دیتابیس
+    # offset همراه کرسر هم ارسال می‌شود تا اگر محصول کرسر حذف شده باشد همان صفحه نمایش داده شود
+    page_kwargs = {"limit": PRODUCTS_PER_PAGE, "offset": (page - 1) * PRODUCTS_PER_PAGE}
+    if cursor and cursor[1:].isdigit():
+        page_kwargs["after_id" if cursor[0] == "a" else "before_id"] = int(cursor[1:])
+    prods, total = await run_db(crud.get_active_products_page, cat_id, **page_kwargs)
+
+    total_pages = max(1, math.ceil(total / PRODUCTS_PER_PAGE))
+    if not prods and page > 1:
+        # صفحه درخواستی دیگر وجود ندارد (مثلاً محصولات کم شده‌اند)؛ نمایش صفحه اول
+        page = 1
+        prods, total = await run_db(crud.get_active_products_page, cat_id, limit=PRODUCTS_PER_PAGE)
+        total_pages = max(1, math.ceil(total / PRODUCTS_PER_PAGE))
+    page = min(page, total_pages)
 
     breadcrumb = await build_breadcrumb(cat_id)
     kbd = keyboards.build_product_keyboard(prods, cat_id, page, total_pages)
@@ -168,19 +175,12 @@ async def show_product_details(update: Update, context: ContextTypes.DEFAULT_TYP
             msg_obj = update.message
         except: return
 
-    # دریافت محصول با تمام متعلقات (Images, Variants)
-    prod = await run_db(crud.get_product, prod_id)
-    if not prod:
+    # دریافت محصول با تمام متعلقات و وضعیت کاربر (سبد/علاقه‌مندی) در یک فراخوانی
+    detail = await run_db(crud.get_product_detail, prod_id, user_id)
+    if not detail:
         await msg_obj.reply_text("❌ متاسفانه محصول یافت نشد یا حذف شده است.")
         return
-
-    # دریافت وضعیت کاربر نسبت به محصول
-    cart_items = await run_db(crud.get_cart_items, user_id)
-    favs = await run_db(crud.get_user_favorites, user_id)
-    is_fav = any(f.id == prod.id for f in favs)
-    
-    this_item = next((i for i in cart_items if i.product_id == prod.id), None)
-    cart_qty = this_item.quantity if this_item else 0
+    prod, cart_qty, is_fav = detail
 
     # آماده‌سازی متن قیمت (تخفیف هوشمند)
     final_price = prod.discount_price if (prod.discount_price and prod.discount_price > 0) else prod.price
@@ -199,51 +199,56 @@ async def show_product_details(update: Update, context: ContextTypes.DEFAULT_TYP
         cart_preview=f"\n🛒 در سبد خرید شما: <b>{cart_qty} عدد</b>" if cart_qty > 0 else ""
     )
 
-    bot_info = await context.bot.get_me()
-    kbd = keyboards.get_product_detail_keyboard(prod, is_fav, cart_qty, bot_info.username)
+    kbd = keyboards.get_product_detail_keyboard(prod, is_fav, cart_qty, await get_bot_username(context))
 
     # --- منطق ارسال مدیا (بسیار مهم برای پرفورمنس) ---
-    image_to_send = None
-    
-    # 1. اولویت اول: استفاده از File ID تلگرام (بسیار سریع)
-    if prod.image_file_id:
+    # 1. اولویت اول: گالری جدید (اولین عکس) / 2. ستون قدیمی image_path
+    image_path = None
+    for rel in ([prod.images[0].image_path] if prod.images else []) + [getattr(prod, 'image_path', None)]:
+        if rel and (Path(BASE_DIR) / rel).exists():
+            image_path = Path(BASE_DIR) / rel
+            break
+
+    # file_id هر عکس از رجیستری مدیا (هش محتوا -> file_id) خوانده می‌شود؛ فقط بار اول آپلود می‌شود
+    content_hash, image_to_send = (await media.get_cached_photo(image_path)) if image_path else (None, None)
+    if not image_path and prod.image_file_id:
+        # 3. فایل محلی موجود نیست: استفاده از File ID قدیمی ذخیره شده
         image_to_send = prod.image_file_id
-    # 2. اولویت دوم: استفاده از گالری جدید (اولین عکس)
-    elif prod.images:
-        full_path = Path(BASE_DIR) / prod.images[0].image_path
-        if full_path.exists():
-            image_to_send = open(full_path, 'rb')
-    # 3. اولویت سوم: ستون قدیمی (برای سازگاری)
-    elif hasattr(prod, 'image_path') and prod.image_path:
-        full_path = Path(BASE_DIR) / prod.image_path
-        if full_path.exists():
-            image_to_send = open(full_path, 'rb')
 
+    upload = None
     try:
-        if image_to_send:
-            if msg_obj.photo:
-                # ویرایش تصویر پیام فعلی (بدون پرش)
-                await msg_obj.edit_media(
-                    media=InputMediaPhoto(media=image_to_send, caption=text, parse_mode='HTML'),
-                    reply_markup=kbd
-                )
-            else:
-                # ارسال پیام جدید اگر قبلی متنی بود
-                if query: await msg_obj.delete()
-                sent = await context.bot.send_photo(msg_obj.chat_id, image_to_send, caption=text, reply_markup=kbd, parse_mode='HTML')
-                
-                # ذخیره File ID در دیتابیس برای دفعات بعدی (Cache)
-                if not prod.image_file_id:
-                    def save_fid(db, pid, fid):
-                        p = db.query(models.Product).get(pid)
-                        p.image_file_id = fid
-                        db.commit()
-                    await run_db(save_fid, prod.id, sent.photo[-1].file_id)
+        if image_path or image_to_send:
+            if not image_to_send:
+                upload = open(await media.upload_path(image_path), 'rb')
+                image_to_send = upload
+            try:
+                if msg_obj.photo:
+                    # ویرایش تصویر پیام فعلی (بدون پرش)
+                    sent = await msg_obj.edit_media(
+                        media=InputMediaPhoto(media=image_to_send, caption=text, parse_mode='HTML'),
+                        reply_markup=kbd
+                    )
+                else:
+                    # ارسال پیام جدید اگر قبلی متنی بود
+                    if query: await msg_obj.delete()
+                    sent = await context.bot.send_photo(msg_obj.chat_id, image_to_send, caption=text, reply_markup=kbd, parse_mode='HTML')
+            finally:
+                if upload: upload.close()
+
+            # ثبت File ID در رجیستری مدیا برای دفعات بعدی
+            if upload and content_hash and not isinstance(sent, bool):
+                await media.remember_photo(content_hash, image_path, sent)
         else:
             # ارسال متنی اگر هیچ عکسی یافت نشد
             if query: await msg_obj.edit_text(text, reply_markup=kbd, parse_mode='HTML')
             else: await msg_obj.reply_text(text, reply_markup=kbd, parse_mode='HTML')
             
+    except BadRequest as e:
+        if content_hash and not upload and media.is_file_id_error(e):
+            # file_id کش شده دیگر معتبر نیست؛ بار بعد دوباره آپلود می‌شود
+            await media.forget_photo(content_hash)
+        logger.error(f"Error in show_product_details: {e}")
+        await msg_obj.reply_text(text, reply_markup=kbd, parse_mode='HTML')
     except Exception as e:
         logger.error(f"Error in show_product_details: {e}")
         await msg_obj.reply_text(text, reply_markup=kbd, parse_mode='HTML')
@@ -1,4 +1,3 @@
-import math
 import logging
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -12,9 +11,8 @@ from telegram.ext import (
 )
 from telegram.error import BadRequest
 
-from bot.utils import run_db
-from db import crud, models
 from bot import keyboards, responses
+from bot.search_cache import SearchResultCache
 
 logger = logging.getLogger("SearchHandler")
 
@@ -24,6 +22,9 @@ SEARCH_QUERY_STATE, APPLY_FILTER_STATE = range(2)
 # تنظیمات نمایش
 PRODUCTS_PER_PAGE = 6
 
+# کش نتایج جستجو (لیست مرتب شناسه‌ها)
+search_results_cache = SearchResultCache(page_size=PRODUCTS_PER_PAGE)
+
 # ==============================================================================
 # تابع کمکی (Helper)
 # ==============================================================================
@@ -92,25 +93,12 @@ async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE
         sort_by = parts[3]
         page = int(parts[4]) if action == "page" and len(parts) > 4 else 1
 
-        # 1. دریافت تعداد کل نتایج (برای محاسبه صفحات)
-        total_items = await run_db(crud.get_product_search_count, query=search_term)
-        
-        total_pages = max(1, math.ceil(total_items / PRODUCTS_PER_PAGE))
-        current_page = max(1, min(page, total_pages))
-        
-        # 2. دریافت محصولات صفحه فعلی
-        limit = PRODUCTS_PER_PAGE
-        offset = (current_page - 1) * limit
-        
-        products = await run_db(
-            crud.advanced_search_products,
-            query=search_term,
-            sort_by=sort_by,
-            limit=limit,
-            offset=offset
+        # 1. دریافت صفحه از کش نتایج (لیست شناسه‌ها یک بار برای هر عبارت/مرتب‌سازی خوانده می‌شود)
+        products, total_items, total_pages, current_page, capped = await search_results_cache.get_page(
+            search_term, sort_by, page
         )
 
-        # 3. ساخت کیبورد نتایج
+        # 2. ساخت کیبورد نتایج
         kbd = keyboards.build_search_results_keyboard(
             products=products,
             query=search_term,
@@ -123,7 +111,7 @@ async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE
             msg_text = (
                 f"🔎 نتایج جستجو برای: <b>{search_term}</b>\n"
                 f"📄 صفحه <b>{current_page}</b> از <b>{total_pages}</b>\n\n"
-                f"تعداد کل نتایج: {total_items} کالا"
+                f"تعداد کل نتایج: {'بیش از ' if capped else ''}{total_items} کالا"
             )
         else:
             msg_text = responses.SEARCH_NO_RESULT
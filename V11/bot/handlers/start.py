@@ -1,17 +1,25 @@
 import logging
-import asyncio
 from pathlib import Path
 from telegram import Update, constants
 from telegram.ext import ContextTypes, CommandHandler
 from telegram.error import BadRequest
 
-from bot import responses, keyboards
+from bot import responses, keyboards, media
 from bot.utils import run_db
 from db import crud
 from config import BASE_DIR
 
 logger = logging.getLogger("StartHandler")
 
+# تنظیمات مورد نیاز صفحه شروع به همراه مقدار پیش‌فرض
+START_SETTINGS = {
+    "tg_shop_name": "فروشگاه",
+    "tg_is_open": "true",
+    "tg_welcome_message": "",
+    "tg_welcome_image": "",
+    "channel_link": "",
+}
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     هندلر اصلی دستور /start و دکمه بازگشت به خانه.
@@ -47,20 +55,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         except (ValueError, IndexError):
             pass # در صورت بروز خطا در آیدی، منوی اصلی نمایش داده می‌شود
 
-    # ۲. دریافت اطلاعات مورد نیاز به صورت موازی (بهبود چشمگیر سرعت لود)
+    # ۲. دریافت اطلاعات مورد نیاز در یک سشن و یک رفت‌وبرگشت به دیتابیس
     try:
-        tasks = [
-            run_db(crud.get_or_create_user, user.id, user.full_name or "کاربر", user.username, "telegram"),
-            run_db(crud.get_setting, "tg_shop_name", "فروشگاه"),
-            run_db(crud.get_setting, "tg_is_open", "true"),
-            run_db(crud.get_setting, "tg_welcome_message", ""),
-            run_db(crud.get_setting, "tg_welcome_image", ""),
-            run_db(crud.get_setting, "channel_link", ""),
-            run_db(crud.get_user_stats, user.id)
-        ]
-        results = await asyncio.gather(*tasks)
-        
-        db_user, shop_name, is_open, welcome_tpl, banner_rel, channel_url, stats = results
+        ctx = await run_db(
+            crud.load_start_context,
+            user.id, user.full_name or "کاربر", user.username, "telegram",
+            setting_defaults=START_SETTINGS
+        )
+        settings, stats = ctx["settings"], ctx["stats"]
+        shop_name = settings["tg_shop_name"]
+        is_open = settings["tg_is_open"]
+        welcome_tpl = settings["tg_welcome_message"]
+        banner_rel = settings["tg_welcome_image"]
+        channel_url = settings["channel_link"]
     except Exception as e:
         logger.error(f"Error in Start-Gather: {e}")
         await context.bot.send_message(chat_id=chat_id, text="⚠️ خطا در ارتباط با سرور. لطفاً مجدداً /start کنید.")
@@ -94,18 +101,19 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     try:
         if has_valid_banner:
             # اگر بنر داریم:
-            with open(banner_full_path, 'rb') as photo:
-                if query and query.message:
-                    # در تلگرام نمی‌توان پیام متنی را به عکس‌دار ادیت کرد؛ پس پیام قبلی حذف و جدید ارسال می‌شود
-                    await query.message.delete()
-                
-                await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo,
-                    caption=welcome_text,
-                    reply_markup=kbd,
-                    parse_mode=constants.ParseMode.HTML
-                )
+            if query and query.message:
+                # در تلگرام نمی‌توان پیام متنی را به عکس‌دار ادیت کرد؛ پس پیام قبلی حذف و جدید ارسال می‌شود
+                await query.message.delete()
+
+            # بنر فقط بار اول آپلود می‌شود و بعد از آن با file_id ارسال می‌گردد
+            await media.send_photo_cached(
+                context.bot,
+                chat_id,
+                banner_full_path,
+                caption=welcome_text,
+                reply_markup=kbd,
+                parse_mode=constants.ParseMode.HTML
+            )
         else:
             # اگر بنر نداریم (فقط متن):
             if query and query.message:
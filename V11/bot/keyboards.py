@@ -61,7 +61,10 @@ def build_category_keyboard(categories: List[models.Category], current_cat_id: O
     return InlineKeyboardMarkup(keyboard)
 
 def build_product_keyboard(products: List[models.Product], cat_id: int, page: int, total_pages: int) -> InlineKeyboardMarkup:
-    """لیست محصولات با نمایش قیمت و صفحه‌بندی هوشمند."""
+    """
+    لیست محصولات با نمایش قیمت و صفحه‌بندی هوشمند.
+    دکمه‌های قبلی/بعدی کرسر Keyset را حمل می‌کنند: b<اولین id> و a<آخرین id>.
+    """
     keyboard = []
     for p in products:
         # انتخاب قیمت (اگر تخفیف داشت، قیمت تخفیفی نمایش داده شود)
@@ -73,12 +76,14 @@ def build_product_keyboard(products: List[models.Product], cat_id: int, page: in
     if total_pages > 1:
         nav_row = []
         if page > 1:
-            nav_row.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"prod:list:{cat_id}:{page-1}"))
+            prev_cursor = f":b{products[0].id}" if products else ""
+            nav_row.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"prod:list:{cat_id}:{page-1}{prev_cursor}"))
         
         nav_row.append(InlineKeyboardButton(f"📄 {page}/{total_pages}", callback_data="noop"))
         
         if page < total_pages:
-            nav_row.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"prod:list:{cat_id}:{page+1}"))
+            next_cursor = f":a{products[-1].id}" if products else ""
+            nav_row.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"prod:list:{cat_id}:{page+1}{next_cursor}"))
         keyboard.append(nav_row)
 
     keyboard.append([InlineKeyboardButton(responses.BACK_BUTTON, callback_data=f"cat:list:{cat_id}")])
@@ -197,6 +202,9 @@ def get_search_filter_keyboard(query: str) -> InlineKeyboardMarkup:
             InlineKeyboardButton("🆕 جدیدترین", callback_data=f"search:filter:{query}:newest"),
             InlineKeyboardButton("🔥 پرفروش‌ترین", callback_data=f"search:filter:{query}:top_seller")
         ],
+        [
+            InlineKeyboardButton("🎯 مرتبط‌ترین", callback_data=f"search:filter:{query}:relevance")
+        ],
         [InlineKeyboardButton("🔙 انصراف", callback_data="main_menu")]
     ])
 
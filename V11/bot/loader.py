@@ -7,6 +7,8 @@ from telegram.ext import (
     filters
 )
 from bot.error_handler import global_error_handler
+from bot.flash_sale import flash_sale_reconciler
+from db.database import dispose_async_engine
 from bot.handlers import (
     start,
     products_handler,
@@ -17,6 +19,15 @@ from bot.handlers import (
 
 logger = logging.getLogger(__name__)
 
+async def on_startup(app: Application):
+    """post_init اپلیکیشن: شروع کارهای پس‌زمینه ربات"""
+    await flash_sale_reconciler.start()
+
+async def on_shutdown(app: Application):
+    """post_shutdown اپلیکیشن: ثبت فروش‌های ویژه باقی‌مانده و بستن اتصال‌های async دیتابیس"""
+    await flash_sale_reconciler.stop()
+    await dispose_async_engine()
+
 async def _unknown_callback(update, context):
     """جلوگیری از نمایش آیکون لودینگ روی دکمه‌هایی که هندلر ندارند"""
     query = update.callback_query
@@ -53,7 +64,7 @@ def setup_application_handlers(app: Application, admin_handler=None):
     # لیست محصولات و مدیریت صفحه‌بندی
     app.add_handler(CallbackQueryHandler(
         products_handler.list_products, 
-        pattern=r"^(prod:list:|noop)$"
+        pattern=r"^(prod:list:\d+(:\d+(:[ab]\d+)?)?|noop)$"
     ))
 
     # نمایش جزئیات کامل یک محصول
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from telegram import Bot, Message
+from telegram.error import BadRequest
+
+from bot.utils import run_db
+from db.media_registry import media_registry
+from db.media_derivatives import media_derivatives
+
+logger = logging.getLogger("BotMedia")
+
+PLATFORM = "telegram"
+
+async def _content_hash(path: Union[str, Path]) -> str:
+    # هش فقط بار اول (یا بعد از تغییر فایل) در ترد جداگانه محاسبه می‌شود
+    return media_registry.cached_hash(path) or await asyncio.to_thread(media_registry.content_hash, path)
+
+async def upload_path(path: Union[str, Path]) -> Path:
+    """فایلی که به جای اصل آپلود می‌شود (نسخه بهینه و بدون EXIF؛ ساخت فقط بار اول)"""
+    return media_derivatives.cached(path, "photo") or await asyncio.to_thread(media_derivatives.get, path, "photo")
+
+def is_file_id_error(e: BadRequest) -> bool:
+    return "file" in str(e).lower()
+
+async def get_cached_photo(path: Union[str, Path]) -> Tuple[str, Optional[str]]:
+    """خروجی: (هش محتوا، file_id ثبت شده برای تلگرام یا None)"""
+    content_hash = await _content_hash(path)
+    file_id = media_registry.peek(content_hash, PLATFORM)
+    if not file_id:
+        file_id = await run_db(media_registry.get_file_id, content_hash, PLATFORM)
+    return content_hash, file_id
+
+async def remember_photo(content_hash: str, path: Union[str, Path], message: Optional[Message]):
+    """ثبت file_id عکس آپلود شده (از پیام ارسال/ویرایش شده)"""
+    if message is None or not getattr(message, "photo", None):
+        return
+    file_id = message.photo[-1].file_id
+    if media_registry.peek(content_hash, PLATFORM) != file_id:
+        await run_db(media_registry.remember, content_hash, PLATFORM, file_id, str(path))
+
+async def forget_photo(content_hash: str):
+    await run_db(media_registry.forget, content_hash, PLATFORM)
+
+async def send_photo_cached(bot: Bot, chat_id: Union[int, str], path: Union[str, Path], **kwargs) -> Message:
+    """
+    ارسال عکس از روی دیسک با استفاده مجدد از file_id.
+    فقط اولین ارسال هر فایل آپلود می‌شود؛ اگر file_id توسط تلگرام رد شود، دوباره آپلود می‌گردد.
+    """
+    content_hash, file_id = await get_cached_photo(path)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+        except BadRequest as e:
+            if not is_file_id_error(e):
+                raise
+            logger.warning(f"Cached file_id rejected for {path}, re-uploading: {e}")
+            await forget_photo(content_hash)
+
+    with open(await upload_path(path), "rb") as photo:
+        message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+    await remember_photo(content_hash, path, message)
+    return message
@@ -0,0 +1,123 @@
+import time
+import math
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+from bot.utils import run_db
+from db import crud, models, search
+
+logger = logging.getLogger("SearchCache")
+
+@dataclass
+class _SearchEntry:
+    ids: List[int]
+    created: float
+    capped: bool = False
+
+class SearchResultCache:
+    """
+    کش نتایج جستجو به ازای (عبارت، مرتب‌سازی).
+
+    فقط لیست مرتب شناسه‌ها (حداکثر max_results) کش می‌شود؛ محصولات هر صفحه در هر درخواست
+    با شناسه از دیتابیس خوانده می‌شوند تا قیمت و موجودی همیشه تازه باشد.
+    پس از نمایش هر صفحه، صفحه بعد در پس‌زمینه خوانده و فقط prefetch_ttl ثانیه نگه داشته می‌شود.
+    ورودی‌ها با TTL منقضی و با LRU حذف می‌شوند.
+    """
+
+    def __init__(self, page_size: int = 6, ttl: float = 120.0, max_entries: int = 256, max_results: int = 1000,
+                 prefetch_ttl: float = 5.0):
+        self.page_size = page_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self.prefetch_ttl = prefetch_ttl
+        self._entries: "OrderedDict[Tuple[str, str], _SearchEntry]" = OrderedDict()
+        # (کلید جستجو، صفحه) -> (شناسه‌های صفحه، محصولات، زمان خواندن)
+        self._prefetched: "OrderedDict[Tuple[Tuple[str, str], int], Tuple[List[int], List[models.Product], float]]" = OrderedDict()
+        self._prefetch_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(term: str, sort_by: str) -> Tuple[str, str]:
+        return " ".join(search.tokenize(term)) or term.strip(), sort_by
+
+    def _get_entry(self, key) -> Optional[_SearchEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _load_entry(self, term: str, sort_by: str) -> _SearchEntry:
+        key = self._key(term, sort_by)
+        entry = self._get_entry(key)
+        if entry is None:
+            # یک شناسه اضافه خوانده می‌شود تا بریده شدن نتایج (بیش از max_results) مشخص باشد
+            ids = await run_db(crud.search_product_ids, query=term, sort_by=sort_by, limit=self.max_results + 1)
+            entry = _SearchEntry(ids=ids[:self.max_results], created=time.monotonic(),
+                                 capped=len(ids) > self.max_results)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def get_page(self, term: str, sort_by: str, page: int) -> Tuple[List[models.Product], int, int, int, bool]:
+        """
+        خروجی: (محصولات صفحه، تعداد کل، تعداد صفحات، شماره صفحه اصلاح‌شده، بریده شده)
+        اگر نتایج بیش از max_results باشد تعداد کل همان max_results است و مقدار آخر True.
+        """
+        key = self._key(term, sort_by)
+        entry = await self._load_entry(term, sort_by)
+        total = len(entry.ids)
+        total_pages = max(1, math.ceil(total / self.page_size))
+        page = max(1, min(page, total_pages))
+        page_ids = self._page_ids(entry, page)
+        products = self._take_prefetched(key, page, page_ids)
+        if products is None:
+            products = await run_db(crud.get_products_by_ids, page_ids)
+        if page < total_pages:
+            self._schedule_prefetch(key, page + 1, self._page_ids(entry, page + 1))
+        return products, total, total_pages, page, entry.capped
+
+    def _page_ids(self, entry: _SearchEntry, page: int) -> List[int]:
+        start = (page - 1) * self.page_size
+        return entry.ids[start:start + self.page_size]
+
+    def _take_prefetched(self, key, page: int, page_ids: List[int]) -> Optional[List[models.Product]]:
+        """صفحه پیش‌خوانده شده، فقط اگر تازه باشد و شناسه‌هایش تغییر نکرده باشد"""
+        cached = self._prefetched.pop((key, page), None)
+        if cached is None:
+            return None
+        ids, products, loaded = cached
+        if ids != page_ids or time.monotonic() - loaded > self.prefetch_ttl:
+            return None
+        return products
+
+    def _schedule_prefetch(self, key, page: int, page_ids: List[int]):
+        if not page_ids or (key, page) in self._prefetched:
+            return
+        # همزمان حداکثر max_entries خواندن پس‌زمینه انجام می‌شود
+        if len(self._prefetch_tasks) >= self.max_entries:
+            return
+        task = asyncio.create_task(self._prefetch(key, page, page_ids))
+        self._prefetch_tasks.add(task)
+        task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def _prefetch(self, key, page: int, page_ids: List[int]):
+        try:
+            products = await run_db(crud.get_products_by_ids, page_ids)
+        except Exception as e:
+            logger.debug(f"Search prefetch failed: {e}")
+            return
+        self._prefetched[(key, page)] = (page_ids, products, time.monotonic())
+        while len(self._prefetched) > self.max_entries:
+            self._prefetched.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._prefetched.clear()
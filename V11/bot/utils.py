@@ -3,7 +3,7 @@ import logging
 import traceback
 import sys
 from typing import Callable, Any, TypeVar, Optional
-from db.database import SessionLocal
+from db.database import SessionLocal, get_async_session_factory
 
 logger = logging.getLogger("DB_Utils")
 
@@ -26,10 +26,11 @@ async def run_db(
     **kwargs: Any
 ) -> T:
     """
-    اجرای توابع دیتابیس (Sync) در ترد جداگانه (Async) برای جلوگیری از هنگ کردن ربات.
+    اجرای توابع دیتابیس برای هندلرهای ربات بدون هنگ کردن event loop.
     
-    این تابع یک سشن دیتابیس ایجاد کرده، آن را به عنوان اولین ورودی به تابع 
-    مورد نظر (func) پاس می‌دهد و پس از پایان کار، سشن را می‌بندد.
+    در حالت عادی تابع روی یک AsyncSession (aiosqlite/asyncpg) و از طریق run_sync اجرا می‌شود
+    و هیچ تردی از Thread Pool پیش‌فرض اشغال نمی‌کند. اگر درایور async نصب نباشد،
+    مثل قبل یک سشن Sync در ترد جداگانه ساخته می‌شود.
 
     :param func: تابعی از لایه CRUD که ورودی اول آن 'db' است.
     :param args: سایر ورودی‌های موقعیتی تابع.
@@ -43,32 +44,42 @@ async def run_db(
         db = SessionLocal()
         try:
             # اجرای تابع و تزریق دیتابیس
-            result = func(db, *args, **kwargs)
-            return result
-        except Exception as e:
-            # ثبت دقیق خطا در لاگ
-            logger.error(f"❌ Database Error in '{func.__name__}': {e}")
-            # در حالت Debug تریس‌بک کامل چاپ شود
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(traceback.format_exc())
-            # بازگشت خطا به سمت هندلر ربات برای اطلاع‌رسانی به کاربر
-            raise e
+            return func(db, *args, **kwargs)
         finally:
             # بستن حتمی سشن برای جلوگیری از نشت حافظه (Memory Leak)
             db.close()
 
-    # اجرای لفافه (Wrapper) در ترد جداگانه
+    async def native_wrapper(session_factory):
+        async with session_factory() as db:
+            try:
+                return await db.run_sync(func, *args, **kwargs)
+            except Exception:
+                await db.rollback()
+                raise
+
+    session_factory = get_async_session_factory()
+    if session_factory is not None:
+        operation = native_wrapper(session_factory)
+    else:
+        # اجرای لفافه (Wrapper) در ترد جداگانه
+        operation = to_thread(sync_wrapper)
+
     try:
         if timeout:
-            return await asyncio.wait_for(to_thread(sync_wrapper), timeout=timeout)
+            return await asyncio.wait_for(operation, timeout=timeout)
         else:
-            return await to_thread(sync_wrapper)
+            return await operation
             
     except asyncio.TimeoutError:
         logger.error(f"⏰ Database Timeout in '{func.__name__}' after {timeout}s")
         raise Exception("عملیات پایگاه داده بیش از حد طول کشید.")
     except Exception as e:
-        # خطاهای دیگر که از سمت دیتابیس بالا آمده‌اند
+        # ثبت دقیق خطا در لاگ
+        logger.error(f"❌ Database Error in '{func.__name__}': {e}")
+        # در حالت Debug تریس‌بک کامل چاپ شود
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(traceback.format_exc())
+        # بازگشت خطا به سمت هندلر ربات برای اطلاع‌رسانی به کاربر
         raise e
 
 # --- توابع کاربردی جانبی ---
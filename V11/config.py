@@ -18,6 +18,7 @@ if ENV_PATH.exists():
 # مسیرهای فایل‌های استاتیک و مدیا
 MEDIA_DIR = BASE_DIR / 'media'
 MEDIA_PRODUCTS_DIR = MEDIA_DIR / 'products'
+MEDIA_DERIVED_DIR = MEDIA_DIR / 'derived'  # بندانگشتی‌ها و عکس‌های بهینه (قابل بازسازی)
 TEMP_DIR = BASE_DIR / 'temp'
 
 # مسیرهای دیتابیس و لاگ
@@ -29,19 +30,21 @@ LOG_DIR = BASE_DIR / 'logs'
 REQUIRED_DIRS = [
     MEDIA_DIR,
     MEDIA_PRODUCTS_DIR,
+    MEDIA_DERIVED_DIR,
     DB_FOLDER,
     BACKUP_DIR,
     LOG_DIR,
     TEMP_DIR
 ]
 
-# ساخت خودکار پوشه‌ها در صورت عدم وجود
-for folder in REQUIRED_DIRS:
-    try:
-        folder.mkdir(parents=True, exist_ok=True)
-    except PermissionError:
-        print(f"❌ Error: Permission denied creating directory: {folder}")
-        sys.exit(1)
+def ensure_directories():
+    """ساخت پوشه‌های حیاتی در صورت عدم وجود"""
+    for folder in REQUIRED_DIRS:
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+        except PermissionError:
+            print(f"❌ Error: Permission denied creating directory: {folder}")
+            sys.exit(1)
 
 # ==============================================================================
 # 2. پیکربندی لاگینگ (Advanced Logging)
@@ -74,6 +77,10 @@ def setup_logging():
 
     file_formatter = logging.Formatter(log_format, datefmt=date_format)
 
+    # جلوگیری از تکرار هندلرها (و باز کردن بی‌مورد فایل لاگ)
+    if logging.getLogger().hasHandlers():
+        return
+
     # فایل لاگ با چرخش (حداکثر 5MB، نگهداری 3 فایل) - بهینه شده
     log_file = LOG_DIR / 'app.log'
     file_handler = RotatingFileHandler(
@@ -90,17 +97,13 @@ def setup_logging():
     # تنظیمات ریشه
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-
-    # جلوگیری از تکرار هندلرها
-    if not root_logger.hasHandlers():
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(console_handler)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(console_handler)
 
     # سایلنت کردن کتابخانه‌های پرحرف برای تمیزی لاگ
     for lib in ["httpx", "telegram", "apscheduler", "sqlalchemy", "PIL", "matplotlib", "asyncio"]:
         logging.getLogger(lib).setLevel(logging.WARNING)
 
-setup_logging()
 logger = logging.getLogger("Config")
 
 # ==============================================================================
@@ -117,8 +120,6 @@ except Exception as e:
     logger.error(f"Error parsing ADMIN_USER_IDS: {e}")
     ADMIN_USER_IDS = []
 
-if not ADMIN_USER_IDS:
-    logger.warning("⚠️ No admins defined! Some features may be restricted.")
 
 # ==============================================================================
 # 4. تنظیمات دیتابیس
@@ -129,20 +130,40 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     # استفاده از SQLite محلی
     DATABASE_URL = f"sqlite:///{DB_FOLDER / DB_NAME}"
-    logger.info(f"Using SQLite database at: {DB_FOLDER / DB_NAME}")
-else:
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    logger.info("Using External Database")
+elif DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 # ==============================================================================
 # 5. تنظیمات اضافی
 # ==============================================================================
 TIME_ZONE = os.getenv("TIME_ZONE", "Asia/Tehran")
 
+# ==============================================================================
+# 6. راه‌اندازی (Bootstrap)
+# ==============================================================================
+_bootstrapped = False
+
+def bootstrap():
+    """
+    ساخت پوشه‌ها و پیکربندی لاگ؛ فقط نقطه‌های ورود برنامه (run_panel، main، db.maintenance)
+    آن را صدا می‌زنند تا import کردن config هیچ اثر جانبی نداشته باشد. اجرای چندباره بی‌اثر است.
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    _bootstrapped = True
+    ensure_directories()
+    setup_logging()
+    if not ADMIN_USER_IDS:
+        logger.warning("⚠️ No admins defined! Some features may be restricted.")
+    if DATABASE_URL.startswith("sqlite"):
+        logger.info(f"Using SQLite database at: {DATABASE_URL.replace('sqlite:///', '', 1)}")
+    else:
+        logger.info("Using External Database")
+
 __all__ = [
-    "BASE_DIR", "MEDIA_DIR", "MEDIA_PRODUCTS_DIR", "TEMP_DIR",
+    "BASE_DIR", "MEDIA_DIR", "MEDIA_PRODUCTS_DIR", "MEDIA_DERIVED_DIR", "TEMP_DIR",
     "DB_FOLDER", "BACKUP_DIR", "LOG_DIR",
     "TELEGRAM_BOT_TOKEN", "RUBIKA_BOT_TOKEN", "ADMIN_USER_IDS",
-    "DATABASE_URL", "TIME_ZONE"
+    "DATABASE_URL", "TIME_ZONE", "bootstrap"
 ]
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+نسخه‌های Async توابع CRUD برای هندلرهای ربات.
+
+هر تابع عمومی ماژول crud در اینجا به صورت یک coroutine در دسترس است که
+خودش AsyncSession را باز می‌کند و نیازی به پاس دادن db ندارد:
+
+    user = await async_crud.get_or_create_user(uid, name, username, "telegram")
+
+منطق کوئری‌ها فقط در crud نوشته می‌شود و اینجا روی AsyncSession.run_sync اجرا می‌شود؛
+پنل Qt همچنان مستقیماً از crud و SessionLocal استفاده می‌کند.
+"""
+import functools
+import inspect
+from typing import Any, Callable, Dict
+
+from . import crud
+from .database import run_in_async_session
+
+_cache: Dict[str, Callable[..., Any]] = {}
+
+def make_async(func: Callable[..., Any]) -> Callable[..., Any]:
+    """تبدیل یک تابع CRUD (با ورودی اول db) به coroutine بدون ورودی db"""
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_in_async_session(func, *args, **kwargs)
+    return wrapper
+
+def __getattr__(name: str) -> Callable[..., Any]:
+    if name in _cache:
+        return _cache[name]
+    func = getattr(crud, name, None)
+    if name.startswith("_") or not inspect.isfunction(func) or func.__module__ != crud.__name__:
+        raise AttributeError(f"module 'db.async_crud' has no attribute '{name}'")
+    _cache[name] = make_async(func)
+    return _cache[name]
@@ -0,0 +1,387 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, time as dt_time, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config import BACKUP_DIR, DATABASE_URL
+
+try:
+    import zstandard
+except ImportError:  # بدون zstandard بک‌آپ‌ها با gzip فشرده می‌شوند
+    zstandard = None
+
+logger = logging.getLogger("Backup")
+
+CHUNK = 1024 * 1024
+EXTENSIONS = {"zstd": ".db.zst", "gzip": ".db.gz", "none": ".db"}
+# بک‌آپ‌های این انواع مشمول سیاست نگهداری می‌شوند؛ بک‌آپ دستی و پیش از بازگردانی هرگز خودکار حذف نمی‌شوند
+ROTATED_KINDS = ("startup", "auto")
+# تنظیمات بک‌آپ خودکار روزانه (صفحه تنظیمات پنل)
+AUTO_BACKUP_DEFAULTS = {"auto_backup_enabled": "false", "auto_backup_time": "00:00"}
+
+def sqlite_path(url: str = DATABASE_URL) -> Optional[Path]:
+    """مسیر فایل دیتابیس SQLite (یا None برای دیتابیس‌های دیگر)"""
+    if not url.startswith("sqlite:///"):
+        return None
+    return Path(url.replace("sqlite:///", "", 1))
+
+class BackupManager:
+    """
+    بک‌آپ آنلاین دیتابیس SQLite بدون توقف نویسنده‌ها.
+
+    کپی با sqlite3.Connection.backup و به صورت گام‌به‌گام (pages_per_step صفحه در هر گام) روی یک
+    تراکنش خواندنی انجام می‌شود؛ در حالت WAL نویسنده‌ها قفل نمی‌شوند و تصویر گرفته شده سازگار است
+    (شامل تغییرات داخل فایل -wal). روش جایگزین VACUUM INTO نسخه‌ای فشرده‌شده (بدون صفحات خالی) می‌سازد.
+    خروجی با zstd (در صورت نصب) یا gzip فشرده، با SHA-256 در catalog.json ثبت و طبق سیاست
+    ساعتی/روزانه/هفتگی پاکسازی می‌شود. متدها سنگین هستند و باید در ترد جداگانه اجرا شوند.
+    """
+
+    def __init__(self, root: Path = BACKUP_DIR, db_path: Optional[Path] = None,
+                 pages_per_step: int = 1024, step_pause: float = 0.005,
+                 keep_hourly: int = 24, keep_daily: int = 7, keep_weekly: int = 8):
+        self.root = Path(root)
+        self._db_path = db_path
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.keep_hourly = keep_hourly
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self._lock = threading.Lock()
+
+    @property
+    def db_path(self) -> Optional[Path]:
+        return self._db_path or sqlite_path()
+
+    @property
+    def catalog_path(self) -> Path:
+        return self.root / "catalog.json"
+
+    @staticmethod
+    def default_compression() -> str:
+        return "zstd" if zstandard is not None else "gzip"
+
+    # --- کاتالوگ ---
+    def _read_catalog(self) -> List[Dict]:
+        try:
+            return json.loads(self.catalog_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Backup catalog unreadable, starting a new one: {e}")
+            return []
+
+    def _write_catalog(self, entries: List[Dict]):
+        tmp = self.catalog_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.catalog_path)
+
+    def entries(self) -> List[Dict]:
+        """بک‌آپ‌های موجود (جدیدترین اول)؛ فایل‌های .db قدیمی بدون کاتالوگ هم فهرست می‌شوند"""
+        if not self.root.exists():
+            return []
+        with self._lock:
+            entries = [e for e in self._read_catalog() if (self.root / e["name"]).exists()]
+        entries += self._legacy_entries({e["name"] for e in entries})
+        return sorted(entries, key=lambda e: e["created_at"], reverse=True)
+
+    def _legacy_entries(self, known) -> List[Dict]:
+        """
+        فایل‌های .db نسخه‌های قبلی (بدون کاتالوگ).
+        startup_*.db های قدیمی از نوع startup حساب می‌شوند تا مثل قبل مشمول پاکسازی باشند.
+        """
+        legacy = []
+        for f in self.root.glob("*.db"):
+            if f.name in known:
+                continue
+            stat = f.stat()
+            legacy.append({
+                "name": f.name, "kind": "startup" if f.name.startswith("startup_") else "legacy",
+                "method": "copy", "compression": "none",
+                "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+                "size": stat.st_size, "db_size": stat.st_size, "sha256": None,
+            })
+        return legacy
+
+    def path_of(self, entry: Dict) -> Path:
+        return self.root / entry["name"]
+
+    # --- ایجاد بک‌آپ ---
+    def create(self, kind: str = "manual", method: str = "backup", compression: Optional[str] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        ایجاد بک‌آپ و ثبت آن در کاتالوگ.
+        method: "backup" (کپی آنلاین صفحه‌به‌صفحه) یا "vacuum" (VACUUM INTO)
+        compression: "zstd"، "gzip" یا "none" (پیش‌فرض: zstd در صورت نصب، وگرنه gzip)
+        progress(remaining, total): گزارش پیشرفت بر حسب صفحه (فقط روش backup)
+        """
+        source = self.db_path
+        if source is None:
+            raise RuntimeError("Online backup is only supported for SQLite databases")
+        if not source.exists():
+            raise FileNotFoundError(source)
+        compression = compression or self.default_compression()
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        now = datetime.now()
+        name = f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}"
+        counter = 1
+        while (self.root / f"{name}{EXTENSIONS[compression]}").exists():
+            counter += 1
+            name = f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}_{counter}"
+        snapshot = self.root / f".{name}.snapshot"
+        target = self.root / f"{name}{EXTENSIONS[compression]}"
+
+        started = time.perf_counter()
+        try:
+            if method == "vacuum":
+                self._vacuum_into(source, snapshot)
+            elif method == "backup":
+                self._online_copy(source, snapshot, progress)
+            else:
+                raise ValueError(f"Unknown backup method: {method}")
+            db_size = snapshot.stat().st_size
+            digest = self._compress(snapshot, target, compression)
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+        finally:
+            snapshot.unlink(missing_ok=True)
+
+        entry = {
+            "name": target.name, "kind": kind, "method": method, "compression": compression,
+            "created_at": now.isoformat(timespec="seconds"),
+            "size": target.stat().st_size, "db_size": db_size, "sha256": digest,
+        }
+        with self._lock:
+            catalog = [e for e in self._read_catalog() if (self.root / e["name"]).exists()]
+            catalog.append(entry)
+            self._write_catalog(catalog)
+        logger.info(f"Backup {target.name} created in {time.perf_counter() - started:.1f}s "
+                    f"({db_size / 1048576:.1f} MB -> {entry['size'] / 1048576:.1f} MB)")
+        if kind in ROTATED_KINDS:
+            self.prune()
+        return entry
+
+    def _online_copy(self, source: Path, dest: Path, progress=None):
+        src = sqlite3.connect(source, timeout=20, isolation_level=None)
+        dst = sqlite3.connect(dest)
+        try:
+            # تراکنش خواندنی باز در طول کل کپی: در حالت WAL تصویر ثابت می‌ماند و نوشتن‌های دیگر
+            # باعث شروع دوباره کپی نمی‌شوند
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+            def step(status, remaining, total):
+                if progress:
+                    progress(remaining, total)
+                if remaining and self.step_pause:
+                    time.sleep(self.step_pause)
+
+            src.backup(dst, pages=self.pages_per_step, progress=step)
+            src.execute("COMMIT")
+        finally:
+            dst.close()
+            src.close()
+
+    @staticmethod
+    def _vacuum_into(source: Path, dest: Path):
+        src = sqlite3.connect(source, timeout=20, isolation_level=None)
+        try:
+            src.execute("VACUUM INTO ?", (str(dest),))
+        finally:
+            src.close()
+
+    @staticmethod
+    def _compress(src: Path, dest: Path, compression: str) -> str:
+        """فشرده‌سازی جریانی فایل و محاسبه SHA-256 خروجی"""
+        digest = hashlib.sha256()
+        partial = dest.with_name(dest.name + ".part")
+        try:
+            with open(src, "rb") as fin, open(partial, "wb") as raw:
+                if compression == "zstd":
+                    with zstandard.ZstdCompressor(level=6, threads=-1).stream_writer(raw, closefd=False) as out:
+                        shutil.copyfileobj(fin, out, CHUNK)
+                elif compression == "gzip":
+                    with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                        shutil.copyfileobj(fin, out, CHUNK)
+                else:
+                    shutil.copyfileobj(fin, raw, CHUNK)
+            with open(partial, "rb") as f:
+                for block in iter(lambda: f.read(CHUNK), b""):
+                    digest.update(block)
+            os.replace(partial, dest)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        return digest.hexdigest()
+
+    # --- بررسی و بازگردانی ---
+    def verify(self, entry: Dict) -> bool:
+        """مقایسه SHA-256 فایل با مقدار ثبت شده (بک‌آپ‌های قدیمی بدون checksum معتبر فرض می‌شوند)"""
+        if not entry.get("sha256"):
+            return self.path_of(entry).exists()
+        digest = hashlib.sha256()
+        with open(self.path_of(entry), "rb") as f:
+            for block in iter(lambda: f.read(CHUNK), b""):
+                digest.update(block)
+        return digest.hexdigest() == entry["sha256"]
+
+    def _decompress(self, entry: Dict, dest: Path):
+        path = self.path_of(entry)
+        with open(dest, "wb") as out:
+            if entry["compression"] == "zstd":
+                if zstandard is None:
+                    raise RuntimeError("zstandard is required to restore this backup")
+                with open(path, "rb") as fin, zstandard.ZstdDecompressor().stream_reader(fin) as reader:
+                    shutil.copyfileobj(reader, out, CHUNK)
+            elif entry["compression"] == "gzip":
+                with gzip.open(path, "rb") as fin:
+                    shutil.copyfileobj(fin, out, CHUNK)
+            else:
+                with open(path, "rb") as fin:
+                    shutil.copyfileobj(fin, out, CHUNK)
+
+    def restore(self, entry: Dict) -> Dict:
+        """
+        بازگردانی بک‌آپ روی دیتابیس فعلی.
+        قبل از آن از وضعیت فعلی یک بک‌آپ pre_restore گرفته می‌شود؛ کپی از طریق backup API خود
+        SQLite انجام می‌شود تا فایل -wal هم سازگار بماند. بعد از بازگردانی برنامه باید ری‌استارت شود.
+        """
+        target = self.db_path
+        if target is None:
+            raise RuntimeError("Restore is only supported for SQLite databases")
+        if not self.verify(entry):
+            raise ValueError(f"Checksum mismatch for {entry['name']}")
+        safety = self.create(kind="pre_restore") if target.exists() else None
+
+        restored = self.root / f".{entry['name']}.restore"
+        try:
+            self._decompress(entry, restored)
+            src = sqlite3.connect(restored)
+            dst = sqlite3.connect(target, timeout=20)
+            try:
+                check = src.execute("PRAGMA quick_check").fetchone()[0]
+                if check != "ok":
+                    raise ValueError(f"Backup {entry['name']} is corrupt: {check}")
+                src.backup(dst, pages=self.pages_per_step)
+            finally:
+                dst.close()
+                src.close()
+        finally:
+            restored.unlink(missing_ok=True)
+        logger.info(f"Database restored from {entry['name']}")
+        return safety
+
+    # --- نگهداری ---
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """
+        سیاست نگهداری بک‌آپ‌های خودکار: جدیدترین بک‌آپ هر ساعت در keep_hourly ساعت اخیر،
+        هر روز در keep_daily روز اخیر و هر هفته در keep_weekly هفته اخیر؛ بقیه حذف می‌شوند.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            catalog = [e for e in self._read_catalog() if (self.root / e["name"]).exists()]
+            legacy = self._legacy_entries({e["name"] for e in catalog})
+            rotated = sorted((e for e in catalog + legacy if e["kind"] in ROTATED_KINDS),
+                             key=lambda e: e["created_at"], reverse=True)
+            keep = set()
+            rules = (
+                (timedelta(hours=self.keep_hourly), "%Y%m%d%H"),
+                (timedelta(days=self.keep_daily), "%Y%m%d"),
+                (timedelta(weeks=self.keep_weekly), "%G%V"),
+            )
+            for window, bucket_format in rules:
+                seen = set()
+                for entry in rotated:
+                    created = datetime.fromisoformat(entry["created_at"])
+                    bucket = created.strftime(bucket_format)
+                    if now - created <= window and bucket not in seen:
+                        seen.add(bucket)
+                        keep.add(entry["name"])
+            removed = 0
+            for entry in rotated:
+                if entry["name"] in keep:
+                    continue
+                try:
+                    (self.root / entry["name"]).unlink(missing_ok=True)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not remove old backup {entry['name']}: {e}")
+                    keep.add(entry["name"])
+            self._write_catalog([e for e in catalog if e["kind"] not in ROTATED_KINDS or e["name"] in keep])
+        if removed:
+            logger.info(f"Pruned {removed} old backups")
+        return removed
+
+class AutoBackupScheduler:
+    """
+    بک‌آپ خودکار روزانه طبق تنظیمات auto_backup_enabled و auto_backup_time.
+    یک ترد پس‌زمینه هر interval ثانیه بررسی می‌کند؛ اگر ساعت تعیین شده امروز گذشته باشد و بعد از آن
+    بک‌آپ auto در کاتالوگ نباشد، بک‌آپ گرفته می‌شود (پاکسازی آن طبق ROTATED_KINDS انجام می‌شود).
+    """
+
+    def __init__(self, manager: BackupManager, interval: float = 60.0):
+        self.manager = manager
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="AutoBackup")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Auto backup failed: {e}")
+
+    @staticmethod
+    def scheduled_at(value: str, now: datetime) -> datetime:
+        """زمان بک‌آپ امروز از مقدار HH:mm تنظیمات (مقدار نامعتبر = نیمه‌شب)"""
+        try:
+            at = datetime.strptime(value.strip(), "%H:%M").time()
+        except (AttributeError, ValueError):
+            at = dt_time(0, 0)
+        return datetime.combine(now.date(), at)
+
+    def check(self, now: Optional[datetime] = None) -> Optional[Dict]:
+        """گرفتن بک‌آپ auto در صورت رسیدن زمان آن؛ خروجی: ورودی کاتالوگ بک‌آپ جدید یا None"""
+        if self.manager.db_path is None:
+            return None
+        from .database import session_factory
+        from .settings_cache import settings_cache
+        with session_factory() as db:
+            values = settings_cache.get_many(db, AUTO_BACKUP_DEFAULTS)
+        if values["auto_backup_enabled"] != "true":
+            return None
+        now = now or datetime.now()
+        scheduled = self.scheduled_at(values["auto_backup_time"], now)
+        if now < scheduled:
+            return None
+        last = max((e["created_at"] for e in self.manager.entries() if e["kind"] == "auto"), default=None)
+        if last is not None and datetime.fromisoformat(last) >= scheduled:
+            return None
+        return self.manager.create(kind="auto")
+
+backup_manager = BackupManager()
+auto_backup = AutoBackupScheduler(backup_manager)
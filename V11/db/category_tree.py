@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from . import models
+
+logger = logging.getLogger("CategoryTree")
+
+@dataclass(frozen=True)
+class CategoryNode:
+    id: int
+    name: str
+    parent_id: Optional[int]
+
+class CategorySnapshot:
+    """نمای فقط‌خواندنی درخت دسته‌ها؛ تمام متدها بدون دسترسی به دیتابیس پاسخ می‌دهند."""
+
+    def __init__(self, rows: List[Tuple[int, str, Optional[int]]]):
+        self._nodes: Dict[int, CategoryNode] = {}
+        self._children: Dict[Optional[int], List[CategoryNode]] = {}
+        for cid, name, parent_id in sorted(rows, key=lambda r: r[0]):
+            node = CategoryNode(cid, name, parent_id)
+            self._nodes[cid] = node
+            self._children.setdefault(parent_id, []).append(node)
+
+    def get(self, cat_id: Optional[int]) -> Optional[CategoryNode]:
+        return self._nodes.get(cat_id) if cat_id is not None else None
+
+    def roots(self) -> List[CategoryNode]:
+        return list(self._children.get(None, []))
+
+    def children(self, parent_id: Optional[int]) -> List[CategoryNode]:
+        return list(self._children.get(parent_id, []))
+
+    def parent_id(self, cat_id: int) -> Optional[int]:
+        node = self._nodes.get(cat_id)
+        return node.parent_id if node else None
+
+    def path(self, cat_id: Optional[int]) -> List[CategoryNode]:
+        """مسیر از ریشه تا دسته (برای Breadcrumb)"""
+        path, seen = [], set()
+        node = self.get(cat_id)
+        while node and node.id not in seen:  # محافظت در برابر حلقه در داده‌های خراب
+            seen.add(node.id)
+            path.append(node)
+            node = self.get(node.parent_id)
+        return path[::-1]
+
+    def subtree_ids(self, cat_id: int) -> List[int]:
+        """شناسه دسته و تمام زیرمجموعه‌های آن"""
+        result, stack = [], [cat_id]
+        while stack:
+            cid = stack.pop()
+            if cid in result:
+                continue
+            result.append(cid)
+            stack.extend(c.id for c in self._children.get(cid, []))
+        return result
+
+class CategoryTree:
+    """
+    کش درخت دسته‌بندی‌ها.
+    با create/update/delete_category باطل می‌شود و برای تغییرات پروسه‌های دیگر
+    پس از ttl ثانیه دوباره از دیتابیس ساخته می‌شود.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CategorySnapshot] = None
+        self._loaded_at = 0.0
+        # با هر invalidate یک واحد زیاد می‌شود؛ درختی که قبل از باطل شدن خوانده شده ذخیره نمی‌شود
+        self._generation = 0
+
+    def current(self) -> Optional[CategorySnapshot]:
+        """درخت فعلی در صورت معتبر بودن (بدون دیتابیس)، وگرنه None"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return snapshot
+        return None
+
+    def load(self, db: Session) -> CategorySnapshot:
+        """درخت معتبر؛ در صورت نیاز از دیتابیس ساخته می‌شود"""
+        snapshot = self.current()
+        if snapshot is not None:
+            return snapshot
+        generation = self._generation
+        rows = db.query(models.Category.id, models.Category.name, models.Category.parent_id).all()
+        snapshot = CategorySnapshot([tuple(r) for r in rows])
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+        logger.debug(f"Category tree rebuilt ({len(rows)} nodes)")
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+category_tree = CategoryTree()
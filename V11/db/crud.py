@@ -1,15 +1,22 @@
 import logging
 import json
 from typing import List, Optional, Tuple, Any, Dict, Union
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import or_, desc, asc, func, case, and_
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session, joinedload, selectinload, noload, aliased
+from sqlalchemy import or_, desc, asc, func, case, and_, select, tuple_, insert, update, literal, bindparam
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from . import models
+from . import models, search
+from .settings_cache import settings_cache
+from .category_tree import category_tree
+from .flash_sale import flash_sale
+from .media_store import media_store
 from config import ADMIN_USER_IDS
 
 logger = logging.getLogger("CRUD")
 
+# وضعیت‌هایی که مبلغ سفارش در آمار فروش و خرید کاربر حساب می‌شود
+PAID_ORDER_STATUSES = ('approved', 'shipped', 'paid')
+
 # ======================================================================
 # 1. مدیریت کاربران (User Management)
 # ======================================================================
@@ -26,41 +33,7 @@ def get_or_create_user(
     """ایجاد یا آپدیت کاربر (سازگار با تلگرام و روبیکا)"""
     user_id_str = str(telegram_id)
     try:
-        user = db.query(models.User).filter(models.User.user_id == user_id_str).first()
-        
-        # بررسی ادمین بودن (فقط برای تلگرام و بر اساس کانفیگ)
-        is_admin_flag = False
-        if platform == "telegram" and user_id_str.isdigit():
-            if int(user_id_str) in ADMIN_USER_IDS:
-                is_admin_flag = True
-
-        if not user:
-            user = models.User(
-                user_id=user_id_str,
-                full_name=full_name,
-                username=username,
-                platform=platform,
-                is_admin=is_admin_flag,
-                created_at=datetime.now()
-            )
-            db.add(user)
-        else:
-            # آپدیت اطلاعات اگر تغییر کرده باشد
-            changes = False
-            if user.full_name != full_name:
-                user.full_name = full_name
-                changes = True
-            if user.username != username:
-                user.username = username
-                changes = True
-            if platform == "telegram" and user.is_admin != is_admin_flag:
-                user.is_admin = is_admin_flag
-                changes = True
-            
-            user.last_seen = datetime.now()
-            if changes:
-                user.updated_at = datetime.now()
-
+        user = _upsert_user(db, user_id_str, full_name, username, platform)
         db.commit()
         db.refresh(user)
         return user
@@ -70,16 +43,129 @@ def get_or_create_user(
         # تلاش مجدد برای خواندن (اگر در ترد دیگری ساخته شده باشد)
         return db.query(models.User).filter(models.User.user_id == user_id_str).first()
 
+def _upsert_user(db: Session, user_id_str: str, full_name: str, username: str, platform: str) -> models.User:
+    """
+    بدنه مشترک ایجاد/آپدیت کاربر (بدون commit، برای استفاده داخل تراکنش‌های بزرگ‌تر).
+    باید اولین کار تراکنش باشد: اگر کاربر همزمان در درخواست دیگری ساخته شود (IntegrityError)،
+    تراکنش rollback و کاربر موجود دوباره خوانده و آپدیت می‌شود.
+    """
+    user = db.query(models.User).filter(models.User.user_id == user_id_str).first()
+    
+    # بررسی ادمین بودن (فقط برای تلگرام و بر اساس کانفیگ)
+    is_admin_flag = False
+    if platform == "telegram" and user_id_str.isdigit():
+        if int(user_id_str) in ADMIN_USER_IDS:
+            is_admin_flag = True
+
+    if not user:
+        user = models.User(
+            user_id=user_id_str,
+            full_name=full_name,
+            username=username,
+            platform=platform,
+            is_admin=is_admin_flag,
+            created_at=datetime.now()
+        )
+        db.add(user)
+        try:
+            db.flush()
+            return user
+        except IntegrityError:
+            # دو /start همزمان: ردیف در درخواست دیگر ثبت شده است
+            db.rollback()
+            user = db.query(models.User).filter(models.User.user_id == user_id_str).first()
+            if user is None:
+                raise
+
+    # آپدیت اطلاعات اگر تغییر کرده باشد
+    changes = False
+    if user.full_name != full_name:
+        user.full_name = full_name
+        changes = True
+    if user.username != username:
+        user.username = username
+        changes = True
+    if platform == "telegram" and user.is_admin != is_admin_flag:
+        user.is_admin = is_admin_flag
+        changes = True
+    
+    user.last_seen = datetime.now()
+    if user.bot_blocked:
+        # کاربر دوباره ربات را استارت کرده است
+        user.bot_blocked = False
+    if changes:
+        user.updated_at = datetime.now()
+    return user
+
 def get_all_users(db: Session, limit: int = 10000) -> List[models.User]:
-    """دریافت لیست کاربران با لود کردن سفارشات (برای محاسبه CRM)"""
+    """دریافت لیست کاربران (آمار خرید از ستون‌های تجمیعی users خوانده می‌شود، بدون لود سفارشات)"""
     return (
         db.query(models.User)
-        .options(selectinload(models.User.orders)) # بهینه سازی کوئری
         .order_by(desc(models.User.last_seen))
         .limit(limit)
         .all()
     )
 
+USER_SORTS = {
+    "spent": (desc(models.User.total_spent),),
+    "orders": (desc(models.User.order_count),),
+    "recent": (desc(models.User.last_seen),),
+    "newest": (desc(models.User.created_at),),
+    "last_order": (desc(models.User.last_order_at),),
+    "name": (asc(models.User.full_name),),
+}
+
+def search_users(
+    db: Session,
+    query: Optional[str] = None,
+    platform: Optional[str] = None,
+    banned: Optional[bool] = None,
+    min_spent: Optional[float] = None,
+    max_spent: Optional[float] = None,
+    seen_after: Optional[datetime] = None,
+    seen_before: Optional[datetime] = None,
+    joined_after: Optional[datetime] = None,
+    sort_by: str = "spent",
+    limit: Optional[int] = 50,
+    offset: int = 0,
+    with_total: bool = True
+) -> Tuple[List[models.User], Optional[int]]:
+    """
+    دایرکتوری کاربران پنل: تمام فیلترها، مرتب‌سازی و صفحه‌بندی در SQL.
+    خروجی: (کاربران صفحه، تعداد کل نتایج یا None اگر with_total=False)
+    limit=None یعنی همه نتایج (برای خروجی اکسل).
+    """
+    q = db.query(models.User)
+    if query:
+        term = f"%{query.strip()}%"
+        q = q.filter(or_(
+            models.User.full_name.ilike(term),
+            models.User.username.ilike(term),
+            models.User.user_id.like(term)
+        ))
+    if platform:
+        q = q.filter(models.User.platform == platform)
+    if banned is not None:
+        q = q.filter(models.User.is_banned.is_(banned))
+    if min_spent is not None:
+        q = q.filter(models.User.total_spent > min_spent)
+    if max_spent is not None:
+        q = q.filter(models.User.total_spent < max_spent)
+    if seen_after is not None:
+        q = q.filter(models.User.last_seen >= seen_after)
+    if seen_before is not None:
+        q = q.filter(models.User.last_seen < seen_before)
+    if joined_after is not None:
+        q = q.filter(models.User.created_at >= joined_after)
+
+    total = q.with_entities(func.count(models.User.user_id)).scalar() if with_total else None
+
+    # user_id به عنوان مرتب‌سازی ثانویه تا صفحات پشت سر هم همپوشانی نداشته باشند
+    q = q.order_by(*USER_SORTS.get(sort_by, USER_SORTS["spent"]), models.User.user_id)
+    if limit is not None:
+        q = q.limit(limit).offset(offset)
+    return q.all(), total
+
 def update_user_info(db: Session, user_id: Union[int, str], **kwargs) -> bool:
     try:
         user_id_str = str(user_id)
@@ -97,25 +183,139 @@ def get_user_stats(db: Session, user_id: Union[int, str]) -> Dict:
     """آمار سریع کاربر برای نمایش در پروفایل"""
     try:
         uid = str(user_id)
-        # استفاده از func.sum و func.count دیتابیس (سریعتر از پایتون)
-        stats = db.query(
-            func.count(models.Order.id).label('count'),
-            func.coalesce(func.sum(models.Order.total_amount), 0).label('total')
-        ).filter(
-            models.Order.user_id == uid,
-            models.Order.status.in_(['approved', 'shipped', 'paid'])
-        ).first()
-
         user = db.query(models.User).filter_by(user_id=uid).first()
-        return {
-            "join_date": user.created_at if user else datetime.now(),
-            "total_orders": stats.count,
-            "total_spent": float(stats.total)
-        }
+        return _build_user_stats(user)
     except Exception as e:
         logger.error(f"Stats Error: {e}")
         return {}
 
+def _build_user_stats(user: Optional[models.User]) -> Dict:
+    # آمار از ستون‌های تجمیعی کاربر (بدون کوئری روی سفارشات)
+    return {
+        "join_date": user.created_at if user else datetime.now(),
+        "total_orders": (user.order_count or 0) if user else 0,
+        "total_spent": float(user.total_spent or 0) if user else 0.0
+    }
+
+def _track_order_totals(db: Session, user_id: Optional[str], amount, old_status: Optional[str], new_status: str):
+    """
+    به‌روزرسانی افزایشی آمار کاربر وقتی سفارش وارد وضعیت‌های پرداخت شده یا از آن خارج می‌شود.
+    (UPDATE نسبی بدون commit؛ داخل تراکنش تغییر وضعیت)
+    """
+    was_paid = old_status in PAID_ORDER_STATUSES
+    is_paid = new_status in PAID_ORDER_STATUSES
+    if not user_id or was_paid == is_paid:
+        return
+    sign = 1 if is_paid else -1
+    db.query(models.User).filter(models.User.user_id == user_id).update({
+        models.User.order_count: models.User.order_count + sign,
+        models.User.total_spent: models.User.total_spent + sign * (amount or 0),
+        # جلوگیری از onupdate ستون last_seen (این تغییر فعالیت کاربر نیست)
+        models.User.last_seen: models.User.last_seen,
+    }, synchronize_session=False)
+
+def _track_daily_sales(db: Session, day: Optional[date], platform: Optional[str], amount,
+                       old_status: Optional[str], new_status: str):
+    """
+    انتقال سفارش بین ردیف‌های رول‌آپ daily_sales (کم از وضعیت قبلی، اضافه به وضعیت جدید).
+    upsert اتمیک در همان تراکنش سفارش (بدون commit)
+    """
+    if day is None or old_status == new_status:
+        return
+    table = models.DailySales.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        upsert = None
+
+    for status, sign in ((old_status, -1), (new_status, 1)):
+        if not status:
+            continue
+        key = {"day": day, "platform": platform or "unknown", "status": status}
+        delta = {"order_count": table.c.order_count + sign, "revenue": table.c.revenue + sign * (amount or 0)}
+        if upsert is not None:
+            stmt = upsert(table).values(**key, order_count=sign, revenue=sign * (amount or 0))
+            db.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=delta))
+            continue
+        changed = db.execute(update(table).where(*(table.c[k] == v for k, v in key.items())).values(**delta)).rowcount
+        if not changed:
+            db.execute(insert(table).values(**key, order_count=sign, revenue=sign * (amount or 0)))
+
+def rebuild_daily_sales(db: Session) -> int:
+    """بازسازی کامل جدول daily_sales از جدول سفارشات؛ خروجی: تعداد ردیف‌های رول‌آپ"""
+    orders = models.Order
+    day = func.date(orders.created_at)
+    platform = func.coalesce(models.User.platform, "unknown")
+    rows = select(
+        day, platform, orders.status, func.count(orders.id), func.coalesce(func.sum(orders.total_amount), 0)
+    ).select_from(orders).outerjoin(models.User, models.User.user_id == orders.user_id).where(
+        orders.created_at.isnot(None)
+    ).group_by(day, platform, orders.status)
+    try:
+        db.query(models.DailySales).delete(synchronize_session=False)
+        db.execute(insert(models.DailySales).from_select(
+            ["day", "platform", "status", "order_count", "revenue"], rows
+        ))
+        db.commit()
+        return db.query(func.count()).select_from(models.DailySales).scalar()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error rebuilding daily sales: {e}")
+        raise
+
+def ensure_daily_sales(db: Session) -> int:
+    """پر کردن اولیه رول‌آپ برای دیتابیس‌هایی که پیش از ساخت جدول daily_sales سفارش داشته‌اند"""
+    if db.query(models.DailySales.day).first() is None and db.query(models.Order.id).first() is not None:
+        return rebuild_daily_sales(db)
+    return 0
+
+def rebuild_user_order_stats(db: Session) -> int:
+    """بازسازی کامل ستون‌های order_count، total_spent و last_order_at از جدول سفارشات"""
+    orders = models.Order
+    owned = orders.user_id == models.User.user_id
+    paid = orders.status.in_(PAID_ORDER_STATUSES)
+    try:
+        updated = db.query(models.User).update({
+            models.User.order_count: select(func.count(orders.id)).where(owned, paid).scalar_subquery(),
+            models.User.total_spent: select(func.coalesce(func.sum(orders.total_amount), 0)).where(owned, paid).scalar_subquery(),
+            models.User.last_order_at: select(func.max(orders.created_at)).where(owned).scalar_subquery(),
+            models.User.last_seen: models.User.last_seen,
+        }, synchronize_session=False)
+        db.commit()
+        return updated
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error rebuilding user order stats: {e}")
+        raise
+
+def load_start_context(
+    db: Session,
+    telegram_id: Union[int, str],
+    full_name: str,
+    username: str = None,
+    platform: str = "telegram",
+    setting_defaults: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    بارگذاری یکجای اطلاعات صفحه /start در یک سشن و یک تراکنش:
+    ایجاد/آپدیت کاربر، تنظیمات مورد نیاز (با یک کوئری IN) و آمار سفارشات.
+    """
+    user_id_str = str(telegram_id)
+    try:
+        user = _upsert_user(db, user_id_str, full_name, username, platform)
+        db.flush()
+        settings = get_settings(db, setting_defaults or {})
+        stats = _build_user_stats(user)
+        db.commit()
+        return {"user": user, "settings": settings, "stats": stats}
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error in load_start_context: {e}")
+        raise
+
 # ======================================================================
 # 2. مدیریت دسته‌بندی‌ها
 # ======================================================================
@@ -142,6 +342,7 @@ def create_category(db: Session, name: str, parent_id: Optional[int] = None) ->
     cat = models.Category(name=name.strip(), parent_id=parent_id)
     db.add(cat)
     db.commit()
+    category_tree.invalidate()
     db.refresh(cat)
     return cat
 
@@ -151,6 +352,7 @@ def update_category(db: Session, cat_id: int, name: str, parent_id: Optional[int
         cat.name = name.strip()
         cat.parent_id = parent_id
         db.commit()
+        category_tree.invalidate()
         return cat
 
 def delete_category(db: Session, cat_id: int):
@@ -159,6 +361,7 @@ def delete_category(db: Session, cat_id: int):
     # سپس حذف دسته
     db.query(models.Category).filter_by(id=cat_id).delete()
     db.commit()
+    category_tree.invalidate()
 
 # ======================================================================
 # 3. مدیریت محصولات
@@ -171,6 +374,30 @@ def get_product(db: Session, prod_id: int) -> Optional[models.Product]:
         joinedload(models.Product.category)
     ).filter_by(id=prod_id).first()
 
+def get_product_detail(db: Session, prod_id: int, user_id: Union[int, str]) -> Optional[Tuple[models.Product, int, bool]]:
+    """
+    مدل خواندنی صفحه محصول: محصول + تعداد آن در سبد این کاربر + وضعیت علاقه‌مندی
+    در یک کوئری (زیرکوئری اسکالر و EXISTS به جای خواندن کل سبد و علاقه‌مندی‌ها).
+    """
+    uid = str(user_id)
+    cart_qty = select(func.coalesce(func.sum(models.CartItem.quantity), 0)).where(
+        models.CartItem.user_id == uid,
+        models.CartItem.product_id == models.Product.id
+    ).correlate(models.Product).scalar_subquery()
+    is_fav = select(models.Favorite.product_id).where(
+        models.Favorite.user_id == uid,
+        models.Favorite.product_id == models.Product.id
+    ).correlate(models.Product).exists()
+
+    row = db.query(models.Product, cart_qty.label("cart_qty"), is_fav.label("is_fav")).options(
+        selectinload(models.Product.variants),
+        selectinload(models.Product.images),
+        joinedload(models.Product.category)
+    ).filter(models.Product.id == prod_id).first()
+    if not row:
+        return None
+    return row[0], int(row[1] or 0), bool(row[2])
+
 def get_active_products_by_category(db: Session, category_id: int) -> List[models.Product]:
     return db.query(models.Product).filter(
         models.Product.category_id == category_id,
@@ -178,6 +405,53 @@ def get_active_products_by_category(db: Session, category_id: int) -> List[model
         models.Product.is_active == True
     ).order_by(desc(models.Product.is_top_seller), desc(models.Product.created_at)).all()
 
+def get_active_products_page(
+    db: Session,
+    category_id: int,
+    limit: int = 6,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    offset: int = 0
+) -> Tuple[List[models.Product], int]:
+    """
+    یک صفحه از محصولات فعال دسته به همراه تعداد کل، در یک کوئری.
+    صفحه‌بندی Keyset روی (is_top_seller, created_at, id) انجام می‌شود؛
+    after_id / before_id شناسه آخرین/اولین محصول صفحه قبلی هستند.
+    بدون کرسر، یا اگر محصول کرسر حذف شده باشد، از offset استفاده می‌شود (پرش مستقیم به یک صفحه).
+    """
+    P = models.Product
+    conditions = [P.category_id == category_id, P.is_active == True, P.stock > 0]
+    sort_key = tuple_(P.is_top_seller, P.created_at, P.id)
+
+    total_q = select(func.count(P.id)).where(*conditions).scalar_subquery()
+    q = db.query(P, total_q.label("total")).options(noload(P.variants)).filter(*conditions)
+
+    cursor_id = after_id or before_id
+    cursor = None
+    if cursor_id and db.query(P.id).filter(P.id == cursor_id).first():
+        # مقایسه با مقادیر خام ستون‌های ردیف کرسر در خود SQL (نه datetime پایتون)؛
+        # created_at پیش‌فرض سرور بدون میکروثانیه ذخیره می‌شود و datetime بایند شده با
+        # میکروثانیه، پس مقایسه متنی ردیف‌های هم‌ثانیه را اشتباه مرتب می‌کرد
+        cursor = aliased(P)
+        q = q.join(cursor, cursor.id == cursor_id)
+        cursor_key = tuple_(cursor.is_top_seller, cursor.created_at, cursor.id)
+
+    if cursor is not None and before_id:
+        # صفحه قبلی: ترتیب معکوس و سپس برگرداندن نتیجه
+        q = q.filter(sort_key > cursor_key).order_by(asc(P.is_top_seller), asc(P.created_at), asc(P.id))
+        rows = q.limit(limit).all()[::-1]
+    else:
+        q = q.order_by(desc(P.is_top_seller), desc(P.created_at), desc(P.id))
+        if cursor is not None:
+            q = q.filter(sort_key < cursor_key)
+        elif offset:
+            q = q.offset(offset)
+        rows = q.limit(limit).all()
+
+    if rows:
+        return [r[0] for r in rows], rows[0][1]
+    return [], db.query(func.count(P.id)).filter(*conditions).scalar()
+
 def advanced_search_products(
     db: Session,
     query: str = "",
@@ -189,51 +463,91 @@ def advanced_search_products(
     limit: int = 100,
     offset: int = 0
 ) -> List[models.Product]:
-    q = db.query(models.Product).options(
-        selectinload(models.Product.images),
-        joinedload(models.Product.category)
+    q, rank = _product_search_query(
+        db.query(models.Product).options(
+            selectinload(models.Product.images),
+            joinedload(models.Product.category),
+            noload(models.Product.variants)
+        ),
+        db, query, category_id, min_price, max_price, in_stock_only
     )
-    
-    if query:
-        search = f"%{query}%"
-        q = q.filter(
-            or_(
-                models.Product.name.ilike(search),
-                models.Product.brand.ilike(search),
-                models.Product.tags.ilike(search),
-                models.Product.description.ilike(search)
-            )
-        )
-    
-    if category_id:
-        q = q.filter(models.Product.category_id == category_id)
-    if min_price > 0:
-        q = q.filter(models.Product.price >= min_price)
-    if max_price > 0:
-        q = q.filter(models.Product.price <= max_price)
-    if in_stock_only:
-        q = q.filter(models.Product.stock > 0)
 
+    return _apply_search_sort(q, sort_by, rank).limit(limit).offset(offset).all()
+
+def search_product_ids(
+    db: Session,
+    query: str = "",
+    sort_by: str = "newest",
+    limit: int = 1000,
+    **filters
+) -> List[int]:
+    """فقط شناسه‌های مرتب‌شده نتایج جستجو (برای کش نتایج و صفحه‌بندی بدون کوئری مجدد)"""
+    q, rank = _product_search_query(
+        db.query(models.Product.id), db, query,
+        filters.get("category_id"), filters.get("min_price", 0),
+        filters.get("max_price", 0), filters.get("in_stock_only", False)
+    )
+    return [pid for (pid,) in _apply_search_sort(q, sort_by, rank).limit(limit).all()]
+
+def get_products_by_ids(db: Session, product_ids: List[int]) -> List[models.Product]:
+    """دریافت محصولات با حفظ ترتیب شناسه‌های ورودی (بدون بارگذاری متغیرها)"""
+    if not product_ids:
+        return []
+    prods = db.query(models.Product).options(noload(models.Product.variants))\
+        .filter(models.Product.id.in_(product_ids)).all()
+    by_id = {p.id: p for p in prods}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
+def _apply_search_sort(q, sort_by: str, rank=None):
     # Sorting
-    if sort_by == "price_asc":
+    if sort_by == "relevance" and rank is not None:
+        q = q.order_by(asc(rank), desc(models.Product.created_at))
+    elif sort_by == "price_asc":
         q = q.order_by(asc(models.Product.price))
     elif sort_by == "price_desc":
         q = q.order_by(desc(models.Product.price))
     elif sort_by == "top_seller":
         q = q.order_by(desc(models.Product.is_top_seller), desc(models.Product.created_at))
+    elif sort_by == "stock_desc":
+        q = q.order_by(desc(models.Product.stock))
+    elif sort_by == "stock_asc":
+        q = q.order_by(asc(models.Product.stock))
     else: # newest
         q = q.order_by(desc(models.Product.created_at))
+    # ترتیب یکتا تا صفحه‌های limit/offset همپوشانی یا جاافتادگی نداشته باشند
+    return q.order_by(desc(models.Product.id))
 
-    return q.limit(limit).offset(offset).all()
+def get_product_search_count(
+    db: Session,
+    query: str = "",
+    category_id: int = None,
+    min_price: int = 0,
+    max_price: int = 0,
+    in_stock_only: bool = False,
+    **kwargs
+) -> int:
+    """تعداد نتایج جستجو (برای صفحه‌بندی) با همان ایندکس و فیلترهای advanced_search_products"""
+    q, _ = _product_search_query(
+        db.query(func.count(models.Product.id)),
+        db, query, category_id, min_price, max_price, in_stock_only
+    )
+    return q.scalar()
 
-def get_product_search_count(db: Session, query: str = "", **kwargs) -> int:
-    """تعداد نتایج جستجو (برای صفحه‌بندی)"""
-    q = db.query(func.count(models.Product.id))
+def _product_search_query(q, db: Session, query: str, category_id: int, min_price: int, max_price: int, in_stock_only: bool):
+    """اعمال فیلترهای مشترک جستجو؛ خروجی: (کوئری، عبارت رتبه یا None)"""
+    rank = None
     if query:
-        search = f"%{query}%"
-        q = q.filter(or_(models.Product.name.ilike(search), models.Product.brand.ilike(search)))
-    # سایر فیلترها مشابه advanced_search_products اعمال شود...
-    return q.scalar()
+        q, rank = search.apply_match(db, q, query)
+    
+    if category_id:
+        q = q.filter(models.Product.category_id == category_id)
+    if min_price > 0:
+        q = q.filter(models.Product.price >= min_price)
+    if max_price > 0:
+        q = q.filter(models.Product.price <= max_price)
+    if in_stock_only:
+        q = q.filter(models.Product.stock > 0)
+    return q, rank
 
 def create_product_with_variants(
     db: Session,
@@ -270,6 +584,7 @@ def create_product_with_variants(
             for v in variants_data:
                 db.add(models.ProductVariant(product_id=prod.id, **v))
 
+        search.index_products(db, [prod.id])
         db.commit()
         db.refresh(prod)
         return prod
@@ -296,14 +611,15 @@ def update_product_with_variants(
             if k in valid_keys:
                 setattr(prod, k, v)
         
-        # آپدیت تصویر اصلی (Backward Compatibility)
-        if image_paths:
-            prod.image_path = image_paths[0]
-
         prod.updated_at = datetime.now()
 
         # آپدیت تصاویر: حذف قدیمی‌ها و افزودن جدیدها
+        old_images = set()
         if image_paths is not None:
+            old_images = {p for (p,) in db.query(models.ProductImage.image_path).filter_by(product_id=prod_id)}
+            old_images.add(prod.image_path)
+            # تصویر اصلی (Backward Compatibility)
+            prod.image_path = image_paths[0] if image_paths else None
             db.query(models.ProductImage).filter_by(product_id=prod_id).delete()
             for path in image_paths:
                 db.add(models.ProductImage(product_id=prod_id, image_path=path))
@@ -314,7 +630,14 @@ def update_product_with_variants(
             for v in variants_data:
                 db.add(models.ProductVariant(product_id=prod_id, **v))
 
+        db.flush()
+        search.index_products(db, [prod_id])
         db.commit()
+        if flash_sale.is_active(prod_id):
+            # موجودی جدید بلافاصله روی موجودی حافظه فروش ویژه اعمال شود
+            flash_sale.refresh_stock(db, [prod_id])
+        # حذف فایل تصاویری که دیگر هیچ محصولی از آن‌ها استفاده نمی‌کند
+        media_store.release(db, old_images - set(image_paths or []))
         db.refresh(prod)
         return prod
     except Exception as e:
@@ -326,9 +649,15 @@ def delete_product(db: Session, prod_id: int):
 
 def bulk_delete_products(db: Session, product_ids: List[int]):
     try:
+        images = {p for (p,) in db.query(models.ProductImage.image_path).filter(
+            models.ProductImage.product_id.in_(product_ids)
+        )}
+        images |= {p for (p,) in db.query(models.Product.image_path).filter(models.Product.id.in_(product_ids))}
         # حذف وابسته ها خودکار انجام میشود (Cascade) اما برای اطمینان:
         db.query(models.Product).filter(models.Product.id.in_(product_ids)).delete(synchronize_session=False)
+        search.remove_products(db, product_ids)
         db.commit()
+        media_store.release(db, images)
         return True
     except SQLAlchemyError:
         db.rollback()
@@ -353,18 +682,26 @@ def get_cart_items(db: Session, user_id: Union[int, str]) -> List[models.CartIte
     ).filter_by(user_id=str(user_id)).all()
 
 def add_to_cart(db: Session, user_id: Union[int, str], product_id: int, quantity: int = 1, attributes: str = None):
+    user_id = str(user_id)
+    reserved = False
     try:
-        user_id = str(user_id)
-        prod = db.query(models.Product).filter_by(id=product_id).first()
-        if not prod or prod.stock < quantity:
-            raise ValueError("موجودی کافی نیست")
+        prod = None
+        if flash_sale.is_active(product_id):
+            # فروش ویژه: رزرو در حافظه، بدون خواندن یا قفل ردیف محصول
+            if not flash_sale.reserve(user_id, product_id, quantity):
+                raise ValueError("موجودی کافی نیست")
+            reserved = True
+        else:
+            prod = db.query(models.Product).filter_by(id=product_id).first()
+            if not prod or prod.stock < quantity:
+                raise ValueError("موجودی کافی نیست")
 
         item = db.query(models.CartItem).filter_by(
             user_id=user_id, product_id=product_id, selected_attributes=attributes
         ).first()
 
         if item:
-            if prod.stock < (item.quantity + quantity):
+            if prod and prod.stock < (item.quantity + quantity):
                 raise ValueError("موجودی کافی نیست")
             item.quantity += quantity
         else:
@@ -377,88 +714,186 @@ def add_to_cart(db: Session, user_id: Union[int, str], product_id: int, quantity
         db.commit()
     except Exception as e:
         db.rollback()
+        if reserved:
+            flash_sale.release(user_id, product_id, quantity)
         raise e
 
+def change_cart_quantity(db: Session, user_id: Union[int, str], product_id: int, delta: int) -> bool:
+    """کم و زیاد کردن تعداد یک محصول در سبد (با رسیدن به صفر حذف می‌شود)"""
+    user_id = str(user_id)
+    item = db.query(models.CartItem).filter_by(user_id=user_id, product_id=product_id).first()
+    if not item:
+        return False
+
+    flash = flash_sale.is_active(product_id)
+    new_qty = item.quantity + delta
+    if new_qty <= 0:
+        db.delete(item)
+        if flash:
+            flash_sale.release(user_id, product_id, item.quantity)
+    else:
+        if delta > 0:
+            if flash:
+                if not flash_sale.reserve(user_id, product_id, delta):
+                    raise ValueError("موجودی انبار کافی نیست.")
+            elif item.product.stock < new_qty:
+                raise ValueError("موجودی انبار کافی نیست.")
+        elif flash:
+            flash_sale.release(user_id, product_id, -delta)
+        item.quantity = new_qty
+    db.commit()
+    return True
+
 def remove_from_cart(db: Session, item_id: int):
+    item = db.query(models.CartItem.user_id, models.CartItem.product_id, models.CartItem.quantity).filter_by(id=item_id).first()
+    if item and flash_sale.is_active(item.product_id):
+        flash_sale.release(item.user_id, item.product_id, item.quantity)
     db.query(models.CartItem).filter_by(id=item_id).delete()
     db.commit()
 
 def clear_cart(db: Session, user_id: Union[int, str]):
+    if flash_sale.active_ids():
+        flash_sale.release_user(str(user_id))
     db.query(models.CartItem).filter_by(user_id=str(user_id)).delete()
     db.commit()
 
 # ======================================================================
 # 5. سفارشات (Orders) - Critical
 # ======================================================================
-def create_order_from_cart(db: Session, user_id: Union[int, str], shipping_data: dict) -> models.Order:
-    """ایجاد سفارش و کسر موجودی به صورت اتمیک"""
+def create_order_from_cart(db: Session, user_id: Union[int, str], shipping_data: dict,
+                           receipt_photo_id: Optional[str] = None) -> models.Order:
+    """
+    ایجاد سفارش و کسر موجودی به صورت اتمیک.
+
+    موجودی با UPDATE شرطی (stock >= تعداد) و بدون قفل ردیف در پایتون کم می‌شود؛ اگر حتی یک محصول
+    کافی نباشد کل تراکنش برمی‌گردد. آیتم‌ها یکجا درج می‌شوند و آیدی فیش در همان تراکنش ثبت می‌شود
+    تا قفل نوشتن دیتابیس فقط برای چند دستور کوتاه گرفته شود.
+    محصولات فروش ویژه (flash_sale) از رزرو حافظه کسر می‌شوند و به ردیف محصول دست نمی‌زنند.
+    """
     user_id = str(user_id)
+    # تنظیمات ارسال قبل از شروع نوشتن (از کش تنظیمات)
+    shipping = get_settings(db, {"shipping_cost": "0", "free_shipping_limit": "0"})
+    taken: Dict[int, int] = {}
     try:
-        # شروع تراکنش
-        with db.begin_nested():
-            cart_items = get_cart_items(db, user_id)
-            if not cart_items:
-                raise ValueError("Cart is empty")
-
-            total_amount = 0
-            order_items = []
-
-            for item in cart_items:
-                # قفل کردن ردیف محصول برای جلوگیری از Race Condition (در دیتابیس‌های پیشرفته مثل PG)
-                # در SQLite این کار با تراکنش معمولی انجام می‌شود
-                prod = db.query(models.Product).filter_by(id=item.product_id).first()
-                
-                if prod.stock < item.quantity:
-                    raise ValueError(f"موجودی '{prod.name}' تمام شده است.")
-                
-                # کسر موجودی
-                prod.stock -= item.quantity
-                
-                # محاسبه قیمت (با تخفیف)
-                price = prod.discount_price if (prod.discount_price and prod.discount_price > 0) else prod.price
-                line_total = price * item.quantity
-                total_amount += line_total
-                
-                order_items.append(models.OrderItem(
-                    product_id=item.product_id,
-                    variant_id=item.variant_id,
-                    quantity=item.quantity,
-                    price_at_purchase=price,
-                    selected_attributes=item.selected_attributes
-                ))
-
-            # هزینه ارسال
-            ship_cost = int(get_setting(db, "shipping_cost", "0"))
-            free_limit = int(get_setting(db, "free_shipping_limit", "0"))
-            if free_limit > 0 and total_amount >= free_limit:
-                ship_cost = 0
-            
-            total_amount += ship_cost
-
-            # ایجاد سفارش
-            order = models.Order(
-                user_id=user_id,
-                total_amount=total_amount,
-                status="pending_payment",
-                shipping_address=shipping_data.get("address", ""),
-                postal_code=shipping_data.get("postal_code", ""),
-                phone_number=shipping_data.get("phone", ""),
-                shipping_cost=ship_cost,
-                items=order_items
-            )
-            db.add(order)
-            
-            # پاک کردن سبد خرید
-            db.query(models.CartItem).filter_by(user_id=user_id).delete()
-            
+        cart_items = db.query(
+            models.CartItem.product_id, models.CartItem.variant_id, models.CartItem.quantity,
+            models.CartItem.selected_attributes, models.Product.name,
+            models.Product.price, models.Product.discount_price
+        ).join(models.Product, models.Product.id == models.CartItem.product_id).filter(
+            models.CartItem.user_id == user_id
+        ).order_by(models.CartItem.id).all()
+        if not cart_items:
+            raise ValueError("Cart is empty")
+
+        total_amount = 0
+        demand: Dict[int, int] = {}
+        item_rows = []
+        for item in cart_items:
+            # محاسبه قیمت (با تخفیف)
+            price = item.discount_price if (item.discount_price and item.discount_price > 0) else item.price
+            total_amount += price * item.quantity
+            demand[item.product_id] = demand.get(item.product_id, 0) + item.quantity
+            item_rows.append({
+                "product_id": item.product_id,
+                "variant_id": item.variant_id,
+                "quantity": item.quantity,
+                "price_at_purchase": price,
+                "selected_attributes": item.selected_attributes,
+            })
+
+        # فروش ویژه: تبدیل رزرو حافظه به فروش (همه یا هیچ)
+        flash_demand = {pid: qty for pid, qty in demand.items() if flash_sale.is_active(pid)}
+        if flash_demand:
+            failed = flash_sale.take(user_id, flash_demand)
+            if failed is not None:
+                name = next(i.name for i in cart_items if i.product_id == failed)
+                raise ValueError(f"موجودی '{name}' تمام شده است.")
+            taken = flash_demand
+
+        # کسر موجودی (به ترتیب id برای جلوگیری از Deadlock بین خریدهای همزمان)
+        db_demand = sorted((pid, qty) for pid, qty in demand.items() if pid not in taken)
+        if db_demand:
+            _decrement_stock(db, db_demand)
+
+        # هزینه ارسال
+        ship_cost = int(shipping["shipping_cost"] or 0)
+        free_limit = int(shipping["free_shipping_limit"] or 0)
+        if free_limit > 0 and total_amount >= free_limit:
+            ship_cost = 0
+
+        total_amount += ship_cost
+
+        # ایجاد سفارش
+        order = models.Order(
+            user_id=user_id,
+            total_amount=total_amount,
+            status="pending_payment",
+            shipping_address=shipping_data.get("address", ""),
+            postal_code=shipping_data.get("postal_code", ""),
+            phone_number=shipping_data.get("phone", ""),
+            shipping_cost=ship_cost,
+            payment_receipt_photo_id=receipt_photo_id
+        )
+        db.add(order)
+        db.flush()
+        db.execute(insert(models.OrderItem), [dict(row, order_id=order.id) for row in item_rows])
+
+        # آمار تجمیعی کاربر
+        db.query(models.User).filter(models.User.user_id == user_id).update(
+            {models.User.last_order_at: datetime.now(), models.User.last_seen: models.User.last_seen},
+            synchronize_session=False
+        )
+        _track_order_totals(db, user_id, total_amount, None, order.status)
+        created_at, platform = db.query(models.Order.created_at, models.User.platform).outerjoin(
+            models.User, models.User.user_id == models.Order.user_id
+        ).filter(models.Order.id == order.id).one()
+        _track_daily_sales(db, created_at.date() if created_at else None, platform, total_amount, None, order.status)
+
+        # پاک کردن سبد خرید
+        db.query(models.CartItem).filter_by(user_id=user_id).delete(synchronize_session=False)
+
         db.commit()
-        db.refresh(order)
+        if taken:
+            flash_sale.settle(taken)
         return order
     except Exception as e:
         db.rollback()
+        if taken:
+            flash_sale.restore(taken)
         logger.error(f"Order Creation Failed: {e}")
         raise e
 
+def _decrement_stock(db: Session, demand: List[Tuple[int, int]]):
+    """
+    کسر موجودی با UPDATE ... WHERE stock >= :qty (یک دستور executemany).
+    اگر تعداد ردیف‌های تغییر یافته کمتر باشد، یعنی موجودی یک محصول کافی نبوده است.
+    """
+    products = models.Product.__table__
+    stmt = update(products).where(
+        products.c.id == bindparam("pid"), products.c.stock >= bindparam("qty")
+    ).values(stock=products.c.stock - bindparam("qty"))
+    params = [{"pid": pid, "qty": qty} for pid, qty in demand]
+
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        if db.execute(stmt, params).rowcount == len(params):
+            return
+        failed = None
+    else:
+        # درایورهایی که rowcount دسته‌ای ندارند: همان UPDATE شرطی، ردیف به ردیف
+        failed = next((p["pid"] for p in params if db.execute(stmt, p).rowcount != 1), None)
+        if failed is None:
+            return
+
+    # تراکنش برمی‌گردد؛ فقط برای پیام خطا محصول ناموجود پیدا می‌شود
+    db.rollback()
+    names = dict(db.query(models.Product.id, models.Product.name).filter(
+        models.Product.id.in_([pid for pid, _ in demand])
+    ).all())
+    if failed is None:
+        stock = dict(db.query(models.Product.id, models.Product.stock).filter(models.Product.id.in_(names)).all())
+        failed = next((pid for pid, qty in demand if (stock.get(pid) or 0) < qty), demand[0][0])
+    raise ValueError(f"موجودی '{names.get(failed, failed)}' تمام شده است.")
+
 def get_filtered_orders(db: Session, status: str = "all", limit: int = 500) -> List[models.Order]:
     q = db.query(models.Order).options(
         joinedload(models.Order.user),
@@ -469,12 +904,33 @@ def get_filtered_orders(db: Session, status: str = "all", limit: int = 500) -> L
     
     return q.order_by(desc(models.Order.created_at)).limit(limit).all()
 
-def update_order_status(db: Session, order_id: int, new_status: str) -> Optional[models.Order]:
-    order = db.query(models.Order).filter_by(id=order_id).first()
-    if order:
-        order.status = new_status
+def update_order_status(db: Session, order_id: int, new_status: str,
+                        tracking_code: Optional[str] = None) -> Optional[models.Order]:
+    """
+    تغییر وضعیت سفارش و به‌روزرسانی آمار خرید کاربر در همان تراکنش.
+    UPDATE مشروط به وضعیت قبلی است تا دو تغییر همزمان آمار را دوبار حساب نکنند.
+    """
+    order = db.query(models.Order).options(joinedload(models.Order.user)).filter_by(id=order_id).first()
+    if not order:
+        return None
+    old_status = order.status
+    values = {models.Order.status: new_status}
+    if tracking_code:
+        values[models.Order.tracking_code] = tracking_code
+    try:
+        changed = db.query(models.Order).filter(
+            models.Order.id == order_id, models.Order.status == old_status
+        ).update(values)
+        if changed:
+            _track_order_totals(db, order.user_id, order.total_amount, old_status, new_status)
+            _track_daily_sales(
+                db, order.created_at.date() if order.created_at else None,
+                order.user.platform if order.user else None, order.total_amount, old_status, new_status
+            )
         db.commit()
-        db.refresh(order)
+    except SQLAlchemyError:
+        db.rollback()
+        raise
     return order
 
 def get_order_by_id(db: Session, order_id: int) -> Optional[models.Order]:
@@ -490,17 +946,38 @@ def get_user_orders(db: Session, user_id: Union[int, str]) -> List[models.Order]
 # 6. تنظیمات (Settings)
 # ======================================================================
 def get_setting(db: Session, key: str, default: str = "") -> str:
-    s = db.query(models.Setting).filter_by(key=key).first()
-    return s.value if s else default
+    """خواندن تنظیم از کش درون‌حافظه‌ای (بدون کوئری در حالت عادی)"""
+    return settings_cache.get(db, key, default)
+
+def get_settings(db: Session, defaults: Dict[str, str]) -> Dict[str, str]:
+    """دریافت چند تنظیم با یک کوئری IN (کلیدهای ناموجود مقدار پیش‌فرض می‌گیرند)"""
+    if not defaults:
+        return {}
+    return settings_cache.get_many(db, defaults)
 
 def set_setting(db: Session, key: str, value: str):
-    s = db.query(models.Setting).filter_by(key=key).first()
-    if s:
-        s.value = str(value)
-        s.updated_at = datetime.now()
-    else:
-        db.add(models.Setting(key=key, value=str(value)))
-    db.commit()
+    set_settings(db, {key: value})
+
+def set_settings(db: Session, data: Dict[str, Any]):
+    """ذخیره چند تنظیم در یک تراکنش و باطل کردن کش"""
+    try:
+        now = datetime.now()
+        existing = {
+            s.key: s for s in db.query(models.Setting).filter(models.Setting.key.in_(list(data))).all()
+        }
+        for key, value in data.items():
+            s = existing.get(key)
+            if s:
+                s.value = str(value)
+                s.updated_at = now
+            else:
+                db.add(models.Setting(key=key, value=str(value), updated_at=now))
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    finally:
+        settings_cache.invalidate()
 
 def log_setting_change(db: Session, admin_id, keys, values):
     logger.info(f"Admin {admin_id} changed settings: {keys}")
@@ -508,21 +985,87 @@ def log_setting_change(db: Session, admin_id, keys, values):
 # ======================================================================
 # 7. آمار داشبورد (Analytics)
 # ======================================================================
+# مقادیر از رول‌آپ daily_sales خوانده می‌شوند؛ هزینه کوئری به تعداد روزها بستگی دارد نه تعداد سفارشات
 def get_total_revenue_by_platform(db: Session, platform: str) -> float:
-    return db.query(func.coalesce(func.sum(models.Order.total_amount), 0))\
-        .join(models.User)\
-        .filter(
-            models.Order.status.in_(['approved', 'shipped', 'paid']),
-            models.User.platform == platform
-        ).scalar()
+    return db.query(func.coalesce(func.sum(models.DailySales.revenue), 0)).filter(
+        models.DailySales.status.in_(PAID_ORDER_STATUSES),
+        models.DailySales.platform == platform
+    ).scalar()
 
 def get_orders_count_by_platform_and_status(db: Session, platform: str, status: str) -> int:
-    return db.query(func.count(models.Order.id))\
-        .join(models.User)\
-        .filter(
-            models.Order.status == status,
-            models.User.platform == platform
-        ).scalar()
+    return db.query(func.coalesce(func.sum(models.DailySales.order_count), 0)).filter(
+        models.DailySales.status == status,
+        models.DailySales.platform == platform
+    ).scalar()
+
+def get_orders_count_by_status(db: Session, status: str) -> int:
+    return db.query(func.coalesce(func.sum(models.DailySales.order_count), 0)).filter(
+        models.DailySales.status == status
+    ).scalar()
+
+def get_daily_revenue(db: Session, since: date) -> Dict[Tuple[date, str], float]:
+    """درآمد روزانه سفارشات پرداخت شده از تاریخ since: {(روز، پلتفرم): مبلغ}"""
+    rows = db.query(
+        models.DailySales.day, models.DailySales.platform, func.sum(models.DailySales.revenue)
+    ).filter(
+        models.DailySales.status.in_(PAID_ORDER_STATUSES),
+        models.DailySales.day >= since
+    ).group_by(models.DailySales.day, models.DailySales.platform).all()
+    return {(day, platform): float(total or 0) for day, platform, total in rows}
+
+LOW_STOCK_THRESHOLD = 10
+
+def get_dashboard_snapshot(db: Session, since: Optional[Dict[str, int]] = None,
+                           activity_limit: int = 5, stock_limit: int = 5) -> Dict[str, Any]:
+    """
+    داده‌های داشبورد با حداقل کوئری.
+
+    تمام اعداد کارت‌ها در یک دستور (جمع شرطی روی daily_sales + زیرکوئری‌های اسکالر) محاسبه می‌شوند.
+    since همان cursor خروجی فراخوانی قبلی است: فقط سفارشات جدیدتر از آن برگردانده می‌شوند و لیست
+    موجودی کم فقط وقتی تغییر کرده باشد (در غیر این صورت low_stock = None).
+    """
+    ds = models.DailySales
+    paid = ds.status.in_(PAID_ORDER_STATUSES)
+    low = models.Product.stock < LOW_STOCK_THRESHOLD
+
+    def revenue(platform):
+        return func.coalesce(func.sum(case((and_(paid, ds.platform == platform), ds.revenue), else_=0)), 0)
+
+    row = db.execute(select(
+        revenue("telegram").label("rev_tg"),
+        revenue("rubika").label("rev_rb"),
+        func.coalesce(func.sum(case((ds.status == "pending_payment", ds.order_count), else_=0)), 0).label("pending"),
+        select(func.count()).select_from(models.User).scalar_subquery().label("users"),
+        select(func.coalesce(func.max(models.Order.id), 0)).scalar_subquery().label("order_id"),
+        # امضای لیست موجودی کم: با تغییر موجودی یا ورود/خروج محصولی از لیست عوض می‌شود
+        select(func.coalesce(func.sum(models.Product.id * 1000003 + models.Product.stock), 0) + func.count())
+            .where(low).scalar_subquery().label("stock_version"),
+    ).select_from(ds)).one()
+
+    cursor = {"order_id": int(row.order_id), "stock_version": int(row.stock_version)}
+    last_order_id = since.get("order_id", 0) if since else 0
+
+    orders = []
+    if cursor["order_id"] > last_order_id:
+        orders = [dict(r._mapping) for r in db.query(
+            models.Order.id, models.Order.total_amount, models.Order.created_at,
+            models.User.full_name, models.User.platform
+        ).join(models.User, models.User.user_id == models.Order.user_id).filter(
+            models.Order.id > last_order_id
+        ).order_by(desc(models.Order.id)).limit(activity_limit).all()]
+
+    low_stock = None
+    if not since or since.get("stock_version") != cursor["stock_version"]:
+        low_stock = [dict(r._mapping) for r in db.query(
+            models.Product.id, models.Product.name, models.Product.stock
+        ).filter(low).order_by(models.Product.stock, models.Product.id).limit(stock_limit).all()]
+
+    return {
+        "rev_tg": float(row.rev_tg), "rev_rb": float(row.rev_rb),
+        "pending": int(row.pending), "users": int(row.users),
+        "is_open": get_setting(db, "tg_is_open", "true") == "true",
+        "orders": orders, "low_stock": low_stock, "cursor": cursor,
+    }
 
 # ======================================================================
 # 8. آدرس‌ها و علاقه‌مندی‌ها
@@ -564,4 +1107,122 @@ def add_product_notification(db: Session, user_id, product_id):
     exists = db.query(models.ProductNotification).filter_by(user_id=str(user_id), product_id=product_id).first()
     if not exists:
         db.add(models.ProductNotification(user_id=str(user_id), product_id=product_id))
-        db.commit()
\ No newline at end of file
+        db.commit()
+
+# ======================================================================
+# 9. پیام همگانی (Broadcast Jobs)
+# ======================================================================
+BROADCAST_OPEN_STATUSES = ("pending", "running")
+
+def create_broadcast_job(db: Session, text: Optional[str], image_path: Optional[str] = None,
+                         user_ids: Optional[List[str]] = None) -> Optional[int]:
+    """
+    ساخت پیام همگانی و ثبت گیرندگان با یک INSERT ... SELECT (بدون لود کاربران در حافظه).
+    user_ids=None یعنی همه کاربران؛ کاربرانی که ربات را بلاک کرده‌اند حذف می‌شوند.
+    """
+    try:
+        job = models.BroadcastJob(text=text, image_path=image_path, status="pending")
+        db.add(job)
+        db.flush()
+
+        users = select(
+            literal(job.id), models.User.user_id, models.User.platform, literal("pending")
+        ).where(models.User.bot_blocked.is_(False))
+        if user_ids is not None:
+            users = users.where(models.User.user_id.in_([str(u) for u in user_ids]))
+
+        db.execute(insert(models.BroadcastRecipient).from_select(
+            ["job_id", "user_id", "platform", "status"], users
+        ))
+        job.total = db.query(func.count(models.BroadcastRecipient.id)).filter_by(job_id=job.id).scalar()
+        db.commit()
+        return job.id
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error creating broadcast job: {e}")
+        return None
+
+def get_broadcast_job(db: Session, job_id: int) -> Optional[models.BroadcastJob]:
+    return db.query(models.BroadcastJob).filter_by(id=job_id).first()
+
+def get_open_broadcast_job_ids(db: Session) -> List[int]:
+    """پیام‌های همگانی نیمه‌کاره (برای ادامه بعد از ری‌استارت)"""
+    rows = db.query(models.BroadcastJob.id).filter(
+        models.BroadcastJob.status.in_(BROADCAST_OPEN_STATUSES)
+    ).order_by(models.BroadcastJob.id).all()
+    return [r[0] for r in rows]
+
+def get_broadcast_batch(db: Session, job_id: int, limit: int = 100, after_id: int = 0) -> List[Tuple[int, str, str]]:
+    """دسته بعدی گیرندگان در انتظار: [(recipient_id, user_id, platform), ...] (Keyset روی id)"""
+    rows = db.query(
+        models.BroadcastRecipient.id, models.BroadcastRecipient.user_id, models.BroadcastRecipient.platform
+    ).filter(
+        models.BroadcastRecipient.job_id == job_id,
+        models.BroadcastRecipient.status == "pending",
+        models.BroadcastRecipient.id > after_id
+    ).order_by(models.BroadcastRecipient.id).limit(limit).all()
+    return [tuple(r) for r in rows]
+
+def save_broadcast_results(db: Session, job_id: int, results: List[Dict[str, Any]]) -> Optional[models.BroadcastJob]:
+    """
+    ثبت نتیجه یک دسته در یک تراکنش.
+    results: [{"id", "user_id", "status", "attempts", "error"}, ...] با status در sent/failed/blocked/pending
+    کاربران blocked در جدول users هم علامت‌گذاری می‌شوند. شمارنده‌های job به اندازه تغییر وضعیت
+    همین دسته افزایش/کاهش می‌یابند (بدون شمارش دوباره کل گیرندگان). خروجی: job با شمارنده‌های به‌روز
+    """
+    try:
+        now = datetime.now()
+        if results:
+            R = models.BroadcastRecipient
+            # وضعیت قبلی همین دسته (برای گیرندگانی که قبلاً failed شده و دوباره ارسال می‌شوند)
+            previous = dict(db.query(R.id, R.status).filter(R.id.in_([r["id"] for r in results])).all())
+            delta = {"sent": 0, "failed": 0, "blocked": 0}
+            for r in results:
+                if previous.get(r["id"]) in delta:
+                    delta[previous[r["id"]]] -= 1
+                if r["status"] in delta:
+                    delta[r["status"]] += 1
+
+            recipients = R.__table__
+            db.execute(
+                update(recipients).where(recipients.c.id == bindparam("rid")).values(
+                    status=bindparam("new_status"), attempts=bindparam("new_attempts"),
+                    error=bindparam("new_error"), sent_at=bindparam("new_sent_at")
+                ),
+                [{
+                    "rid": r["id"], "new_status": r["status"], "new_attempts": r.get("attempts", 1),
+                    "new_error": str(r["error"])[:255] if r.get("error") else None,
+                    "new_sent_at": now if r["status"] == "sent" else None,
+                } for r in results]
+            )
+            J = models.BroadcastJob
+            if any(delta.values()):
+                db.query(J).filter(J.id == job_id).update({
+                    J.sent_count: J.sent_count + delta["sent"],
+                    J.failed_count: J.failed_count + delta["failed"],
+                    J.blocked_count: J.blocked_count + delta["blocked"],
+                }, synchronize_session=False)
+            blocked = [r["user_id"] for r in results if r["status"] == "blocked"]
+            if blocked:
+                db.query(models.User).filter(models.User.user_id.in_(blocked)).update(
+                    {models.User.bot_blocked: True, models.User.last_seen: models.User.last_seen},
+                    synchronize_session=False
+                )
+
+        db.commit()
+        # populate_existing: شیء job قبلی در همین نشست با مقادیر تازه شمارنده‌ها جایگزین شود
+        return db.query(models.BroadcastJob).populate_existing().filter_by(id=job_id).first()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error saving broadcast results: {e}")
+        return None
+
+def set_broadcast_job_status(db: Session, job_id: int, status: str) -> bool:
+    job = db.query(models.BroadcastJob).filter_by(id=job_id).first()
+    if not job:
+        return False
+    job.status = status
+    if status in ("done", "cancelled"):
+        job.finished_at = datetime.now()
+    db.commit()
+    return True
@@ -1,58 +1,58 @@
 import logging
-import shutil
 import os
 import time
-from datetime import datetime
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Generator, List, Tuple
+from typing import Generator, AsyncGenerator, List, Tuple, Optional, Callable, Any
 from functools import lru_cache
 from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, Session, scoped_session
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
-from config import DATABASE_URL, LOG_DIR, DB_FOLDER
+from config import DATABASE_URL, bootstrap as config_bootstrap
 
 logger = logging.getLogger(__name__)
 
 # ==============================================================================
 # 1. ابزارهای کمکی دیتابیس
 # ==============================================================================
+def _sqlite_path() -> Optional[Path]:
+    if "sqlite" not in DATABASE_URL:
+        return None
+    return Path(DATABASE_URL.replace("sqlite:///", ""))
+
 def ensure_db_directory():
-    """اطمینان از وجود پوشه دیتابیس و ایجاد بک‌آپ استارتاپ"""
-    if "sqlite" in DATABASE_URL:
-        db_path_str = DATABASE_URL.replace("sqlite:///", "")
-        db_path = Path(db_path_str)
-        if db_path.parent and not db_path.parent.exists():
-            try:
-                db_path.parent.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                logger.critical(f"Failed to create database directory: {e}")
-                raise
-        
-        # بک‌آپ هوشمند قبل از هر بار اجرا (فقط اگر دیتابیس وجود داشت)
-        if db_path.exists() and db_path.stat().st_size > 0:
-            backup_dir = db_path.parent / "backups"
-            backup_dir.mkdir(exist_ok=True)
-            # پاکسازی بک‌آپ‌های خیلی قدیمی (نگهداری ۵ تای آخر)
-            backups = sorted(backup_dir.glob("startup_*.db"), key=os.path.getmtime)
-            while len(backups) >= 5:
-                try:
-                    os.remove(backups.pop(0))
-                except: pass
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            try:
-                shutil.copy2(db_path, backup_dir / f"startup_{timestamp}.db")
-            except Exception as e:
-                logger.warning(f"Startup backup failed: {e}")
+    """اطمینان از وجود پوشه دیتابیس"""
+    db_path = _sqlite_path()
+    if db_path is not None and db_path.parent and not db_path.parent.exists():
+        try:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.critical(f"Failed to create database directory: {e}")
+            raise
 
-ensure_db_directory()
+def create_startup_backup():
+    """بک‌آپ آنلاین قبل از هر بار اجرا (فقط اگر دیتابیس وجود داشت)؛ قدیمی‌ها طبق سیاست نگهداری حذف می‌شوند"""
+    from .backup import backup_manager
+    db_path = _sqlite_path()
+    if db_path is None or not db_path.exists() or db_path.stat().st_size == 0:
+        return
+    try:
+        backup_manager.create(kind="startup")
+    except Exception as e:
+        logger.warning(f"Startup backup failed: {e}")
 
 # ==============================================================================
 # 2. پیکربندی موتور دیتابیس (Concurrency Optimized)
 # ==============================================================================
 @lru_cache(maxsize=1)
 def get_engine():
-    """ایجاد موتور دیتابیس با تنظیمات بهینه برای همزمانی"""
+    """
+    ایجاد موتور دیتابیس با تنظیمات بهینه برای همزمانی.
+    موتور هنگام اولین استفاده (نه هنگام import) ساخته می‌شود.
+    """
     connect_args = {}
     if "sqlite" in DATABASE_URL:
         connect_args = {
@@ -72,17 +72,21 @@ def get_engine():
             pool_pre_ping=True,
             echo=echo_mode
         )
-        return engine
     except Exception as e:
         logger.critical(f"Failed to create engine: {e}")
         raise
+    event.listen(engine, "connect", set_sqlite_pragma)
+    return engine
 
-engine = get_engine()
+def __getattr__(name: str):
+    # سازگاری با کدهایی که database.engine را مستقیم می‌خوانند
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ==============================================================================
 # 3. بهینه‌سازی‌های SQLite (WAL Mode)
 # ==============================================================================
-@event.listens_for(engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     if "sqlite" in DATABASE_URL:
         cursor = dbapi_connection.cursor()
@@ -102,16 +106,47 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
 # ==============================================================================
 # 4. مدیریت نشست‌ها (Session Management)
 # ==============================================================================
+class _EngineSession(Session):
+    """نشستی که موتور را هنگام ساخت اولین نشست (و نه هنگام import ماژول) ایجاد می‌کند"""
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
 # استفاده از scoped_session برای Thread-Safety کامل در پنل ادمین
-session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+session_factory = sessionmaker(class_=_EngineSession, autocommit=False, autoflush=False, expire_on_commit=False)
 SessionLocal = scoped_session(session_factory)
 
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+def bootstrap(backup: bool = True):
+    """
+    نقطه ورود صریح راه‌اندازی دیتابیس: پوشه‌ها و لاگ (config.bootstrap)، بک‌آپ شروع و init_db.
+    import کردن این ماژول هیچ کاری روی دیسک انجام نمی‌دهد؛ این تابع در هر پروسه فقط یک بار اجرا
+    می‌شود و فراخوانی‌های بعدی (مثلاً از تردهای ربات) بی‌اثرند.
+    """
+    global _bootstrapped
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        config_bootstrap()
+        ensure_db_directory()
+        if backup:
+            create_startup_backup()
+        init_db()
+        _bootstrapped = True
+
 def init_db():
     """ساخت جداول و اجرای مایگریشن‌های خودکار"""
     from .models import Base
+    from .search import ensure_search_index
+    from .crud import ensure_daily_sales
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
         run_auto_migrations()
+        with session_factory() as db:
+            ensure_search_index(db)
+            if ensure_daily_sales(db):
+                logger.info("MIGRATION: Backfilled daily sales rollup")
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.critical(f"DB Init Failed: {e}")
@@ -130,14 +165,152 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
         SessionLocal.remove() # پاکسازی ترد
 
+# ==============================================================================
+# 4.1. مسیر Async (AsyncEngine / AsyncSession) برای ربات‌ها
+# ==============================================================================
+# پنل Qt همچنان از SessionLocal (Sync) استفاده می‌کند.
+# هر event loop موتور مخصوص خودش را دارد، چون کانکشن‌های async به لوپ سازنده‌شان وابسته‌اند
+# (ترد تلگرام، ترد روبیکا و AsyncWorkerهای پنل هر کدام لوپ جدا دارند).
+_async_engines: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_lock = threading.Lock()
+_async_unavailable = False
+
+def get_async_url(url: str = DATABASE_URL) -> Optional[str]:
+    """تبدیل آدرس Sync به آدرس درایور Async (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return None
+
+def _create_async_engine():
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    connect_args = {}
+    if "sqlite" in DATABASE_URL:
+        connect_args = {"check_same_thread": False, "timeout": 20}
+
+    async_engine = create_async_engine(
+        get_async_url(),
+        connect_args=connect_args,
+        # aiosqlite به صورت پیش‌فرض NullPool دارد؛ کانکشن‌ها باید مثل موتور Sync بازاستفاده شوند
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=20,
+        max_overflow=10,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+        echo=os.getenv("LOG_LEVEL", "INFO").upper() == "DEBUG"
+    )
+    # همان PRAGMAهای WAL روی کانکشن‌های async هم اعمال شود
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragma)
+    factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine, factory
+
+def _get_async_pair():
+    global _async_unavailable
+    if _async_unavailable or get_async_url() is None:
+        return None
+
+    loop = asyncio.get_running_loop()
+    with _async_lock:
+        pair = _async_engines.get(loop)
+        if pair is None:
+            try:
+                pair = _create_async_engine()
+            except ImportError as e:
+                _async_unavailable = True
+                logger.warning(f"Async DB driver not available, falling back to threads: {e}")
+                return None
+            _async_engines[loop] = pair
+        return pair
+
+def get_async_engine():
+    """
+    موتور Async مخصوص event loop جاری.
+    اگر درایور async نصب نباشد یا دیتابیس پشتیبانی نشود None برمی‌گرداند.
+    """
+    pair = _get_async_pair()
+    return pair[0] if pair else None
+
+def get_async_session_factory():
+    """سازنده AsyncSession برای لوپ جاری (یا None در صورت نبود درایور)"""
+    pair = _get_async_pair()
+    return pair[1] if pair else None
+
+@asynccontextmanager
+async def get_async_db() -> AsyncGenerator[Any, None]:
+    """معادل async برای get_db"""
+    factory = get_async_session_factory()
+    if factory is None:
+        raise RuntimeError("Async database driver is not available")
+    async with factory() as db:
+        try:
+            yield db
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Async Session Error: {e}")
+            raise
+
+async def run_in_async_session(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    اجرای یک تابع CRUD (با ورودی اول db) روی AsyncSession بدون پرش به Thread Pool.
+    تابع Sync از طریق run_sync روی همان کانکشن async اجرا می‌شود.
+    """
+    async with get_async_db() as db:
+        return await db.run_sync(func, *args, **kwargs)
+
+async def dispose_async_engine():
+    """بستن کانکشن‌های async لوپ جاری (هنگام خاموش شدن ربات)"""
+    loop = asyncio.get_running_loop()
+    with _async_lock:
+        pair = _async_engines.pop(loop, None)
+    if pair is not None:
+        await pair[0].dispose()
+
+async def dispose_all_async_engines(timeout: float = 5.0):
+    """
+    بستن موتورهای async همه لوپ‌ها هنگام خروج برنامه.
+    ترد کانکشن‌های aiosqlite از نوع daemon نیست و اگر بسته نشود پروسه در خروج منتظر می‌ماند؛
+    هر موتور روی همان لوپی که آن را ساخته بسته می‌شود (لوپ تردهای ربات با run_coroutine_threadsafe).
+    """
+    current = asyncio.get_running_loop()
+    with _async_lock:
+        pairs = list(_async_engines.items())
+        _async_engines.clear()
+    for loop, (async_engine, _) in pairs:
+        try:
+            if loop is current:
+                await async_engine.dispose()
+            elif loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(async_engine.dispose(), loop)
+                await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            else:
+                logger.warning("Async engine of a stopped event loop could not be disposed")
+        except Exception as e:
+            logger.warning(f"Async engine dispose failed: {e}")
+
 # ==============================================================================
 # 5. سیستم مایگریشن خودکار (Auto Migration)
 # ==============================================================================
+def ensure_indexes():
+    """ساخت ایندکس‌های جدید روی جداول موجود (create_all فقط جداول جدید را می‌سازد)"""
+    from .models import Base
+    with get_engine().begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=conn, checkfirst=True)
+                except OperationalError as e:
+                    logger.warning(f"MIGRATION: Index '{index.name}' skipped: {e}")
+
 def run_auto_migrations():
     """بررسی و افزودن ستون‌های جدید به جداول قدیمی"""
     if "sqlite" not in DATABASE_URL:
+        ensure_indexes()
         return
 
+    engine = get_engine()
     inspector = inspect(engine)
     existing_tables = set(inspector.get_table_names())
     
@@ -155,7 +328,11 @@ def run_auto_migrations():
             "saved_address": "TEXT",
             "saved_phone": "VARCHAR(20)",
             "private_note": "TEXT",
-            "is_banned": "BOOLEAN DEFAULT 0"
+            "is_banned": "BOOLEAN DEFAULT 0",
+            "bot_blocked": "BOOLEAN DEFAULT 0 NOT NULL",
+            "order_count": "INTEGER DEFAULT 0 NOT NULL",
+            "total_spent": "NUMERIC(14, 0) DEFAULT 0 NOT NULL",
+            "last_order_at": "DATETIME"
         },
         "orders": {
             "tracking_code": "VARCHAR(100)",
@@ -164,6 +341,7 @@ def run_auto_migrations():
         }
     }
 
+    added = set()
     with engine.begin() as conn:
         for table, cols in schema_updates.items():
             if table in existing_tables:
@@ -173,5 +351,14 @@ def run_auto_migrations():
                         try:
                             logger.info(f"MIGRATION: Adding '{col_name}' to '{table}'")
                             conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}"))
+                            added.add((table, col_name))
                         except OperationalError:
-                            pass # ستون ممکن است وجود داشته باشد
\ No newline at end of file
+                            pass # ستون ممکن است وجود داشته باشد
+
+    ensure_indexes()
+
+    # پر کردن ستون‌های تجمیعی تازه اضافه شده از روی داده‌های موجود
+    if ("users", "total_spent") in added:
+        from .crud import rebuild_user_order_stats
+        with session_factory() as db:
+            logger.info(f"MIGRATION: Rebuilt order stats for {rebuild_user_order_stats(db)} users")
\ No newline at end of file
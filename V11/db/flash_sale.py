@@ -0,0 +1,251 @@
+import time
+import logging
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from sqlalchemy import update, bindparam, case
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from . import models
+from .settings_cache import settings_cache
+
+logger = logging.getLogger("FlashSale")
+
+SETTING_KEY = "flash_sale_product_ids"
+
+class _Shard:
+    __slots__ = ("lock", "available", "reservations")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.available: Dict[int, int] = {}
+        # (user_id, product_id) -> [تعداد رزرو، زمان انقضا]
+        self.reservations: Dict[Tuple[str, int], List[float]] = {}
+
+class FlashSaleStock:
+    """
+    حالت فروش ویژه برای محصولات انتخاب شده (تنظیم flash_sale_product_ids).
+
+    موجودی این محصولات در حافظه و در شاردهای جدا (هر کدام با قفل خودش) نگه داشته می‌شود:
+    افزودن به سبد فقط یک رزرو موقت در حافظه است و ثبت سفارش رزرو را به فروش تبدیل می‌کند،
+    بدون اینکه ردیف محصول در دیتابیس قفل یا آپدیت شود. رزروهای سبدهای رها شده بعد از
+    reservation_ttl ثانیه آزاد می‌شوند و فروش‌ها با flush() دسته‌ای به دیتابیس منتقل می‌گردند.
+    تغییر موجودی در دیتابیس توسط ادمین با refresh_stock() (در هر sync و پس از ویرایش محصول)
+    به صورت اختلاف روی موجودی حافظه اعمال می‌شود.
+    وضعیت فقط در همین پروسه معتبر است؛ ربات‌ها و پنل باید در یک پروسه اجرا شوند (run_panel).
+    """
+
+    def __init__(self, shards: int = 16, reservation_ttl: float = 600.0):
+        self.reservation_ttl = reservation_ttl
+        self._shards = [_Shard() for _ in range(shards)]
+        self._active: FrozenSet[int] = frozenset()
+        self._sold: Dict[int, int] = {}
+        self._sold_lock = threading.Lock()
+        self._config_lock = threading.Lock()
+        # آخرین موجودی دیده شده در دیتابیس (پس از کسر فروش‌های flush شده)
+        self._db_stock: Dict[int, int] = {}
+        self._stock_lock = threading.Lock()
+        self._flush_seq = 0
+
+    def _shard(self, product_id: int) -> _Shard:
+        return self._shards[product_id % len(self._shards)]
+
+    def is_active(self, product_id: int) -> bool:
+        return product_id in self._active
+
+    def active_ids(self) -> FrozenSet[int]:
+        return self._active
+
+    def available(self, product_id: int) -> Optional[int]:
+        """موجودی قابل رزرو در حافظه (None اگر محصول در فروش ویژه نیست)"""
+        if product_id not in self._active:
+            return None
+        available = self._shard(product_id).available.get(product_id)
+        return None if available is None else max(available, 0)
+
+    # --- پیکربندی ---
+    def sync(self, db: Session):
+        """فعال/غیرفعال کردن محصولات طبق تنظیمات (از کش تنظیمات) و اعمال تغییرات موجودی دیتابیس"""
+        self._sync_config(db)
+        self.refresh_stock(db)
+
+    def _sync_config(self, db: Session):
+        raw = settings_cache.get(db, SETTING_KEY, "") or ""
+        wanted = {int(p) for p in raw.replace("،", ",").split(",") if p.strip().isdigit()}
+        with self._config_lock:
+            added, removed = wanted - self._active, self._active - wanted
+            if not added and not removed:
+                return
+            stocks = dict(db.query(models.Product.id, models.Product.stock).filter(
+                models.Product.id.in_(added)
+            ).all()) if added else {}
+            for pid in removed:
+                shard = self._shard(pid)
+                with shard.lock:
+                    shard.available.pop(pid, None)
+                    for key in [k for k in shard.reservations if k[1] == pid]:
+                        del shard.reservations[key]
+                with self._stock_lock:
+                    self._db_stock.pop(pid, None)
+            for pid, stock in stocks.items():
+                shard = self._shard(pid)
+                with shard.lock:
+                    # فروش‌های flush نشده از قبل هنوز از موجودی دیتابیس کم نشده‌اند
+                    shard.available[pid] = max((stock or 0) - self._sold.get(pid, 0), 0)
+                with self._stock_lock:
+                    self._db_stock[pid] = max((stock or 0) - self._sold.get(pid, 0), 0)
+            self._active = frozenset((self._active - removed) | set(stocks))
+        logger.info(f"Flash sale products: {sorted(self._active) or 'none'}")
+
+    def refresh_stock(self, db: Session, product_ids: Optional[List[int]] = None) -> int:
+        """
+        اعمال تغییرات موجودی دیتابیس که خارج از فروش ویژه ثبت شده‌اند (مثل ویرایش ادمین).
+        اختلاف موجودی فعلی دیتابیس با آخرین مقدار دیده شده به موجودی حافظه اضافه می‌شود تا
+        رزروها و فروش‌های در جریان دست نخورند. خروجی: تعداد محصولات تغییر یافته
+        """
+        ids = [pid for pid in (product_ids if product_ids is not None else self._active) if pid in self._active]
+        if not ids:
+            return 0
+        seq = self._flush_seq
+        rows = db.query(models.Product.id, models.Product.stock).filter(models.Product.id.in_(ids)).all()
+        changed = 0
+        with self._stock_lock:
+            if seq != self._flush_seq:
+                # flush همزمان موجودی دیتابیس را تغییر داده است؛ در دور بعد بررسی می‌شود
+                return 0
+            for pid, stock in rows:
+                stock = stock or 0
+                diff = stock - self._db_stock.get(pid, stock)
+                self._db_stock[pid] = stock
+                if not diff:
+                    continue
+                shard = self._shard(pid)
+                with shard.lock:
+                    if pid in shard.available:
+                        # مقدار منفی مجاز است: رزروهای موجود بیش از موجودی جدید هستند
+                        shard.available[pid] += diff
+                changed += 1
+        if changed:
+            logger.info(f"Flash sale stock updated from database for {changed} products")
+        return changed
+
+    # --- رزرو (سبد خرید) ---
+    def reserve(self, user_id: str, product_id: int, quantity: int) -> bool:
+        """رزرو quantity عدد دیگر برای کاربر (و تمدید زمان رزرو قبلی)"""
+        shard = self._shard(product_id)
+        key = (str(user_id), product_id)
+        with shard.lock:
+            if shard.available.get(product_id, 0) < quantity:
+                return False
+            shard.available[product_id] -= quantity
+            entry = shard.reservations.setdefault(key, [0, 0.0])
+            entry[0] += quantity
+            entry[1] = time.monotonic() + self.reservation_ttl
+            return True
+
+    def release(self, user_id: str, product_id: int, quantity: Optional[int] = None):
+        """آزاد کردن رزرو (کل یا quantity عدد)"""
+        shard = self._shard(product_id)
+        key = (str(user_id), product_id)
+        with shard.lock:
+            entry = shard.reservations.get(key)
+            if not entry:
+                return
+            qty = entry[0] if quantity is None else min(quantity, entry[0])
+            entry[0] -= qty
+            if entry[0] <= 0:
+                del shard.reservations[key]
+            if product_id in shard.available:
+                shard.available[product_id] += qty
+
+    def release_user(self, user_id: str):
+        for pid in self._active:
+            self.release(user_id, pid)
+
+    def expire(self) -> int:
+        """آزاد کردن رزروهای منقضی شده؛ خروجی: تعداد آزاد شده"""
+        now, freed = time.monotonic(), 0
+        for shard in self._shards:
+            with shard.lock:
+                for key in [k for k, v in shard.reservations.items() if v[1] < now]:
+                    qty, _ = shard.reservations.pop(key)
+                    if key[1] in shard.available:
+                        shard.available[key[1]] += int(qty)
+                    freed += int(qty)
+        return freed
+
+    # --- ثبت سفارش ---
+    def take(self, user_id: str, demand: Dict[int, int]) -> Optional[int]:
+        """
+        تبدیل رزروهای کاربر به فروش (همه یا هیچ).
+        اگر رزرو منقضی یا کمتر از تعداد سبد باشد، کسری از موجودی آزاد برداشته می‌شود.
+        خروجی: None در صورت موفقیت، وگرنه شناسه اولین محصول ناموجود
+        """
+        user_id = str(user_id)
+        demand = {pid: qty for pid, qty in demand.items() if pid in self._active}
+        # قفل شاردها همیشه به ترتیب شماره گرفته می‌شود تا بین دو خرید همزمان Deadlock رخ ندهد
+        shards = [self._shards[i] for i in sorted({pid % len(self._shards) for pid in demand})]
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            for pid, qty in demand.items():
+                shard = self._shard(pid)
+                held = int(shard.reservations.get((user_id, pid), [0])[0])
+                if shard.available.get(pid, 0) < qty - held:
+                    return pid
+            for pid, qty in demand.items():
+                shard = self._shard(pid)
+                held = int(shard.reservations.pop((user_id, pid), [0])[0])
+                shard.available[pid] -= qty - held
+            return None
+        finally:
+            for shard in shards:
+                shard.lock.release()
+
+    def restore(self, demand: Dict[int, int]):
+        """برگرداندن موجودی take شده اگر تراکنش سفارش شکست بخورد"""
+        for pid, qty in demand.items():
+            shard = self._shard(pid)
+            with shard.lock:
+                if pid in shard.available:
+                    shard.available[pid] += qty
+
+    def settle(self, demand: Dict[int, int]):
+        """ثبت فروش قطعی برای انتقال به دیتابیس در flush بعدی"""
+        with self._sold_lock:
+            for pid, qty in demand.items():
+                self._sold[pid] = self._sold.get(pid, 0) + qty
+
+    # --- همگام‌سازی با دیتابیس ---
+    def has_pending(self) -> bool:
+        return bool(self._sold)
+
+    def flush(self, db: Session) -> int:
+        """کسر دسته‌ای فروش‌های ثبت شده از موجودی دیتابیس؛ خروجی: تعداد محصولات آپدیت شده"""
+        with self._sold_lock:
+            sold, self._sold = self._sold, {}
+        if not sold:
+            return 0
+        products = models.Product.__table__
+        qty = bindparam("qty")
+        stmt = update(products).where(products.c.id == bindparam("pid")).values(
+            stock=case((products.c.stock >= qty, products.c.stock - qty), else_=0)
+        )
+        with self._stock_lock:
+            self._flush_seq += 1
+        try:
+            db.execute(stmt, [{"pid": pid, "qty": q} for pid, q in sorted(sold.items())])
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.error(f"Flash sale flush failed, will retry: {e}")
+            self.settle(sold)
+            return 0
+        with self._stock_lock:
+            # کسر فروش‌ها از موجودی دیده شده تا refresh_stock آن را ویرایش ادمین حساب نکند
+            for pid, q in sold.items():
+                if pid in self._db_stock:
+                    self._db_stock[pid] = max(self._db_stock[pid] - q, 0)
+            self._flush_seq += 1
+        return len(sold)
+
+flash_sale = FlashSaleStock()
@@ -0,0 +1,67 @@
+"""
+دستورات نگهداری دیتابیس.
+
+    python -m db.maintenance rebuild-user-stats
+    python -m db.maintenance rebuild-daily-sales
+    python -m db.maintenance build-media-derivatives
+    python -m db.maintenance backup
+    python -m db.maintenance backup-vacuum
+"""
+import sys
+import logging
+import argparse
+
+from config import BASE_DIR
+from .database import SessionLocal, bootstrap
+from . import crud, models
+from .media_derivatives import media_derivatives
+from .backup import backup_manager
+
+logger = logging.getLogger("Maintenance")
+
+def rebuild_user_stats() -> int:
+    """بازسازی آمار تجمیعی خرید کاربران (order_count، total_spent، last_order_at)"""
+    with SessionLocal() as db:
+        return crud.rebuild_user_order_stats(db)
+
+def rebuild_daily_sales() -> int:
+    """بازسازی رول‌آپ فروش روزانه داشبورد (daily_sales) از جدول سفارشات"""
+    with SessionLocal() as db:
+        return crud.rebuild_daily_sales(db)
+
+def build_media_derivatives() -> int:
+    """ساخت بندانگشتی‌ها و عکس‌های بهینه تصاویر محصولاتی که هنوز ساخته نشده‌اند"""
+    with SessionLocal() as db:
+        paths = {p for (p,) in db.query(models.ProductImage.image_path).all() if p}
+        paths |= {p for (p,) in db.query(models.Product.image_path).filter(models.Product.image_path.isnot(None)).all()}
+    return media_derivatives.build_many(BASE_DIR / p for p in sorted(paths))
+
+def backup() -> str:
+    """بک‌آپ آنلاین فشرده دیتابیس (sqlite3 backup API)"""
+    return backup_manager.create(kind="manual")["name"]
+
+def backup_vacuum() -> str:
+    """بک‌آپ فشرده با VACUUM INTO (بدون صفحات خالی)"""
+    return backup_manager.create(kind="manual", method="vacuum")["name"]
+
+COMMANDS = {
+    "rebuild-user-stats": (rebuild_user_stats, "بازسازی آمار خرید کاربران از جدول سفارشات"),
+    "rebuild-daily-sales": (rebuild_daily_sales, "بازسازی رول‌آپ فروش روزانه داشبورد"),
+    "build-media-derivatives": (build_media_derivatives, "ساخت نسخه‌های بندانگشتی و بهینه تصاویر محصولات"),
+    "backup": (backup, "بک‌آپ آنلاین فشرده دیتابیس"),
+    "backup-vacuum": (backup_vacuum, "بک‌آپ فشرده با VACUUM INTO"),
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m db.maintenance", description="ابزارهای نگهداری دیتابیس")
+    parser.add_argument("command", choices=sorted(COMMANDS), help=" | ".join(f"{k}: {v[1]}" for k, v in COMMANDS.items()))
+    args = parser.parse_args(argv)
+
+    bootstrap(backup=False)
+    func, _ = COMMANDS[args.command]
+    result = func()
+    print(f"{args.command}: {result}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
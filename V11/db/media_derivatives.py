@@ -0,0 +1,107 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from config import MEDIA_DERIVED_DIR
+from .media_registry import media_registry
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # بدون Pillow همان فایل اصلی استفاده می‌شود
+    Image = ImageOps = None
+
+logger = logging.getLogger("MediaDerivatives")
+
+PathLike = Union[str, Path]
+
+class MediaDerivatives:
+    """
+    نسخه‌های مشتق تصاویر (بندانگشتی پنل و عکس بهینه ربات‌ها) روی دیسک.
+
+    هر نسخه با هش محتوای فایل اصلی نام‌گذاری می‌شود، پس فقط یک بار ساخته می‌شود و با تغییر
+    فایل (هش جدید) خودبه‌خود نسخه تازه ساخته می‌گردد. متدها همگام و سنگین هستند و باید
+    در ترد جداگانه فراخوانی شوند.
+    """
+
+    # نوع -> (بیشترین ضلع، کیفیت JPEG)
+    SPECS: Dict[str, Tuple[int, int]] = {
+        "thumb": (400, 80),
+        # تلگرام عکس‌ها را به ضلع ۱۲۸۰ کاهش می‌دهد؛ ارسال فایل بزرگ‌تر فقط آپلود را کند می‌کند
+        "photo": (1280, 85),
+    }
+
+    def __init__(self, root: Path = MEDIA_DERIVED_DIR):
+        self.root = Path(root)
+
+    def path_for(self, content_hash: str, kind: str) -> Path:
+        return self.root / content_hash[:2] / f"{content_hash}_{kind}.jpg"
+
+    def cached(self, path: PathLike, kind: str) -> Optional[Path]:
+        """نسخه مشتق موجود (بدون خواندن فایل اصلی) یا None"""
+        content_hash = media_registry.cached_hash(path)
+        if content_hash:
+            target = self.path_for(content_hash, kind)
+            if target.exists():
+                return target
+        return None
+
+    def get(self, path: PathLike, kind: str) -> Path:
+        """مسیر نسخه مشتق (در صورت نبود ساخته می‌شود)؛ در صورت خطا خود فایل اصلی"""
+        try:
+            return self._build(path, media_registry.content_hash(path), kind)
+        except Exception as e:
+            logger.warning(f"Derivative '{kind}' failed for {path}: {e}")
+            return Path(path)
+
+    def build(self, path: PathLike) -> Dict[str, Path]:
+        """ساخت تمام نسخه‌های یک تصویر (هنگام ثبت تصویر جدید)"""
+        return {kind: self.get(path, kind) for kind in self.SPECS}
+
+    def build_many(self, paths: Iterable[PathLike]) -> int:
+        count = 0
+        for path in paths:
+            if Path(path).exists():
+                self.build(path)
+                count += 1
+        return count
+
+    def remove(self, content_hash: str):
+        """حذف نسخه‌های مشتق یک محتوا (وقتی فایل اصلی دیگر استفاده نمی‌شود)"""
+        for kind in self.SPECS:
+            try:
+                self.path_for(content_hash, kind).unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"Could not remove derivative: {e}")
+
+    def _build(self, path: PathLike, content_hash: str, kind: str) -> Path:
+        target = self.path_for(content_hash, kind)
+        if target.exists():
+            return target
+        if Image is None:
+            return Path(path)
+        max_side, quality = self.SPECS[kind]
+        with Image.open(path) as img:
+            # چرخش طبق EXIF؛ خود EXIF (موقعیت، مدل دوربین) در نسخه مشتق ذخیره نمی‌شود
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # نوشتن در فایل موقت و جایگزینی اتمیک تا خواننده‌ها فایل نیمه‌کاره نبینند
+            tmp = target.with_name(f"{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                img.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+                os.replace(tmp, target)
+            except Exception:
+                tmp.unlink(missing_ok=True)
+                raise
+        return target
+
+media_derivatives = MediaDerivatives()
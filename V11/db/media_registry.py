@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from . import models
+
+logger = logging.getLogger("MediaRegistry")
+
+PathLike = Union[str, Path]
+
+class MediaRegistry:
+    """
+    رجیستری مدیا: (هش محتوا، پلتفرم) -> file_id.
+
+    هر فایل (بنر، عکس محصول، عکس پیام همگانی) فقط یک بار در هر پلتفرم آپلود می‌شود
+    و دفعات بعد با file_id ارسال می‌گردد. هش فایل‌ها بر اساس (مسیر، زمان تغییر، اندازه)
+    و file_idها در حافظه کش می‌شوند تا ارسال‌های تکراری حتی کوئری هم نزنند.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._file_ids: Dict[Tuple[str, str], str] = {}
+
+    # --- هش محتوا ---
+    @staticmethod
+    def _stat_key(path: PathLike) -> Tuple[str, int, int]:
+        p = Path(path)
+        st = p.stat()
+        return str(p.resolve()), st.st_mtime_ns, st.st_size
+
+    def cached_hash(self, path: PathLike) -> Optional[str]:
+        """هش محاسبه شده قبلی (بدون خواندن فایل) یا None"""
+        try:
+            return self._hashes.get(self._stat_key(path))
+        except OSError:
+            return None
+
+    def content_hash(self, path: PathLike) -> str:
+        key = self._stat_key(path)
+        digest = self._hashes.get(key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    # --- file_id ---
+    def peek(self, content_hash: str, platform: str) -> Optional[str]:
+        """file_id از کش حافظه (بدون دیتابیس)"""
+        return self._file_ids.get((content_hash, platform))
+
+    def get_file_id(self, db: Session, content_hash: str, platform: str) -> Optional[str]:
+        file_id = self.peek(content_hash, platform)
+        if file_id:
+            return file_id
+        row = db.query(models.MediaAsset.file_id).filter_by(content_hash=content_hash, platform=platform).first()
+        if row:
+            with self._lock:
+                self._file_ids[(content_hash, platform)] = row[0]
+            return row[0]
+        return None
+
+    def remember(self, db: Session, content_hash: str, platform: str, file_id: str, path: Optional[PathLike] = None):
+        """ثبت file_id پس از اولین آپلود موفق"""
+        with self._lock:
+            self._file_ids[(content_hash, platform)] = file_id
+        try:
+            asset = db.query(models.MediaAsset).filter_by(content_hash=content_hash, platform=platform).first()
+            if asset:
+                asset.file_id = file_id
+                asset.path = str(path) if path else asset.path
+            else:
+                size = Path(path).stat().st_size if path and Path(path).exists() else None
+                db.add(models.MediaAsset(
+                    content_hash=content_hash, platform=platform, file_id=file_id,
+                    path=str(path) if path else None, size=size
+                ))
+            db.commit()
+        except IntegrityError:
+            # ثبت همزمان توسط ترد/پروسه دیگر
+            db.rollback()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Failed to store media file_id: {e}")
+
+    def forget(self, db: Session, content_hash: str, platform: str):
+        """حذف file_id نامعتبر (مثلاً اگر تلگرام آن را نپذیرد)"""
+        with self._lock:
+            self._file_ids.pop((content_hash, platform), None)
+        try:
+            db.query(models.MediaAsset).filter_by(content_hash=content_hash, platform=platform).delete()
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+
+media_registry = MediaRegistry()
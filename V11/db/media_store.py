@@ -0,0 +1,158 @@
+import io
+import os
+import re
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import BASE_DIR, MEDIA_PRODUCTS_DIR
+from . import models
+from .media_registry import media_registry
+from .media_derivatives import media_derivatives
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # بدون Pillow فایل‌ها بدون تغییر ذخیره می‌شوند
+    Image = ImageOps = None
+
+logger = logging.getLogger("MediaStore")
+
+PathLike = Union[str, Path]
+
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+class MediaStore:
+    """
+    ذخیره تصاویر محصولات بر اساس هش محتوا: media/products/ab/<sha256>.jpg
+
+    هر تصویر فقط یک بار ذخیره (و در نتیجه یک بار در هر پلتفرم آپلود) می‌شود، حتی اگر چند محصول
+    از آن استفاده کنند. تعداد ارجاع هر فایل همان تعداد ردیف‌های product_images (و ستون قدیمی
+    products.image_path) با آن مسیر است و فایلی که ارجاعش به صفر برسد با release() حذف می‌شود.
+    متدهای ingest سنگین هستند و باید در ترد جداگانه اجرا شوند.
+    """
+
+    def __init__(self, root: Path = MEDIA_PRODUCTS_DIR, max_side: int = 2048,
+                 max_bytes: int = 2 * 1024 * 1024, quality: int = 88):
+        self.root = Path(root)
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+
+    # --- مسیرها ---
+    @staticmethod
+    def _absolute(path: PathLike) -> Path:
+        p = Path(path)
+        return p if p.is_absolute() else BASE_DIR / p
+
+    @staticmethod
+    def relative(path: PathLike) -> str:
+        return Path(os.path.relpath(path, BASE_DIR)).as_posix()
+
+    def owns(self, path: PathLike) -> bool:
+        return self._absolute(path).resolve().is_relative_to(self.root.resolve())
+
+    def is_stored(self, path: PathLike) -> bool:
+        """آیا فایل قبلاً با نام هش در مخزن ذخیره شده است"""
+        p = self._absolute(path)
+        return self.owns(p) and bool(_HASH_NAME.match(p.stem)) and p.parent.name == p.stem[:2]
+
+    # --- ثبت تصویر ---
+    def ingest(self, source: PathLike) -> str:
+        """ذخیره تصویر در مخزن؛ خروجی: مسیر نسبی برای ذخیره در دیتابیس"""
+        src = self._absolute(source)
+        if self.is_stored(src):
+            return self.relative(src)
+        data, ext = self._prepare(src)
+        digest = hashlib.sha256(data).hexdigest()
+        dest = self.root / digest[:2] / f"{digest}{ext}"
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dest.with_name(f"{dest.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, dest)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+                raise
+        return self.relative(dest)
+
+    def ingest_many(self, sources: Iterable[PathLike]) -> List[str]:
+        """ثبت چند تصویر با حفظ ترتیب؛ تصاویر تکراری یک بار و فایل‌های خراب نادیده گرفته می‌شوند"""
+        result: List[str] = []
+        for source in sources:
+            try:
+                rel = self.ingest(source)
+            except Exception as e:
+                logger.warning(f"Image ingest failed for {source}: {e}")
+                continue
+            if rel not in result:
+                result.append(rel)
+        return result
+
+    def _prepare(self, src: Path) -> Tuple[bytes, str]:
+        """حذف EXIF و کوچک/فشرده کردن تصاویر بزرگ؛ تصاویر سالم و کوچک دست‌نخورده می‌مانند"""
+        raw = src.read_bytes()
+        ext = src.suffix.lower().replace(".jpeg", ".jpg") or ".jpg"
+        if Image is None:
+            return raw, ext
+        try:
+            img = Image.open(io.BytesIO(raw))
+            img.load()
+        except Exception:
+            return raw, ext
+        if getattr(img, "is_animated", False):
+            return raw, ext
+
+        has_exif = bool(img.getexif()) or "exif" in img.info
+        oversized = max(img.size) > self.max_side or len(raw) > self.max_bytes
+        if not has_exif and not oversized:
+            return raw, ext
+
+        icc = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        out = io.BytesIO()
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img.save(out, "PNG", optimize=True, icc_profile=icc)
+            ext = ".png"
+        else:
+            img.convert("RGB").save(out, "JPEG", quality=self.quality, optimize=True, progressive=True, icc_profile=icc)
+            ext = ".jpg"
+        return out.getvalue(), ext
+
+    # --- شمارش ارجاع و حذف ---
+    def ref_counts(self, db: Session, paths: Iterable[str]) -> dict:
+        """تعداد ارجاع هر مسیر (ردیف‌های product_images + ستون قدیمی products.image_path)"""
+        paths = list({p for p in paths if p})
+        counts = dict.fromkeys(paths, 0)
+        if not paths:
+            return counts
+        for column, key in ((models.ProductImage.image_path, models.ProductImage.id),
+                            (models.Product.image_path, models.Product.id)):
+            for path, count in db.query(column, func.count(key)).filter(column.in_(paths)).group_by(column):
+                counts[path] += count
+        return counts
+
+    def release(self, db: Session, paths: Iterable[str]) -> int:
+        """حذف فایل‌های بدون ارجاع (و نسخه‌های مشتق آن‌ها)؛ خروجی: تعداد فایل‌های حذف شده"""
+        removed = 0
+        for rel, count in self.ref_counts(db, paths).items():
+            full = self._absolute(rel)
+            if count or not self.owns(full) or not full.exists():
+                continue
+            try:
+                content_hash = full.stem if self.is_stored(full) else media_registry.content_hash(full)
+                full.unlink()
+                media_derivatives.remove(content_hash)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove unused image {rel}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} unused product images")
+        return removed
+
+media_store = MediaStore()
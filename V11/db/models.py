@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, String, Boolean, ForeignKey,
-    DateTime, Numeric, Text, Index
+    DateTime, Date, Numeric, Text, Index, BigInteger, UniqueConstraint
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
@@ -18,6 +18,7 @@ class User(Base):
     phone_number = Column(String(20), nullable=True)
     is_admin = Column(Boolean, default=False, nullable=False)
     is_banned = Column(Boolean, default=False, nullable=False)
+    bot_blocked = Column(Boolean, default=False, nullable=False)  # کاربر ربات را بلاک کرده (Forbidden)
     
     # اطلاعات ذخیره شده برای تسریع پروسه خرید
     saved_address = Column(Text, nullable=True)
@@ -27,6 +28,11 @@ class User(Base):
     last_seen = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # آمار تجمیعی سفارشات پرداخت شده (به‌روزرسانی افزایشی در crud؛ بازسازی: python -m db.maintenance)
+    order_count = Column(Integer, default=0, nullable=False)
+    total_spent = Column(Numeric(14, 0), default=0, nullable=False)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+
     # Relationships
     orders = relationship("Order", back_populates="user", cascade="all, delete-orphan")
     cart_items = relationship("CartItem", back_populates="user", cascade="all, delete-orphan")
@@ -38,6 +44,8 @@ class User(Base):
         Index('idx_user_platform', 'platform'),
         Index('idx_user_created', 'created_at'),
         Index('idx_user_banned', 'is_banned'),
+        Index('idx_user_spent', 'total_spent'),
+        Index('idx_user_last_seen', 'last_seen'),
     )
 
     def __repr__(self):
@@ -93,6 +101,8 @@ class Product(Base):
     __table_args__ = (
         Index('idx_prod_active_stock', 'is_active', 'stock'),
         Index('idx_prod_price', 'price'),
+        # صفحه‌بندی Keyset لیست محصولات دسته
+        Index('idx_prod_cat_listing', 'category_id', 'is_top_seller', 'created_at', 'id'),
     )
 
     def __repr__(self):
@@ -119,6 +129,11 @@ class ProductImage(Base):
 
     product = relationship("Product", back_populates="images")
 
+    __table_args__ = (
+        # شمارش ارجاع فایل‌های مشترک (media_store.release)
+        Index('idx_product_image_path', 'image_path'),
+    )
+
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -176,6 +191,19 @@ class OrderItem(Base):
     product = relationship("Product", back_populates="order_items")
 
 
+class DailySales(Base):
+    """
+    رول‌آپ روزانه سفارشات به تفکیک (روز ثبت، پلتفرم، وضعیت) برای داشبورد.
+    با ثبت سفارش و هر تغییر وضعیت به صورت افزایشی به‌روز می‌شود (crud._track_daily_sales).
+    """
+    __tablename__ = "daily_sales"
+    day = Column(Date, primary_key=True)
+    platform = Column(String(20), primary_key=True)
+    status = Column(String(32), primary_key=True)
+    order_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Numeric(14, 0), default=0, nullable=False)
+
+
 class Favorite(Base):
     __tablename__ = "favorites"
     user_id = Column(String(50), ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
@@ -206,6 +234,62 @@ class UserAddress(Base):
     user = relationship("User", back_populates="addresses")
 
 
+class MediaAsset(Base):
+    """file_id آپلود شده هر فایل مدیا به ازای هر پلتفرم (کلید: هش محتوا)"""
+    __tablename__ = "media_assets"
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    platform = Column(String(20), nullable=False)  # 'telegram', 'rubika'
+    file_id = Column(String(255), nullable=False)
+    path = Column(String(512), nullable=True)  # آخرین مسیر دیده شده (برای عیب‌یابی)
+    size = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('content_hash', 'platform', name='uq_media_hash_platform'),
+    )
+
+
+class BroadcastJob(Base):
+    """پیام همگانی؛ وضعیت ارسال به تفکیک گیرنده در BroadcastRecipient ذخیره می‌شود تا بعد از ری‌استارت ادامه یابد"""
+    __tablename__ = "broadcast_jobs"
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=True)
+    image_path = Column(String(512), nullable=True)
+    status = Column(String(20), default="pending", nullable=False)  # pending, running, done, cancelled
+    total = Column(Integer, default=0, nullable=False)
+    sent_count = Column(Integer, default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    blocked_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    recipients = relationship("BroadcastRecipient", back_populates="job", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index('idx_broadcast_status', 'status'),
+    )
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = "broadcast_recipients"
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String(50), nullable=False)
+    platform = Column(String(20), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending, sent, failed, blocked
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(String(255), nullable=True)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    job = relationship("BroadcastJob", back_populates="recipients")
+
+    __table_args__ = (
+        UniqueConstraint('job_id', 'user_id', name='uq_broadcast_recipient'),
+        Index('idx_broadcast_rcpt_status', 'job_id', 'status', 'id'),
+    )
+
+
 class Setting(Base):
     __tablename__ = "settings"
     key = Column(String(100), primary_key=True, unique=True)
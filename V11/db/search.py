@@ -0,0 +1,215 @@
+import re
+import logging
+from typing import Iterable, List, Optional, Tuple, Any
+from sqlalchemy import text, func, select, or_, literal_column, table, column
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.exc import SQLAlchemyError
+from . import models
+
+logger = logging.getLogger("ProductSearch")
+
+# ==============================================================================
+# 1. نرمال‌سازی متن فارسی
+# ==============================================================================
+ZWNJ = "\u200c"
+_CHAR_MAP = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه", "ۀ": "ه", "ؤ": "و", "إ": "ا", "أ": "ا", "آ": "ا",
+    "\u200d": "", "\u200e": "", "\u200f": "", "\u0640": "",  # ZWJ، علائم جهت و کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670]")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def normalize(value: Optional[str]) -> str:
+    """یکسان‌سازی ی/ي، ک/ك، حذف اعراب، کشیده و نیم‌فاصله (برای ایندکس و کوئری)"""
+    if not value:
+        return ""
+    value = _DIACRITICS.sub("", value.translate(_CHAR_MAP)).lower()
+    return value.replace(ZWNJ, "")
+
+def _index_text(value: Optional[str]) -> str:
+    """
+    متن قابل ایندکس: شکل بدون نیم‌فاصله («میخواهم») به همراه اجزای جداشده
+    کلمات نیم‌فاصله‌دار («می خواهم») تا هر دو شیوه تایپ کاربر پیدا شوند.
+    """
+    if not value:
+        return ""
+    joined = normalize(value)
+    parts = [normalize(p) for w in value.split() if ZWNJ in w for p in w.split(ZWNJ)]
+    return " ".join([joined] + parts) if parts else joined
+
+def tokenize(query: str) -> List[str]:
+    return _TOKEN.findall(normalize(query))
+
+# ==============================================================================
+# 2. تشخیص بک‌اند (FTS5 در SQLite / tsvector در PostgreSQL)
+# ==============================================================================
+FTS_TABLE = "products_fts"
+PG_TABLE = "product_search"
+_backend_cache = {}
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+def get_backend(db: Session) -> Optional[str]:
+    """'fts5'، 'postgres' یا None (در این صورت جستجوی LIKE استفاده می‌شود)"""
+    dialect = _dialect(db)
+    if dialect not in _backend_cache:
+        backend = None
+        try:
+            if dialect == "sqlite":
+                exists = db.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"
+                ), {"n": FTS_TABLE}).first()
+                backend = "fts5" if exists else None
+            elif dialect == "postgresql":
+                exists = db.execute(text("SELECT to_regclass(:n)"), {"n": PG_TABLE}).scalar()
+                backend = "postgres" if exists else None
+        except SQLAlchemyError as e:
+            logger.warning(f"Search backend detection failed: {e}")
+        # فقط وضعیت موفق کش می‌شود تا بعد از ساخت ایندکس دوباره بررسی شود
+        if backend is None:
+            return None
+        _backend_cache[dialect] = backend
+    return _backend_cache[dialect]
+
+def ensure_search_index(db: Session):
+    """ساخت جدول ایندکس (در صورت نبود) و بازسازی آن اگر با جدول محصولات هم‌خوان نباشد"""
+    dialect = _dialect(db)
+    try:
+        if dialect == "sqlite":
+            db.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, brand, tags, description, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        elif dialect == "postgresql":
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {PG_TABLE} ("
+                "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL)"
+            ))
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{PG_TABLE}_doc ON {PG_TABLE} USING GIN (document)"))
+        else:
+            return
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"Full-text index unavailable, falling back to LIKE search: {e}")
+        return
+
+    backend = get_backend(db)
+    index_table = FTS_TABLE if backend == "fts5" else PG_TABLE
+    indexed = db.execute(text(f"SELECT COUNT(*) FROM {index_table}")).scalar()
+    products = db.query(func.count(models.Product.id)).scalar()
+    if indexed != products:
+        logger.info(f"Rebuilding product search index ({indexed} -> {products} rows)")
+        rebuild_index(db)
+        db.commit()
+
+# ==============================================================================
+# 3. همگام‌سازی ایندکس (بدون commit؛ داخل تراکنش فراخواننده)
+# ==============================================================================
+def remove_products(db: Session, product_ids: Iterable[int]):
+    ids = [int(i) for i in product_ids]
+    backend = get_backend(db)
+    if not ids or not backend:
+        return
+    if backend == "fts5":
+        stmt = text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :pid")
+    else:
+        stmt = text(f"DELETE FROM {PG_TABLE} WHERE product_id = :pid")
+    db.execute(stmt, [{"pid": i} for i in ids])
+
+def index_products(db: Session, product_ids: Iterable[int]):
+    """ایندکس (یا ایندکس مجدد) محصولات مشخص شده"""
+    ids = [int(i) for i in product_ids]
+    backend = get_backend(db)
+    if not ids or not backend:
+        return
+    rows = db.query(
+        models.Product.id, models.Product.name, models.Product.brand,
+        models.Product.tags, models.Product.description
+    ).filter(models.Product.id.in_(ids)).all()
+    _write_rows(db, backend, rows, replace=True)
+
+def rebuild_index(db: Session):
+    backend = get_backend(db)
+    if not backend:
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE if backend == 'fts5' else PG_TABLE}"))
+    rows = db.query(
+        models.Product.id, models.Product.name, models.Product.brand,
+        models.Product.tags, models.Product.description
+    ).all()
+    _write_rows(db, backend, rows, replace=False)
+
+def _write_rows(db: Session, backend: str, rows: List[Tuple[Any, ...]], replace: bool):
+    if not rows:
+        return
+    params = [{
+        "pid": pid,
+        "name": _index_text(name),
+        "brand": _index_text(brand),
+        "tags": _index_text((tags or "").replace(",", " ")),
+        "description": _index_text(description),
+    } for pid, name, brand, tags, description in rows]
+
+    if backend == "fts5":
+        if replace:
+            remove_products(db, [p["pid"] for p in params])
+        db.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, brand, tags, description) "
+            "VALUES (:pid, :name, :brand, :tags, :description)"
+        ), params)
+    else:
+        db.execute(text(
+            f"INSERT INTO {PG_TABLE} (product_id, document) VALUES (:pid, "
+            "setweight(to_tsvector('simple', :name), 'A') || "
+            "setweight(to_tsvector('simple', :brand), 'B') || "
+            "setweight(to_tsvector('simple', :tags), 'B') || "
+            "setweight(to_tsvector('simple', :description), 'D')) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+
+# ==============================================================================
+# 4. اعمال جستجو روی کوئری محصولات
+# ==============================================================================
+def apply_match(db: Session, q: Query, query: str) -> Tuple[Query, Optional[Any]]:
+    """
+    محدود کردن کوئری محصولات به نتایج جستجو.
+    خروجی: (کوئری جدید، عبارت رتبه) — رتبه کمتر یعنی مرتبط‌تر؛ در حالت LIKE رتبه None است.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return q, None
+
+    backend = get_backend(db)
+    if backend == "fts5":
+        match_expr = " AND ".join(f'"{t}"*' for t in tokens)
+        fts = table(FTS_TABLE, column("rowid"))
+        matches = select(
+            fts.c.rowid.label("product_id"),
+            func.bm25(literal_column(FTS_TABLE), 10.0, 5.0, 5.0, 1.0).label("rank")
+        ).select_from(fts).where(text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=match_expr)).subquery()
+        return q.join(matches, matches.c.product_id == models.Product.id), matches.c.rank
+
+    if backend == "postgres":
+        ts_query = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in tokens))
+        doc = table(PG_TABLE, column("product_id"), column("document"))
+        matches = select(
+            doc.c.product_id.label("product_id"),
+            (-func.ts_rank(doc.c.document, ts_query)).label("rank")
+        ).where(doc.c.document.op("@@")(ts_query)).subquery()
+        return q.join(matches, matches.c.product_id == models.Product.id), matches.c.rank
+
+    # Fallback: جستجوی LIKE روی ستون‌ها (بدون ایندکس متنی)
+    search = f"%{query}%"
+    return q.filter(
+        or_(
+            models.Product.name.ilike(search),
+            models.Product.brand.ilike(search),
+            models.Product.tags.ilike(search),
+            models.Product.description.ilike(search)
+        )
+    ), None
@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple, Any
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models
+
+logger = logging.getLogger("SettingsCache")
+
+class SettingsCache:
+    """
+    کش درون‌حافظه‌ای جدول settings.
+
+    تمام ردیف‌ها یک بار خوانده می‌شوند و تا زمان invalidate در حافظه می‌مانند.
+    برای دریافت تغییرات پروسه‌های دیگر (مثلاً پنل ادمین و ربات‌ها روی یک دیتابیس)،
+    حداکثر هر poll_interval ثانیه یک کوئری سبک MAX(updated_at) اجرا می‌شود.
+    """
+
+    def __init__(self, poll_interval: float = 5.0):
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._values: Optional[Dict[str, Optional[str]]] = None
+        self._stamp: Optional[Tuple[Any, int]] = None
+        self._last_poll = 0.0
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """شمارنده نسخه؛ با هر بارگذاری مجدد یا invalidate یک واحد افزایش می‌یابد"""
+        return self._version
+
+    def invalidate(self):
+        """پاک کردن کش (بعد از ذخیره تنظیمات)"""
+        with self._lock:
+            self._values = None
+            self._stamp = None
+            self._version += 1
+
+    def get(self, db: Session, key: str, default: str = "") -> str:
+        values = self._ensure_loaded(db)
+        return values[key] if key in values else default
+
+    def get_many(self, db: Session, defaults: Dict[str, str]) -> Dict[str, str]:
+        values = self._ensure_loaded(db)
+        return {k: (values[k] if values.get(k) is not None else d) for k, d in defaults.items()}
+
+    # --- داخلی ---
+    def _read_stamp(self, db: Session) -> Tuple[Any, int]:
+        # شمارش ردیف‌ها هم لحاظ می‌شود تا درج کلید جدید در همان ثانیه از دست نرود
+        return tuple(db.query(func.max(models.Setting.updated_at), func.count(models.Setting.key)).one())
+
+    def _ensure_loaded(self, db: Session) -> Dict[str, Optional[str]]:
+        with self._lock:
+            now = time.monotonic()
+            if self._values is not None and now - self._last_poll < self.poll_interval:
+                return self._values
+
+            stamp = self._read_stamp(db)
+            self._last_poll = now
+            if self._values is not None and stamp == self._stamp:
+                return self._values
+
+            rows = db.query(models.Setting.key, models.Setting.value).all()
+            self._values = {k: v for k, v in rows}
+            self._stamp = stamp
+            self._version += 1
+            logger.debug(f"Settings cache reloaded (version {self._version}, {len(rows)} keys)")
+            return self._values
+
+settings_cache = SettingsCache()
@@ -18,9 +18,10 @@ if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
 
 # ایمپورت ماژول‌های پروژه
-from config import TELEGRAM_BOT_TOKEN, LOG_DIR
-from db.database import init_db
-from bot.loader import setup_application_handlers
+from config import TELEGRAM_BOT_TOKEN, LOG_DIR, bootstrap
+from db.database import bootstrap as bootstrap_db
+from db.backup import auto_backup
+from bot.loader import setup_application_handlers, on_startup, on_shutdown
 
 logger = logging.getLogger("BotLauncher")
 
@@ -45,6 +46,7 @@ def main():
     """
     نقطه شروع اجرای ربات به صورت مستقل (CLI Mode).
     """
+    bootstrap()
     print_banner()
     logger.info("Initializing system...")
     
@@ -60,7 +62,8 @@ def main():
     # 2. راه‌اندازی دیتابیس
     try:
         logger.info("Connecting to database...")
-        init_db()
+        bootstrap_db()
+        auto_backup.start()
         logger.info("✅ Database connected successfully.")
     except Exception as e:
         logger.critical(f"❌ Database Initialization Failed: {e}")
@@ -76,6 +79,8 @@ def main():
         app = Application.builder() \
             .token(TELEGRAM_BOT_TOKEN) \
             .defaults(defaults) \
+            .post_init(on_startup) \
+            .post_shutdown(on_shutdown) \
             .build()
         
         # افزودن هندلرها
@@ -1,11 +1,17 @@
 import asyncio
 import logging
+from pathlib import Path
 from typing import Optional, Dict, Any, List
 
 # واردات نسبتی به ساختار پروژه
 from .rubika_client import RubikaAPI, RubikaError
 from db.database import SessionLocal
+from bot.flash_sale import flash_sale_reconciler
 from db import crud, models
+from db.category_tree import category_tree
+from db.media_registry import media_registry
+from db.media_derivatives import media_derivatives
+from config import BASE_DIR
 
 logger = logging.getLogger("RubikaBot")
 
@@ -32,27 +38,32 @@ class RubikaWorker:
         await self._initialize_bot()
         logger.info("🚀 Rubika Polling Service Started...")
 
-        while self.running:
-            try:
-                # دریافت آپدیت‌ها (مدیریت offset داخل کلاینت انجام می‌شود)
-                updates = await self.api.get_updates(limit=20)
+        # فروش ویژه در اجرای بدون ربات تلگرام هم باید همگام شود (در هر پروسه فقط یک حلقه اجرا می‌شود)
+        await flash_sale_reconciler.start()
+        try:
+            while self.running:
+                try:
+                    # دریافت آپدیت‌ها (مدیریت offset داخل کلاینت انجام می‌شود)
+                    updates = await self.api.get_updates(limit=20)
                 
-                if updates:
-                    for update in updates:
-                        try:
-                            await self.process_update(update)
-                        except Exception as inner_e:
-                            logger.error(f"Error processing update: {inner_e}")
+                    if updates:
+                        for update in updates:
+                            try:
+                                await self.process_update(update)
+                            except Exception as inner_e:
+                                logger.error(f"Error processing update: {inner_e}")
                 
-                # وقفه کوتاه برای کاهش فشار سرور
-                await asyncio.sleep(1.5)
+                    # وقفه کوتاه برای کاهش فشار سرور
+                    await asyncio.sleep(1.5)
 
-            except RubikaError as e:
-                logger.warning(f"Rubika API Error: {e}. Retrying...")
-                await asyncio.sleep(5)
-            except Exception as e:
-                logger.error(f"Polling Loop Critical Error: {e}")
-                await asyncio.sleep(10)
+                except RubikaError as e:
+                    logger.warning(f"Rubika API Error: {e}. Retrying...")
+                    await asyncio.sleep(5)
+                except Exception as e:
+                    logger.error(f"Polling Loop Critical Error: {e}")
+                    await asyncio.sleep(10)
+        finally:
+            await flash_sale_reconciler.stop()
 
     async def stop(self):
         self.running = False
@@ -146,7 +157,7 @@ class RubikaWorker:
     async def send_categories(self, chat_id: str):
         """نمایش لیست دسته‌بندی‌ها"""
         with SessionLocal() as db:
-            cats = crud.get_root_categories(db)
+            cats = category_tree.load(db).roots()
         
         if not cats:
             return await self.api.send_message(chat_id, "هیچ دسته‌بندی وجود ندارد.")
@@ -162,14 +173,14 @@ class RubikaWorker:
     async def send_products(self, chat_id: str, cat_id: int):
         """نمایش محصولات یک دسته"""
         with SessionLocal() as db:
-            prods = crud.get_active_products_by_category(db, cat_id)
+            prods, total = crud.get_active_products_page(db, cat_id, limit=10)
         
         if not prods:
             return await self.api.send_message(chat_id, "❌ محصولی یافت نشد.")
         
-        text = f"تعداد {len(prods)} محصول یافت شد:"
+        text = f"تعداد {total} محصول یافت شد:"
         inline_rows = []
-        for p in prods[:10]:
+        for p in prods:
             inline_rows.append([{"id": f"prod:{p.id}", "text": f"{p.name} - {int(p.price):,} تومان"}])
         
         # دکمه بازگشت
@@ -194,9 +205,30 @@ class RubikaWorker:
             [{"id": f"add:{p.id}", "text": "➕ افزودن به سبد", "type": "Simple"}],
             [{"id": "nav:back_cat", "text": "↩ بازگشت"}]
         ]
+
+        rel = p.images[0].image_path if p.images else p.image_path
+        if rel and (BASE_DIR / rel).exists():
+            try:
+                file_id = await self._photo_file_id(BASE_DIR / rel)
+                await self.api.send_file(chat_id, file_id, caption=txt, inline_keyboard=inline_rows)
+                return
+            except Exception as e:
+                logger.warning(f"Product photo failed, sending text only: {e}")
         
         await self.api.send_message(chat_id, txt, inline_keyboard=inline_rows)
 
+    async def _photo_file_id(self, path: Path) -> str:
+        """file_id روبیکا برای عکس؛ نسخه بهینه فقط بار اول آپلود می‌شود"""
+        content_hash = await asyncio.to_thread(media_registry.content_hash, path)
+        with SessionLocal() as db:
+            file_id = media_registry.get_file_id(db, content_hash, "rubika")
+        if not file_id:
+            upload = await asyncio.to_thread(media_derivatives.get, path, "photo")
+            file_id = await self.api.upload_file(str(upload))
+            with SessionLocal() as db:
+                media_registry.remember(db, content_hash, "rubika", file_id, str(path))
+        return file_id
+
     async def add_to_cart(self, chat_id: str, user_id: str, prod_id: int):
         try:
             with SessionLocal() as db:
@@ -1,44 +1,94 @@
+import time
+_STARTED_AT = time.perf_counter()
 import sys
 import os
 import asyncio
 import logging
 import threading
 import warnings
+from contextlib import contextmanager
 from pathlib import Path
 # --- تنظیمات محیطی ---
 os.environ["QT_FONT_DPI"] = "96"
 os.environ["QT_LOGGING_RULES"] = "qt.qpa.screen=false"
-from telegram.warnings import PTBUserWarning
-warnings.filterwarnings("ignore", category=PTBUserWarning)
 BASE_DIR = Path(__file__).resolve().parent
 if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
-from config import TELEGRAM_BOT_TOKEN, LOG_DIR, RUBIKA_BOT_TOKEN
-from db.database import init_db
-from bot.loader import setup_application_handlers
-from rubika_bot.bot_logic import RubikaWorker
-from rubika_bot.rubika_client import RubikaAPI
+from config import TELEGRAM_BOT_TOKEN, LOG_DIR, RUBIKA_BOT_TOKEN, bootstrap
+# ماژول‌های سنگین (تلگرام، روبیکا، دیتابیس و صفحات پنل) عمداً اینجا import نمی‌شوند؛
+# پوسته پنجره اول نمایش داده می‌شود و بقیه در مراحل launch در پس‌زمینه بارگذاری می‌شوند.
 try:
     from PyQt6.QtWidgets import QApplication
     from PyQt6.QtCore import Qt, QTimer
     import qasync
     from admin_panel.main_window import MainWindow
-    from telegram import Update
-    from telegram.ext import Application
 except ImportError as e:
     print(f"❌ Error: {e}")
     sys.exit(1)
 logger = logging.getLogger("Launcher")
 # ==============================================================================
+# زمان‌سنجی راه‌اندازی
+# ==============================================================================
+class StartupTimer:
+    """
+    ثبت زمان مراحل راه‌اندازی پنل.
+    stage() مدت اجرای هر مرحله و mark() فاصله هر نقطه عطف از شروع پروسه را ثبت می‌کند؛
+    report() خلاصه را در لاگ می‌نویسد.
+    """
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.stages = []
+        self.marks = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, (time.perf_counter() - start) * 1000))
+
+    def mark(self, name: str):
+        self.marks.append((name, (time.perf_counter() - self.started_at) * 1000))
+
+    def report(self):
+        stages = " | ".join(f"{name}: {ms:.0f}ms" for name, ms in self.stages)
+        marks = " | ".join(f"{name} @ {ms:.0f}ms" for name, ms in self.marks)
+        logger.info(f"⏱ Startup stages: {stages}")
+        logger.info(f"⏱ Startup milestones: {marks}")
+
+startup_timer = StartupTimer(_STARTED_AT)
+
+def load_bot_stack():
+    """import ماژول‌های ربات‌ها (در ترد جدا، قبل از استارت تردهای ربات)"""
+    from telegram.warnings import PTBUserWarning
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    import telegram.ext  # noqa: F401
+    if TELEGRAM_BOT_TOKEN:
+        import bot.loader  # noqa: F401
+    if RUBIKA_BOT_TOKEN:
+        import rubika_bot.bot_logic  # noqa: F401
+    import bot.broadcast  # noqa: F401
+
+def init_database():
+    """import و آماده‌سازی دیتابیس (مهاجرت‌ها، ایندکس‌ها، بکاپ شروع و زمان‌بندی بکاپ خودکار) در ترد جدا"""
+    from db.database import bootstrap as bootstrap_db
+    from db.backup import auto_backup
+    bootstrap_db()
+    auto_backup.start()
+# ==============================================================================
 # ترد ایزوله تلگرام
 # ==============================================================================
 def run_telegram_bot():
     if not TELEGRAM_BOT_TOKEN: return
     try:
         # ایجاد لوپ مجزا
+        from telegram import Update
+        from telegram.ext import Application
+        from bot.loader import setup_application_handlers, on_startup, on_shutdown
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        app = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
         setup_application_handlers(app)
         logger.info("✅ Telegram Bot Thread Started")
         app.run_polling(allowed_updates=Update.ALL_TYPES, close_loop=False)
@@ -50,6 +100,7 @@ def run_telegram_bot():
 def run_rubika_bot():
     if not RUBIKA_BOT_TOKEN: return
     try:
+        from rubika_bot.bot_logic import RubikaWorker
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         bot = RubikaWorker(RUBIKA_BOT_TOKEN)
@@ -68,18 +119,43 @@ class ApplicationManager:
         self.rb_thread = None
 
     async def launch(self):
-        """راه‌اندازی سریع پنل"""
-        # ۱. دیتابیس (بدون نیاز به شبکه)
+        """
+        راه‌اندازی مرحله‌ای پنل:
+        ۱. پوسته پنجره (بدون ساخت صفحات) بلافاصله نمایش داده می‌شود.
+        ۲. دیتابیس (import، مهاجرت‌ها و بکاپ) در ترد جدا آماده می‌شود.
+        ۳. صفحه اول (داشبورد) ساخته می‌شود؛ ماژول بقیه صفحات هنگام باز شدن import می‌شوند.
+        ۴. ماژول‌های ربات‌ها در پس‌زمینه import و تردهای ربات استارت می‌شوند.
+        """
+        timer = startup_timer
+        timer.mark("imports")
+        # ۱. پوسته پنجره
+        with timer.stage("window shell"):
+            self.window = MainWindow(bot_application=None, rubika_client=None, open_first_page=False)
+            self.window.show()
+        await asyncio.sleep(0)  # فرصت برای رسم اولین فریم
+        timer.mark("first paint")
+        # ۲. دیتابیس (بدون نیاز به شبکه)
         try:
-            await self.loop.run_in_executor(None, init_db)
+            with timer.stage("init_db + backup"):
+                await self.loop.run_in_executor(None, init_database)
         except Exception as e:
             logger.error(f"DB Error: {e}")
-        # ۲. ایجاد پنجره (بلافاصله نمایش داده شود)
-        self.window = MainWindow(bot_application=None, rubika_client=None)
-        self.window.show()
-        # ۳. استارت ربات‌های پس‌زمینه (در ترد جداگانه)
+        # ۳. صفحه اول
+        with timer.stage("first page"):
+            self.window.set_ready()
+        timer.mark("dashboard ready")
+        # ۴. ربات‌های پس‌زمینه (در ترد جداگانه)
+        try:
+            with timer.stage("bot imports"):
+                await self.loop.run_in_executor(None, load_bot_stack)
+        except ImportError as e:
+            logger.error(f"Bot modules could not be loaded: {e}")
+            timer.report()
+            return
         self.start_background_bots()
-        # ۴. تلاش برای اتصال کلاینت‌های پنل (بدون بلاک کردن UI)
+        timer.mark("bots started")
+        timer.report()
+        # ۵. تلاش برای اتصال کلاینت‌های پنل (بدون بلاک کردن UI)
         # استفاده از تایمر برای اینکه اگر اینترنت قطع بود، کل برنامه فریز نشود
         QTimer.singleShot(500, lambda: asyncio.create_task(self.connect_light_clients()))
 
@@ -94,6 +170,8 @@ class ApplicationManager:
 
     async def connect_light_clients(self):
         """اتصال کلاینت‌های مخصوص ارسال پیام در پنل (با مدیریت خطا)"""
+        from telegram.ext import Application
+        from bot.broadcast import broadcast_engine
         # کلاینت تلگرام برای پنل
         if TELEGRAM_BOT_TOKEN:
             try:
@@ -108,20 +186,35 @@ class ApplicationManager:
         # کلاینت روبیکا برای پنل
         if RUBIKA_BOT_TOKEN:
             try:
+                from rubika_bot.rubika_client import RubikaAPI
                 rb_light = RubikaAPI(RUBIKA_BOT_TOKEN)
                 self.window.rubika_client = rb_light
                 logger.info("✅ Panel Rubika Client Connected")
             except Exception as e:
                 logger.warning(f"⚠️ Panel Rubika Client failed: {e}")
+        # موتور پیام همگانی: اتصال کلاینت‌ها و ادامه ارسال‌های نیمه‌کاره قبل از ری‌استارت
+        broadcast_engine.attach(
+            telegram_bot=self.window.bot_application.bot if self.window.bot_application else None,
+            rubika_client=self.window.rubika_client
+        )
+        if broadcast_engine.platforms():
+            try:
+                await broadcast_engine.resume()
+            except Exception as e:
+                logger.warning(f"Broadcast resume failed: {e}")
         # آپدیت آیکون‌های وضعیت در گوشه پنل
         if hasattr(self.window, '_safe_check_connection'):
             self.window._safe_check_connection()
 
     async def shutdown(self):
         logger.info("Shutting down...")
+        # بستن کانکشن‌های aiosqlite (پنل و تردهای ربات)؛ در غیر این صورت ترد آن‌ها مانع خروج پروسه می‌شود
+        from db.database import dispose_all_async_engines
+        await dispose_all_async_engines()
         self.loop.stop()
 
 def main():
+    bootstrap()
     app = QApplication(sys.argv)
     app.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
     loop = qasync.QEventLoop(app)
@@ -0,0 +1,70 @@
+from sqlalchemy import text
+
+from db import crud, models
+
+def _seed(db, count=7, top_sellers=()):
+    category = models.Category(name="کفش")
+    db.add(category)
+    db.flush()
+    for i in range(count):
+        db.add(models.Product(category_id=category.id, name=f"p{i}", price=1000, stock=5,
+                              is_active=True, is_top_seller=i in top_sellers))
+    db.commit()
+    # همه در یک ثانیه، با قالب متنی پیش‌فرض سرور (بدون میکروثانیه)
+    db.execute(text("UPDATE products SET created_at = '2026-01-01 10:00:00'"))
+    db.commit()
+    return category.id
+
+def _ids(products):
+    return [p.id for p in products]
+
+def _walk(db, cat_id, limit):
+    """پیمایش همه صفحات به جلو و سپس به عقب با کرسر (حداکثر به تعداد محصولات گام)"""
+    page, total = crud.get_active_products_page(db, cat_id, limit=limit)
+    forward = [_ids(page)]
+    for _ in range(total):
+        page, _ = crud.get_active_products_page(db, cat_id, limit=limit, after_id=forward[-1][-1])
+        if not page:
+            break
+        forward.append(_ids(page))
+    backward = [forward[-1]]
+    for _ in range(total):
+        page, _ = crud.get_active_products_page(db, cat_id, limit=limit, before_id=backward[-1][0])
+        if not page:
+            break
+        backward.append(_ids(page))
+    return forward, backward[::-1], total
+
+def test_keyset_pages_rows_with_identical_created_at(db):
+    cat_id = _seed(db, count=7)
+    forward, backward, total = _walk(db, cat_id, limit=3)
+
+    assert total == 7
+    assert forward == [[7, 6, 5], [4, 3, 2], [1]]
+    assert backward == forward
+
+def test_keyset_keeps_top_sellers_first(db):
+    cat_id = _seed(db, count=6, top_sellers=(1, 4))
+    forward, backward, _ = _walk(db, cat_id, limit=4)
+
+    assert forward == [[5, 2, 6, 4], [3, 1]]
+    assert backward == forward
+
+def test_offset_page_matches_cursor_page(db):
+    cat_id = _seed(db, count=7)
+    first, _ = crud.get_active_products_page(db, cat_id, limit=3)
+    by_cursor, _ = crud.get_active_products_page(db, cat_id, limit=3, after_id=first[-1].id)
+    by_offset, _ = crud.get_active_products_page(db, cat_id, limit=3, offset=3)
+
+    assert _ids(by_cursor) == _ids(by_offset)
+
+def test_deleted_cursor_falls_back_to_offset(db):
+    cat_id = _seed(db, count=7)
+    first, _ = crud.get_active_products_page(db, cat_id, limit=3)
+    db.delete(db.get(models.Product, first[-1].id))
+    db.commit()
+
+    page, total = crud.get_active_products_page(db, cat_id, limit=3, after_id=first[-1].id, offset=3)
+
+    assert total == 6
+    assert _ids(page) == [3, 2, 1]